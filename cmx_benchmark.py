@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+#########################################################################
+# cmx_benchmark.py times every stage of meraki_cmx_analyze.py on
+#    synthetic inputs from cmx_generate.py, from small to very large
+#    files, so performance regressions are visible.
+#
+# For each scale the input is generated once into the work directory and
+#   reused by later runs. Every scale runs in its own process, which
+#   times ingest, visit discovery, the proximity, engagement and loyalty
+#   reports and writing the output files, and records wall time, CPU time
+#   and the peak resident memory after each stage. Results are appended
+#   to a CSV file, and when a baseline results file is given every stage
+#   that got slower than the threshold is listed.
+#
+# Before the scales run, a client visiting for several hours is checked
+#   to count as a visitor in every hour of its visit in the in-memory,
+#   SQLite and sweep reports, so timings are never taken of wrong
+#   reports. --check runs only that check.
+#
+# Usage:
+#   cmx_benchmark.py [--scales 10000,100000,...] [--work-dir DIR]
+#       [--results FILE] [--baseline FILE] [--threshold PERCENT]
+#       [--columnar] [--workers N] [--engagement-buckets EDGES] [--check]
+#
+#########################################################################
+
+import sys,os,time,csv,json,argparse,subprocess
+import cmx_generate
+import meraki_cmx_analyze
+
+# Default scales in rows, from a quick check to a full month of a busy
+#   deployment
+DEFAULT_SCALES = [10000, 100000, 1000000, 10000000, 50000000]
+
+# Stages timed for every scale, in run order
+STAGES = ["ingest", "discover_client_visits", "proximity", "engagement", "loyalty", "output"]
+
+# Columns of the results file
+RESULT_COLUMNS = ["Run Time", "Scale", "Rows", "Clients", "Visits", "Stage", "Wall Seconds", "CPU Seconds",
+    "Rows Per Second", "Peak RSS MB", "Options"]
+
+# Method run_stages runs the meraki_cmx_analyze.py pipeline on one input
+#   file the way main() does and times every stage
+#
+# Input: None
+# Output: CSV files in outputDirectory
+# Parameters:
+#   inputFileName - CSV file to analyze
+#   outputDirectory - directory for the output files
+#   options - parsed command line options
+#
+# Return Value: dictionary of row, client and visit counts and stages
+#####################################################################
+def run_stages(inputFileName, outputDirectory, options):
+    # Declare variables
+    timer = meraki_cmx_analyze.StageTimer()
+    networks = meraki_cmx_analyze.NetworkList(options.columnar)
+    rowCount = 0
+    outputPreamble = os.path.join(outputDirectory, "benchmark")
+
+    timer.start("ingest")
+    inputStream = open(inputFileName, 'rb')
+    for row in meraki_cmx_analyze.read_observations(inputStream):
+        networks.find_network(row[0]).add_observation(*row[1:])
+        rowCount = rowCount + 1
+    inputStream.close()
+    timer.stop()
+
+    timer.start("discover_client_visits")
+    meraki_cmx_analyze.discover_visits(networks, (5,1200,20,15), options.workers)
+    timer.stop()
+
+    startTimeRangeEpoch = meraki_cmx_analyze.find_first_day(networks)
+    endTimeRangeEpoch = meraki_cmx_analyze.find_last_day(networks)
+
+    timer.start("proximity")
+    proximityReports = [network.get_cmx_proximity_reports(startTimeRangeEpoch, endTimeRangeEpoch, 86400) for network in networks]
+    timer.stop()
+
+    timer.start("engagement")
+    engagementReports = [network.get_cmx_engagement_reports(startTimeRangeEpoch, endTimeRangeEpoch, 86400, options.engagement_buckets)
+        for network in networks]
+    timer.stop()
+
+    timer.start("loyalty")
+    loyaltyReports = [network.get_cmx_loyalty_reports(startTimeRangeEpoch, endTimeRangeEpoch, 86400) for network in networks]
+    timer.stop()
+
+    timer.start("output")
+    meraki_cmx_analyze.write_csv_file(outputPreamble + "_client_observations.csv", meraki_cmx_analyze.OBSERVATION_HEADER,
+        (row for network in networks for row in network.get_observations()))
+    meraki_cmx_analyze.write_csv_file(outputPreamble + "_client_visits.csv", meraki_cmx_analyze.VISIT_HEADER,
+        (row for network in networks for row in network.get_visits()))
+    meraki_cmx_analyze.write_report_files(outputPreamble, proximityReports, engagementReports, loyaltyReports,
+        options.engagement_buckets)
+    timer.stop()
+
+    return {"rows": rowCount,
+        "clients": sum(len(network.clients) for network in networks),
+        "visits": sum(len(client.visits) for network in networks for client in network.clients),
+        "stages": timer.stages}
+
+# Method check_visit_buckets checks the hourly reports of one client seen
+#   every minute from 18:00 to 21:59, a single visit. Every hour of the
+#   visit must count the client as a visitor, in the proximity report,
+#   the loyalty bitmap, Network.get_visitors, the sweep summary and the
+#   reports of the SQLite store.
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: list of failed checks as strings
+#####################################################################
+def check_visit_buckets():
+    # Declare variables
+    networks = meraki_cmx_analyze.NetworkList()
+    dayStartEpoch = 1500076800
+    dayEndEpoch = dayStartEpoch + 86399
+    expectedVisitors = [int(18 <= hour <= 21) for hour in range(24)]
+    problems = []
+
+    for seenEpoch in range(dayStartEpoch + 18 * 3600, dayStartEpoch + 22 * 3600, 60):
+        networks.find_network("Check").add_observation("00:18:0a:00:00:01", "00:18:0a:00:00:02", "", "",
+            meraki_cmx_analyze.format_seen_time(seenEpoch), seenEpoch, "", 30, "", "")
+
+    network = networks[0]
+    client = network.clients[0]
+    meraki_cmx_analyze.discover_visits(networks, meraki_cmx_analyze.VISIT_PARAMETERS)
+
+    if len(client.visits) != 1:
+        problems.append("expected 1 visit, found " + str(len(client.visits)))
+
+    proximityReports = network.get_cmx_proximity_reports(dayStartEpoch, dayEndEpoch, 3600)
+    loyaltyReports = network.get_cmx_loyalty_reports(dayStartEpoch, dayEndEpoch, 3600)
+    visitBitmap = client.get_visit_bitmap(dayStartEpoch, 3600)
+
+    if [int(row[3]) for row in proximityReports] != expectedVisitors:
+        problems.append("proximity visitors per hour " + str([row[3] for row in proximityReports]))
+
+    if [int((visitBitmap >> hour) & 1) for hour in range(24)] != expectedVisitors:
+        problems.append("loyalty visit bitmap " + bin(visitBitmap))
+
+    if [len(network.get_visitors(dayStartEpoch + hour * 3600, dayStartEpoch + hour * 3600 + 3599)) for hour in range(24)] != \
+        expectedVisitors:
+        problems.append("get_visitors disagrees with the hourly buckets")
+
+    sweepSummary = network.get_sweep_summary(meraki_cmx_analyze.VISIT_PARAMETERS, dayStartEpoch, dayEndEpoch, 3600)
+
+    if int(sweepSummary[4]) != sum(expectedVisitors):
+        problems.append("sweep visitor hours " + sweepSummary[4])
+
+    store = meraki_cmx_analyze.SQLiteStore(":memory:")
+    store.load_observations(networks)
+    store.load_visits(networks, [], meraki_cmx_analyze.VISIT_PARAMETERS)
+
+    if store.get_cmx_proximity_reports("Check", dayStartEpoch, dayEndEpoch, 3600) != proximityReports:
+        problems.append("SQLite proximity report disagrees with the in-memory report")
+
+    if store.get_cmx_loyalty_reports("Check", dayStartEpoch, dayEndEpoch, 3600) != loyaltyReports:
+        problems.append("SQLite loyalty report disagrees with the in-memory report")
+
+    store.close()
+
+    return problems
+
+# Method generate_input writes the synthetic input of one scale unless it
+#   already exists in the work directory
+#
+# Input: None
+# Output: CSV file in the work directory
+# Parameters:
+#   scale - approximate number of rows
+#   options - parsed command line options
+#
+# Return Value: name of the input file
+#####################################################################
+def generate_input(scale, options):
+    inputFileName = os.path.join(options.work_dir, "cmx_" + str(scale) + ".csv")
+
+    if not os.path.exists(inputFileName):
+        print("Generating " + inputFileName)
+        generateOptions = cmx_generate.parse_arguments(["--rows", str(scale), "--sites", str(options.sites),
+            "--days", str(options.days), "--seed", str(scale)])
+        outputStream = open(inputFileName + ".tmp", 'wb', 1024 * 1024)
+        cmx_generate.generate(outputStream, generateOptions)
+        outputStream.close()
+        os.rename(inputFileName + ".tmp", inputFileName)
+
+    return inputFileName
+
+# Method run_scale runs one scale in a new process so memory peaks of the
+#   scales do not mix
+#
+# Input: None
+# Output: None
+# Parameters:
+#   inputFileName - CSV file to analyze
+#   options - parsed command line options
+#
+# Return Value: dictionary returned by run_stages
+#####################################################################
+def run_scale(inputFileName, options):
+    command = [sys.executable, os.path.abspath(__file__), "--run-stages", inputFileName, "--work-dir", options.work_dir,
+        "--workers", str(options.workers), "--engagement-buckets", ",".join([str(edge) for edge in options.engagement_buckets])]
+
+    if options.columnar:
+        command.append("--columnar")
+
+    return json.loads(subprocess.check_output(command))
+
+# Method read_results reads the stage timings of a results file, keeping
+#   the last run of every scale and stage
+#
+# Input: None
+# Output: None
+# Parameters:
+#   resultsFileName - CSV file written by a previous benchmark
+#
+# Return Value: dictionary of (scale, stage) to wall seconds
+#####################################################################
+def read_results(resultsFileName):
+    # Declare variables
+    results = {}
+
+    for row in csv.DictReader(open(resultsFileName, 'rb')):
+        results[(row["Scale"], row["Stage"])] = float(row["Wall Seconds"])
+
+    return results
+
+# Method benchmark runs every scale and appends the results
+#
+# Input: None
+# Output: results CSV file and a summary on standard output
+# Parameters:
+#   options - parsed command line options
+#
+# Return Value: list of regressions as strings
+#####################################################################
+def benchmark(options):
+    # Declare variables
+    runTime = time.strftime('%Y-%m-%d %H:%M:%S')
+    optionText = "columnar=" + str(options.columnar) + " workers=" + str(options.workers)
+    baseline = read_results(options.baseline) if options.baseline != None else {}
+    regressions = []
+
+    if not os.path.isdir(options.work_dir):
+        os.makedirs(options.work_dir)
+
+    writeHeader = not os.path.exists(options.results)
+    resultsFile = open(options.results, 'ab')
+    writer = csv.writer(resultsFile, lineterminator='\n')
+
+    if writeHeader:
+        writer.writerow(RESULT_COLUMNS)
+
+    for scale in options.scales:
+        result = run_scale(generate_input(scale, options), options)
+
+        for stage in result["stages"]:
+            rowsPerSecond = int(result["rows"] / stage["wall"]) if stage["wall"] > 0 else 0
+            writer.writerow([runTime, scale, result["rows"], result["clients"], result["visits"], stage["stage"],
+                "%.3f" % stage["wall"], "%.3f" % stage["cpu"], rowsPerSecond, "%.1f" % stage["peakRSS"], optionText])
+            print("%10d rows %-24s %10.3fs %10.1f MB" % (result["rows"], stage["stage"], stage["wall"], stage["peakRSS"]))
+
+            baselineWall = baseline.get((str(scale), stage["stage"]))
+            if (baselineWall != None) and (stage["wall"] > baselineWall * (1 + options.threshold / 100.0)):
+                regressions.append("%d rows %s: %.3fs, baseline %.3fs" % (scale, stage["stage"], stage["wall"], baselineWall))
+
+        resultsFile.flush()
+
+    resultsFile.close()
+
+    for regression in regressions:
+        print("Regression: " + regression)
+
+    return regressions
+
+# Method parse_scales reads a comma separated list of scales from the
+#   command line
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - command line value such as 10000,100000
+#
+# Return Value: list of scales in rows, in command line order
+#####################################################################
+def parse_scales(value):
+    try:
+        scales = [int(scale) for scale in value.split(',') if scale.strip() != ""]
+    except ValueError:
+        raise argparse.ArgumentTypeError("scales must be whole numbers of rows: " + value)
+
+    if (len(scales) == 0) or (min(scales) <= 0):
+        raise argparse.ArgumentTypeError("scales must be more than 0 rows: " + value)
+
+    return scales
+
+# Method main
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: None
+#####################################################################
+def main():
+    parser = argparse.ArgumentParser(prog="cmx_benchmark")
+    parser.add_argument("--scales", type=parse_scales, default=DEFAULT_SCALES,
+        help="comma separated row counts (default 10000,100000,1000000,10000000,50000000)")
+    parser.add_argument("--sites", type=int, default=20, help="sites in generated inputs (default 20)")
+    parser.add_argument("--days", type=int, default=7, help="days in generated inputs (default 7)")
+    parser.add_argument("--work-dir", default="cmx_benchmark", help="directory for inputs and outputs (default cmx_benchmark)")
+    parser.add_argument("--results", default="cmx_benchmark_results.csv", help="results file to append to")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10, help="percent slower than baseline to report (default 10)")
+    parser.add_argument("--columnar", action="store_true", help="run with the columnar observation store")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for visits (default 1)")
+    parser.add_argument("--engagement-buckets", type=meraki_cmx_analyze.parse_length_buckets,
+        default=meraki_cmx_analyze.ENGAGEMENT_BUCKETS, help="engagement visit length buckets")
+    parser.add_argument("--check", action="store_true", help="only check the reports of a visit spanning several hours")
+    parser.add_argument("--run-stages", metavar="INPUT_FILE", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    # Child process of run_scale
+    if options.run_stages != None:
+        outputDirectory = os.path.join(options.work_dir, "output")
+
+        if not os.path.isdir(outputDirectory):
+            os.makedirs(outputDirectory)
+
+        print(json.dumps(run_stages(options.run_stages, outputDirectory, options)))
+        return None
+
+    problems = check_visit_buckets()
+
+    for problem in problems:
+        print("Check failed: " + problem)
+
+    if (len(problems) > 0) or options.check:
+        sys.exit(1 if len(problems) > 0 else 0)
+
+    if len(benchmark(options)) > 0:
+        sys.exit(1)
+
+    return None
+
+
+if __name__ == '__main__':
+    main()
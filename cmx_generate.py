@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+#########################################################################
+# cmx_generate.py writes a synthetic CSV file of Meraki CMX push API
+#    observations in the format read by meraki_cmx_analyze.py, for
+#    benchmarking and testing.
+#
+# Every site gets its own access points and client devices. A device is
+#   a passerby (a few weak pings), a visitor (sessions of minutes to
+#   hours on the days it comes back) or a long-dwell device (staff phones
+#   and POS terminals seen most of the day). Rows are written in time
+#   order, one day at a time.
+#
+# Usage:
+#   cmx_generate.py [--sites N] [--clients N | --rows N] [--days N]
+#       [--ping-interval S] [--rssi-mean N] [--rssi-stddev N]
+#       [--connected-ratio R] [--long-dwell-ratio R] [--seed N]
+#       [output_file_name]
+#
+#########################################################################
+
+import sys,time,random,csv,argparse,calendar
+
+# Header written on the first line, matching the client observations
+#   file of meraki_cmx_analyze.py
+OUTPUT_HEADER = ["Network", "AP Mac", "Client Mac", "ipv4 Address", "ipv6 Address", "Seen Time", "Seen Epoch", "SSID",
+    "RSSI", "Manufacturer", "Operating System"]
+
+# Manufacturer and operating system pairs given to devices
+DEVICE_TYPES = [("Apple", "iOS"), ("Apple", "Mac OS X"), ("Samsung", "Android"), ("Google", "Android"),
+    ("Intel", "Windows"), ("Unknown", "")]
+
+# Share of devices that only pass by the site
+PASSERBY_RATIO = 0.6
+
+#########################################################################
+# Class Device
+#
+# Profile of one generated client device
+#########################################################################
+class Device:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   rng - random.Random used for the profile
+    #   siteIndex - index of the site the device belongs to
+    #   options - parsed command line options
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, rng, siteIndex, options):
+        kind = rng.random()
+
+        self.clientMac = random_mac(rng)
+        (self.manufacturer, self.os) = rng.choice(DEVICE_TYPES)
+        self.connected = rng.random() < options.connected_ratio
+        self.ipv4 = "10.%d.%d.%d" % (siteIndex % 256, rng.randint(0, 255), rng.randint(1, 254)) if self.connected else ""
+        self.ipv6 = ""
+
+        if kind < options.long_dwell_ratio:
+            self.kind = "long-dwell"
+            self.returnRate = 0.9
+        elif kind < options.long_dwell_ratio + PASSERBY_RATIO:
+            self.kind = "passerby"
+            self.returnRate = 0.1
+        else:
+            self.kind = "visitor"
+            self.returnRate = rng.choice([0.05, 0.2, 0.5])
+
+# Method random_mac builds a random MAC address string
+#
+# Input: None
+# Output: None
+# Parameters:
+#   rng - random.Random to draw from
+#
+# Return Value: MAC address such as 00:18:0a:12:34:56
+#####################################################################
+def random_mac(rng):
+    return ":".join(["%02x" % rng.randint(0, 255) for i in range(6)])
+
+# Method rows_per_client estimates how many rows one device generates over
+#   the run, used to turn --rows into a device count
+#
+# Input: None
+# Output: None
+# Parameters:
+#   options - parsed command line options
+#
+# Return Value: estimated rows per device
+#####################################################################
+def rows_per_client(options):
+    # Seconds seen per day: passersby stay a couple of minutes, visitors
+    #   average 1.25 sessions of about 37 minutes, long-dwell devices 9.5
+    #   hours
+    passerbyRows = 1 + 150.0 / options.ping_interval
+    visitorRows = 1.25 * (1 + 2200.0 / options.ping_interval)
+    longDwellRows = 1 + 9.5 * 3600 / options.ping_interval
+    visitorRatio = 1 - PASSERBY_RATIO - options.long_dwell_ratio
+
+    # Every device shows up on the first day, then at its return rate
+    firstDayRows = PASSERBY_RATIO * passerbyRows + visitorRatio * visitorRows + options.long_dwell_ratio * longDwellRows
+    laterDayRows = (PASSERBY_RATIO * 0.1 * passerbyRows + visitorRatio * 0.25 * visitorRows +
+        options.long_dwell_ratio * 0.9 * longDwellRows)
+
+    return max(1.0, firstDayRows + laterDayRows * (options.days - 1))
+
+# Method build_sites builds the access points and devices of every site
+#
+# Input: None
+# Output: None
+# Parameters:
+#   rng - random.Random to draw from
+#   options - parsed command line options
+#
+# Return Value: list of (site name, access point MACs, devices) tuples
+#####################################################################
+def build_sites(rng, options):
+    # Declare variables
+    sites = []
+
+    for siteIndex in range(options.sites):
+        apMacs = [random_mac(rng) for i in range(options.aps_per_site)]
+        devices = [Device(rng, siteIndex, options) for i in range(options.clients)]
+        sites.append(("Site" + str(siteIndex + 1), apMacs, devices))
+
+    return sites
+
+# Method device_sessions draws the sessions of a device on one day
+#
+# Input: None
+# Output: None
+# Parameters:
+#   rng - random.Random to draw from
+#   device - Device to draw sessions for
+#   dayEpoch - epoch time of midnight of the day
+#
+# Return Value: list of (start epoch, end epoch) tuples
+#####################################################################
+def device_sessions(rng, device, dayEpoch):
+    if device.kind == "long-dwell":
+        startEpoch = dayEpoch + rng.randint(6 * 3600, 9 * 3600)
+        return [(startEpoch, startEpoch + rng.randint(8 * 3600, 11 * 3600))]
+
+    if device.kind == "passerby":
+        startEpoch = dayEpoch + rng.randint(7 * 3600, 22 * 3600)
+        return [(startEpoch, startEpoch + rng.randint(0, 300))]
+
+    sessions = []
+    for i in range(rng.choice([1, 1, 1, 2])):
+        startEpoch = dayEpoch + rng.randint(8 * 3600, 20 * 3600)
+        sessions.append((startEpoch, startEpoch + int(min(6 * 3600, rng.lognormvariate(7.3, 0.9)))))
+
+    return sessions
+
+# Method generate_day_rows draws the observation rows of every site for
+#   one day
+#
+# Input: None
+# Output: None
+# Parameters:
+#   rng - random.Random to draw from
+#   sites - sites built by build_sites
+#   dayIndex - day number counted from the first day
+#   dayEpoch - epoch time of midnight of the day
+#   options - parsed command line options
+#
+# Return Value: list of rows sorted by seen time
+#####################################################################
+def generate_day_rows(rng, sites, dayIndex, dayEpoch, options):
+    # Declare variables
+    rows = []
+
+    for (siteName, apMacs, devices) in sites:
+        for device in devices:
+            # Every device shows up on the first day, later days depend on the return rate
+            if (dayIndex > 0) and (rng.random() >= device.returnRate):
+                continue
+
+            apMac = rng.choice(apMacs)
+
+            for (startEpoch, endEpoch) in device_sessions(rng, device, dayEpoch):
+                seenEpoch = startEpoch
+                rssiMean = options.rssi_mean if device.kind != "passerby" else options.rssi_mean / 2
+
+                while seenEpoch <= endEpoch:
+                    # Devices roam between access points now and then
+                    if rng.random() < 0.05:
+                        apMac = rng.choice(apMacs)
+
+                    rssi = max(1, int(rng.gauss(rssiMean, options.rssi_stddev)))
+                    ssid = options.ssid if device.connected and (rng.random() < 0.9) else ""
+                    rows.append((seenEpoch, siteName, apMac, device.clientMac, device.ipv4 if ssid != "" else "", device.ipv6,
+                        time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seenEpoch)), str(seenEpoch), ssid, str(rssi),
+                        device.manufacturer, device.os))
+
+                    seenEpoch = seenEpoch + max(1, int(rng.expovariate(1.0 / options.ping_interval)))
+
+    rows.sort()
+
+    return [row[1:] for row in rows]
+
+# Method generate writes the whole synthetic file
+#
+# Input: None
+# Output: CSV rows to outputStream
+# Parameters:
+#   outputStream - open file to write
+#   options - parsed command line options
+#
+# Return Value: number of observation rows written
+#####################################################################
+def generate(outputStream, options):
+    # Declare variables
+    rng = random.Random(options.seed)
+    writer = csv.writer(outputStream, lineterminator='\n')
+    firstDayEpoch = calendar.timegm(time.strptime(options.start_date, '%Y-%m-%d'))
+    rowCount = 0
+
+    if options.rows != None:
+        options.clients = max(1, int(options.rows / rows_per_client(options) / options.sites))
+
+    sites = build_sites(rng, options)
+    writer.writerow(OUTPUT_HEADER)
+
+    for dayIndex in range(options.days):
+        rows = generate_day_rows(rng, sites, dayIndex, firstDayEpoch + dayIndex * 86400, options)
+        writer.writerows(rows)
+        rowCount = rowCount + len(rows)
+
+    return rowCount
+
+# Method parse_arguments reads the command line options
+#
+# Input: None
+# Output: None
+# Parameters:
+#   argv - command line arguments without the program name
+#
+# Return Value: parsed options
+#####################################################################
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(prog="cmx_generate")
+    parser.add_argument("output_file_name", nargs="?", help="file to write (default standard output)")
+    parser.add_argument("--sites", type=int, default=3, help="number of sites (default 3)")
+    parser.add_argument("--clients", type=int, default=1000, help="devices per site (default 1000)")
+    parser.add_argument("--rows", type=int, help="approximate total rows, sets --clients")
+    parser.add_argument("--days", type=int, default=7, help="number of days (default 7)")
+    parser.add_argument("--start-date", default="2017-07-14", help="first day as YYYY-MM-DD (default 2017-07-14)")
+    parser.add_argument("--aps-per-site", type=int, default=8, help="access points per site (default 8)")
+    parser.add_argument("--ping-interval", type=float, default=60, help="mean seconds between pings of a device (default 60)")
+    parser.add_argument("--rssi-mean", type=float, default=25, help="mean RSSI of visiting devices (default 25)")
+    parser.add_argument("--rssi-stddev", type=float, default=8, help="RSSI standard deviation (default 8)")
+    parser.add_argument("--connected-ratio", type=float, default=0.3, help="share of devices joined to the SSID (default 0.3)")
+    parser.add_argument("--long-dwell-ratio", type=float, default=0.03, help="share of long-dwell devices (default 0.03)")
+    parser.add_argument("--ssid", default="Guest", help="SSID of connected devices (default Guest)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default 1)")
+
+    return parser.parse_args(argv)
+
+# Method main
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: None
+#####################################################################
+def main():
+    options = parse_arguments(sys.argv[1:])
+
+    if options.output_file_name == None:
+        generate(sys.stdout, options)
+    else:
+        outputStream = open(options.output_file_name, 'wb', 1024 * 1024)
+        generate(outputStream, options)
+        outputStream.close()
+
+    return None
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception, e:
+        print str(e)
+        sys.exit(1)
@@ -0,0 +1,579 @@
+#!/usr/bin/env python
+#########################################################################
+# cmx_receiver.py receives the Meraki CMX push API and keeps the visits
+#    and CMX reports of meraki_cmx_analyze.py up to date while data
+#    arrives, instead of working on CSV exports.
+#
+# The receiver is a single-threaded asyncore HTTP server, so slow clients
+#   never hold up other posts. A GET answers the validator Meraki asks
+#   for when the push URL is set up, a POST carries a DevicesSeen JSON
+#   payload that must include the shared secret. Each network posts to
+#   its own path, /SiteA posts to network SiteA, and posts to / go to
+#   the --network name.
+#
+# Observations wait in memory and every --flush-interval seconds they are
+#   handed to a background thread, so posts are still accepted while it
+#   works. The thread analyzes the ones older than --delay seconds as an
+#   incremental run of meraki_cmx_analyze.py with the --checkpoint file:
+#   new observations, finished visits and finished days are appended to
+#   the CSV files. Observations that arrive after their time was flushed
+#   are dropped. After each flush the thread also finds the visits and
+#   proximity counts of the current UTC day so far from the observations
+#   of the day it keeps in memory. GET /status returns them with the
+#   receiver counters as JSON.
+#
+# --record appends every accepted post to a file that cmx_replay.py can
+#   post again, to test or benchmark the receiver with real traffic.
+#
+# Usage:
+#   cmx_receiver.py --validator TEXT --secret TEXT --checkpoint FILE
+#       [--host HOST] [--port N] [--network NAME] [--flush-interval S]
+#       [--delay S] [--columnar] [--workers N] [--engagement-buckets EDGES]
+#       [--record FILE] csv_file_preamble
+#
+#########################################################################
+
+import sys,time,json,argparse,asyncore,asynchat,socket,urllib,threading,Queue
+import meraki_cmx_analyze
+
+# Push payload types with WiFi observations
+PUSH_TYPES = ["DevicesSeen"]
+
+# Largest accepted request body
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Reason phrases of the status codes sent
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Request Entity Too Large"}
+
+# Method encode_field converts a JSON string field to a UTF-8 str, since
+#   json.loads returns unicode and the csv module of Python 2 only writes
+#   byte strings
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - field value, None for unknown fields
+#
+# Return Value: str, empty for unknown fields
+#####################################################################
+def encode_field(value):
+    if value == None:
+        return ""
+
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+
+    return str(value)
+
+# Method parse_payload converts a CMX push payload into observation rows
+#
+# Input: None
+# Output: None
+# Parameters:
+#   payload - decoded JSON payload
+#   secret - shared secret the payload must carry
+#
+# Return Value: list of rows in Network.add_observation argument order
+#####################################################################
+def parse_payload(payload, secret):
+    # Declare variables
+    rows = []
+
+    if (not isinstance(payload, dict)) or (payload.get("secret") != secret):
+        raise ValueError("secret")
+
+    if payload.get("type") not in PUSH_TYPES:
+        return rows
+
+    data = payload.get("data") or {}
+    apMac = encode_field(data.get("apMac"))
+
+    for observation in data.get("observations") or []:
+        # CMX sends addresses as /10.0.0.1 and leaves unknown fields null
+        ipv4 = encode_field(observation.get("ipv4")).lstrip("/")
+        ipv6 = encode_field(observation.get("ipv6")).lstrip("/")
+
+        rows.append((apMac, encode_field(observation["clientMac"]), ipv4, ipv6, encode_field(observation.get("seenTime")),
+            long(observation["seenEpoch"]), encode_field(observation.get("ssid")), long(observation.get("rssi") or 0),
+            encode_field(observation.get("manufacturer")), encode_field(observation.get("os"))))
+
+    return rows
+
+#########################################################################
+# Class PushReceiver
+#
+# Observations received and not analyzed yet, the checkpoint of the
+#   incremental runs, the counters of the current day and the receiver
+#   counters. add_post and flush run in the server loop, the rows handed
+#   over by flush are analyzed by a FlushWorker thread.
+#########################################################################
+class PushReceiver:
+    # Method __init__ initializes the class variables and starts the
+    #   flush thread
+    #
+    # Input: checkpoint file
+    # Output: None
+    # Parameters:
+    #   options - parsed command line options
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, options):
+        self.options = options
+        self.checkpoint = meraki_cmx_analyze.Checkpoint(options.checkpoint)
+        self.pendingRows = []
+        self.heldRows = []
+        self.dayRows = []
+        self.today = {}
+        self.latestEpoch = 0
+        self.recordFile = open(options.record, 'ab') if options.record != None else None
+        self.counters = {"posts": 0, "rejectedPosts": 0, "observations": 0, "droppedObservations": 0, "flushes": 0,
+            "failedFlushes": 0, "lastFlushSeconds": 0.0, "lastFlushError": ""}
+        self.flushQueue = Queue.Queue()
+        self.worker = FlushWorker(self)
+        self.worker.start()
+
+    # Method add_post adds the observations of a push post
+    #
+    # Input: None
+    # Output: record file
+    # Parameters:
+    #   networkName - network the post belongs to
+    #   body - JSON request body
+    #
+    # Return Value: HTTP status code
+    #####################################################################
+    def add_post(self, networkName, body):
+        try:
+            rows = parse_payload(json.loads(body), self.options.secret)
+        except ValueError, e:
+            self.counters["rejectedPosts"] = self.counters["rejectedPosts"] + 1
+            return 403 if str(e) == "secret" else 400
+        except (KeyError, TypeError, AttributeError):
+            self.counters["rejectedPosts"] = self.counters["rejectedPosts"] + 1
+            return 400
+
+        for row in rows:
+            self.pendingRows.append((networkName,) + row)
+            self.latestEpoch = max(self.latestEpoch, row[5])
+
+        # JSON strings cannot hold raw line breaks, so the body fits on one line
+        if self.recordFile != None:
+            self.recordFile.write('{"network": ' + json.dumps(networkName) + ', "payload": ' + body.replace("\n", " ") + '}\n')
+
+        self.counters["posts"] = self.counters["posts"] + 1
+        self.counters["observations"] = self.counters["observations"] + len(rows)
+
+        return 200
+
+    # Method flush hands the pending observations to the flush thread
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   flushAll - analyze every pending observation, on shutdown
+    #
+    # Return Value: None
+    #####################################################################
+    def flush(self, flushAll=False):
+        cutoffEpoch = self.latestEpoch if flushAll else self.latestEpoch - self.options.delay
+
+        self.flushQueue.put((self.pendingRows, cutoffEpoch))
+        self.pendingRows = []
+
+        if self.recordFile != None:
+            self.recordFile.flush()
+
+        return None
+
+    # Method stop waits until the flush thread has analyzed every batch
+    #   handed to it
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def stop(self):
+        self.flushQueue.put(None)
+        self.worker.join()
+
+        if self.recordFile != None:
+            self.recordFile.close()
+
+        return None
+
+    # Method analyze_rows analyzes the rows older than the cutoff as an
+    #   incremental run and keeps the newer ones for the next flush. Runs
+    #   in the flush thread.
+    #
+    # Input: None
+    # Output: CSV files and checkpoint file
+    # Parameters:
+    #   rows - rows handed over by flush
+    #   cutoffEpoch - newest seen time to analyze
+    #
+    # Return Value: None
+    #####################################################################
+    def analyze_rows(self, rows, cutoffEpoch):
+        # Declare variables
+        startTime = time.time()
+        networks = meraki_cmx_analyze.NetworkList(self.options.columnar)
+        keptRows = []
+        flushedRows = []
+
+        for row in self.heldRows + rows:
+            if row[6] > cutoffEpoch:
+                keptRows.append(row)
+            elif self.checkpoint.is_new(row[6]):
+                networks.find_network(row[0]).add_observation(*row[1:])
+                flushedRows.append(row)
+            else:
+                self.counters["droppedObservations"] = self.counters["droppedObservations"] + 1
+
+        self.heldRows = keptRows
+
+        # Log a failed batch and keep receiving, the rows of the batch are lost
+        try:
+            if len(networks) > 0:
+                meraki_cmx_analyze.analyze_networks(networks, self.options.csv_file_preamble, self.options.engagement_buckets,
+                    self.options.workers, self.checkpoint)
+
+            self.update_today(flushedRows, cutoffEpoch)
+        except Exception, e:
+            print("Flush of " + str(len(flushedRows)) + " observations failed: " + str(e))
+            self.counters["failedFlushes"] = self.counters["failedFlushes"] + 1
+            self.counters["lastFlushError"] = str(e)
+
+        self.counters["flushes"] = self.counters["flushes"] + 1
+        self.counters["lastFlushSeconds"] = round(time.time() - startTime, 3)
+
+        return None
+
+    # Method update_today finds the visits and proximity counts of every
+    #   network for the UTC day of the cutoff, from the observations of
+    #   that day flushed so far. Observations of earlier days are dropped,
+    #   so at most one day is kept in memory. Runs in the flush thread.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   flushedRows - rows analyzed by this flush
+    #   cutoffEpoch - newest seen time analyzed
+    #
+    # Return Value: None
+    #####################################################################
+    def update_today(self, flushedRows, cutoffEpoch):
+        # Declare variables
+        dayStartEpoch = cutoffEpoch - cutoffEpoch % 86400
+        networks = meraki_cmx_analyze.NetworkList(self.options.columnar)
+        today = {"day": meraki_cmx_analyze.epochtime_to_datetime(dayStartEpoch, '%Y-%m-%d'), "networks": {}}
+
+        if len(flushedRows) == 0:
+            return None
+
+        self.dayRows = [row for row in self.dayRows + flushedRows if row[6] >= dayStartEpoch]
+
+        for row in self.dayRows:
+            networks.find_network(row[0]).add_observation(*row[1:])
+
+        meraki_cmx_analyze.discover_visits(networks, meraki_cmx_analyze.VISIT_PARAMETERS)
+
+        for network in networks:
+            (passerbyCount, visitorCount, connectedCount, captureRate) = \
+                network.get_cmx_proximity_reports(dayStartEpoch, dayStartEpoch + 86399, 86400)[0][2:]
+            today["networks"][network.name] = {"visits": sum(len(client.visits) for client in network.clients),
+                "passerby": int(passerbyCount), "visitors": int(visitorCount), "connected": int(connectedCount),
+                "captureRate": int(captureRate)}
+
+        self.today = today
+
+        return None
+
+    # Method get_status returns the receiver counters
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: dictionary of counters
+    #####################################################################
+    def get_status(self):
+        status = dict(self.counters)
+        status["pendingObservations"] = len(self.pendingRows)
+        status["heldObservations"] = len(self.heldRows)
+        status["queuedFlushes"] = self.flushQueue.qsize()
+        status["latestEpoch"] = self.latestEpoch
+        status["checkpointEpoch"] = self.checkpoint.cutoffEpoch
+        status["today"] = self.today
+
+        return status
+
+#########################################################################
+# Class FlushWorker
+#
+# Thread analyzing the batches handed over by PushReceiver.flush in order,
+#   until it gets None
+#########################################################################
+class FlushWorker(threading.Thread):
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   receiver - PushReceiver of the server
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, receiver):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.receiver = receiver
+
+    # Method run analyzes batches until it gets None
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def run(self):
+        for batch in iter(self.receiver.flushQueue.get, None):
+            self.receiver.analyze_rows(*batch)
+
+        return None
+
+#########################################################################
+# Class PushChannel
+#
+# One HTTP/1.1 connection, reading the header and then Content-Length
+#   bytes of body for every request
+#########################################################################
+class PushChannel(asynchat.async_chat):
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   connection - accepted socket
+    #   receiver - PushReceiver of the server
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, connection, receiver):
+        asynchat.async_chat.__init__(self, connection)
+        self.receiver = receiver
+        self.buffers = []
+        self.requestLine = None
+        self.headers = {}
+        self.set_terminator("\r\n\r\n")
+
+    # Method collect_incoming_data keeps data until the terminator
+    #
+    # Input: socket data
+    # Output: None
+    # Parameters:
+    #   data - received bytes
+    #
+    # Return Value: None
+    #####################################################################
+    def collect_incoming_data(self, data):
+        self.buffers.append(data)
+
+    # Method found_terminator handles a complete header or body
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def found_terminator(self):
+        data = "".join(self.buffers)
+        self.buffers = []
+
+        if self.requestLine == None:
+            lines = data.split("\r\n")
+            self.requestLine = lines[0].split()
+            self.headers = {}
+
+            for line in lines[1:]:
+                (name, separator, value) = line.partition(":")
+                self.headers[name.strip().lower()] = value.strip()
+
+            bodySize = int(self.headers.get("content-length", "0") or 0)
+
+            if bodySize > MAX_BODY_SIZE:
+                self.send_response(413, "", True)
+            elif bodySize > 0:
+                self.set_terminator(bodySize)
+            else:
+                self.handle_request("")
+        else:
+            self.handle_request(data)
+
+        return None
+
+    # Method handle_request answers a complete request
+    #
+    # Input: None
+    # Output: HTTP response
+    # Parameters:
+    #   body - request body
+    #
+    # Return Value: None
+    #####################################################################
+    def handle_request(self, body):
+        (method, path, version) = (self.requestLine + ["", "", ""])[:3]
+        closeConnection = (self.headers.get("connection", "").lower() == "close") or (version == "HTTP/1.0")
+        path = urllib.unquote(path.split("?")[0])
+
+        self.requestLine = None
+        self.set_terminator("\r\n\r\n")
+
+        if (method == "GET") and (path == "/status"):
+            self.send_response(200, json.dumps(self.receiver.get_status()), closeConnection, "application/json")
+        elif method == "GET":
+            self.send_response(200, self.receiver.options.validator, closeConnection)
+        elif method == "POST":
+            networkName = path.strip("/") or self.receiver.options.network
+            self.send_response(self.receiver.add_post(networkName, body), "", closeConnection)
+        else:
+            self.send_response(405, "", closeConnection)
+
+        return None
+
+    # Method send_response queues an HTTP response
+    #
+    # Input: None
+    # Output: HTTP response
+    # Parameters:
+    #   status - HTTP status code
+    #   body - response body
+    #   closeConnection - close the connection after the response
+    #   contentType - MIME type of the body
+    #
+    # Return Value: None
+    #####################################################################
+    def send_response(self, status, body, closeConnection, contentType="text/plain"):
+        headers = ["HTTP/1.1 %d %s" % (status, STATUS_REASONS[status]), "Content-Type: " + contentType,
+            "Content-Length: " + str(len(body))]
+
+        if closeConnection:
+            headers.append("Connection: close")
+
+        self.push("\r\n".join(headers) + "\r\n\r\n" + body)
+
+        if closeConnection:
+            self.close_when_done()
+
+        return None
+
+#########################################################################
+# Class PushServer
+#
+# Listening socket of the receiver
+#########################################################################
+class PushServer(asyncore.dispatcher):
+    # Method __init__ opens the listening socket
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   host - address to listen on
+    #   port - port to listen on
+    #   receiver - PushReceiver of the server
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, host, port, receiver):
+        asyncore.dispatcher.__init__(self)
+        self.receiver = receiver
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+
+    # Method handle_accept starts a channel for a new connection
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def handle_accept(self):
+        accepted = self.accept()
+
+        if accepted != None:
+            PushChannel(accepted[0], self.receiver)
+
+        return None
+
+# Method parse_arguments reads the command line options
+#
+# Input: None
+# Output: None
+# Parameters:
+#   argv - command line arguments without the program name
+#
+# Return Value: parsed options
+#####################################################################
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(prog="cmx_receiver")
+    parser.add_argument("csv_file_preamble")
+    parser.add_argument("--validator", required=True, help="validator string of the Meraki dashboard")
+    parser.add_argument("--secret", required=True, help="secret configured for the push URL")
+    parser.add_argument("--checkpoint", required=True, metavar="FILE", help="state file of the incremental runs")
+    parser.add_argument("--host", default="", help="address to listen on (default all)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default 8080)")
+    parser.add_argument("--network", default="CMX", help="network of posts to / (default CMX)")
+    parser.add_argument("--flush-interval", type=float, default=300, help="seconds between analyses (default 300)")
+    parser.add_argument("--delay", type=int, default=120,
+        help="seconds observations wait for late posts before they are analyzed (default 120)")
+    parser.add_argument("--columnar", action="store_true", help="keep observations in columns")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for visits and reports (default 1)")
+    parser.add_argument("--engagement-buckets", type=meraki_cmx_analyze.parse_length_buckets,
+        default=meraki_cmx_analyze.ENGAGEMENT_BUCKETS, help="engagement visit length buckets")
+    parser.add_argument("--record", metavar="FILE", help="append every accepted post to FILE for cmx_replay.py")
+
+    return parser.parse_args(argv)
+
+# Method main
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: None
+#####################################################################
+def main():
+    options = parse_arguments(sys.argv[1:])
+    receiver = PushReceiver(options)
+    PushServer(options.host, options.port, receiver)
+    nextFlushTime = time.time() + options.flush_interval
+
+    try:
+        while True:
+            asyncore.loop(timeout=min(1.0, options.flush_interval), count=1)
+
+            if time.time() >= nextFlushTime:
+                receiver.flush()
+                nextFlushTime = time.time() + options.flush_interval
+    except KeyboardInterrupt:
+        receiver.flush(True)
+    finally:
+        receiver.stop()
+
+    return None
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception, e:
+        print str(e)
+        sys.exit(1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#########################################################################
+# cmx_replay.py posts the payloads recorded by cmx_receiver.py --record
+#    to a receiver again, to test it or measure how many posts it takes
+#    per second while it flushes.
+#
+# Each line of the record file holds the network and the JSON payload of
+#   one accepted post. Payloads are posted in file order over one keep
+#   alive connection to /<network> of the receiver. With --speed the
+#   posts keep the gaps between the observation times of the recording,
+#   sped up by that factor, otherwise they are posted as fast as the
+#   receiver answers. At the end the posts per second and the count of
+#   every HTTP status are printed, and the receiver status when
+#   --status is given.
+#
+# Usage:
+#   cmx_replay.py [--url URL] [--speed FACTOR] [--status] record_file
+#
+#########################################################################
+
+import sys,time,json,argparse,httplib,urllib,urlparse
+
+# Method read_records reads the network and payload of every recorded post
+#
+# Input: record file
+# Output: None
+# Parameters:
+#   recordFileName - file written by cmx_receiver.py --record
+#
+# Return Value: list of (network, payload body, latest seen time) tuples
+#####################################################################
+def read_records(recordFileName):
+    # Declare variables
+    records = []
+
+    recordFile = open(recordFileName, 'rb')
+    for line in recordFile:
+        if line.strip() == "":
+            continue
+
+        record = json.loads(line)
+        observations = record["payload"].get("data", {}).get("observations") or []
+        latestEpoch = max([observation.get("seenEpoch", 0) for observation in observations] or [0])
+        records.append((record["network"], json.dumps(record["payload"]), latestEpoch))
+    recordFile.close()
+
+    return records
+
+# Method replay posts the recorded payloads to the receiver
+#
+# Input: None
+# Output: HTTP posts to the receiver
+# Parameters:
+#   records - list from read_records
+#   url - base URL of the receiver
+#   speed - factor to speed up the recorded gaps by, 0 for no gaps
+#
+# Return Value: dictionary of HTTP status code to count
+#####################################################################
+def replay(records, url, speed):
+    # Declare variables
+    parsedUrl = urlparse.urlparse(url)
+    basePath = parsedUrl.path.rstrip("/")
+    connection = httplib.HTTPConnection(parsedUrl.netloc)
+    statusCounts = {}
+    startTime = time.time()
+    firstEpoch = records[0][2] if len(records) > 0 else 0
+
+    for (networkName, body, latestEpoch) in records:
+        if speed > 0:
+            time.sleep(max(0.0, startTime + (latestEpoch - firstEpoch) / speed - time.time()))
+
+        connection.request("POST", basePath + "/" + urllib.quote(networkName.encode("utf-8")), body,
+            {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        statusCounts[response.status] = statusCounts.get(response.status, 0) + 1
+
+    connection.close()
+
+    return statusCounts
+
+# Method get_status returns the status of the receiver
+#
+# Input: None
+# Output: None
+# Parameters:
+#   url - base URL of the receiver
+#
+# Return Value: dictionary from GET /status
+#####################################################################
+def get_status(url):
+    return json.loads(urllib.urlopen(url.rstrip("/") + "/status").read())
+
+# Method main
+#
+# Input: record file
+# Output: HTTP posts to the receiver and a summary on standard output
+# Parameters: None
+#
+# Return Value: None
+#####################################################################
+def main():
+    parser = argparse.ArgumentParser(prog="cmx_replay")
+    parser.add_argument("--url", default="http://localhost:8080", help="receiver URL (default http://localhost:8080)")
+    parser.add_argument("--speed", type=float, default=0, help="speed up the recorded gaps by FACTOR (default no gaps)")
+    parser.add_argument("--status", action="store_true", help="print the receiver status after the replay")
+    parser.add_argument("record_file", help="file written by cmx_receiver.py --record")
+    options = parser.parse_args()
+
+    records = read_records(options.record_file)
+
+    startTime = time.time()
+    statusCounts = replay(records, options.url, options.speed)
+    elapsedSeconds = max(time.time() - startTime, 0.001)
+
+    print("Posted " + str(len(records)) + " payloads in " + str(round(elapsedSeconds, 3)) + " seconds, " +
+        str(round(len(records) / elapsedSeconds, 1)) + " posts per second")
+    for statusCode in sorted(statusCounts):
+        print("  HTTP " + str(statusCode) + ": " + str(statusCounts[statusCode]))
+
+    if options.status:
+        print(json.dumps(get_status(options.url), indent=2, sort_keys=True))
+
+    # A rejected post means the recording or the receiver options are wrong
+    if sorted(statusCounts) not in ([], [200]):
+        sys.exit(1)
+
+    return None
+
+
+if __name__ == '__main__':
+    main()
@@ -16,16 +16,166 @@
 #   Site,AP Mac,Client Mac,IPv4,IPv6,Event Time ISO, \
 #       Event Time Epoch,SSID,RSSI,Manufacturer,Operating System
 #
+#   Several input files or glob patterns can be given, and gzip, bz2 and
+#   xz compressed files are decompressed as they are read.
+#
 #########################################################################
 
-import sys,os,time,operator,datetime
+import sys,os,time,operator,datetime,csv,array,argparse,bisect,itertools,multiprocessing,cPickle,mmap,struct,hashlib,json,cProfile
+import gzip,bz2,glob,threading,Queue,cStringIO,tempfile,heapq,sqlite3
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# Input columns in the order used when the file has no header, each with
+#   the header names accepted for it (compared lower case)
+INPUT_COLUMNS = [
+    ("networkName", ["network", "site"]),
+    ("apMac", ["ap mac"]),
+    ("clientMac", ["client mac"]),
+    ("ipv4", ["ipv4", "ipv4 address"]),
+    ("ipv6", ["ipv6", "ipv6 address"]),
+    ("seenTime", ["seen time", "event time iso"]),
+    ("seenEpoch", ["seen epoch", "event time epoch", "epoch time"]),
+    ("ssid", ["ssid"]),
+    ("rssi", ["rssi"]),
+    ("manufacturer", ["manufacturer"]),
+    ("os", ["operating system", "os"])
+]
+
+# Networks shared with the worker processes of a --workers run
+_workerNetworks = None
+
+# TimeFormatters by format, see epochtime_to_datetime
+_timeFormatters = {}
+
+# Version of the Checkpoint file layout
+CHECKPOINT_VERSION = 1
+
+# Version and magic number of the observation cache file layout
+CACHE_VERSION = 2
+CACHE_MAGIC = "CMXCACHE"
+
+# Columns of a client block in the observation cache, 8 byte columns
+#   first so every column stays aligned
+CACHE_COLUMNS = [('seenEpochs', 'l'), ('rssis', 'l'), ('apMacs', 'I'), ('ipv4s', 'I'), ('ipv6s', 'I'), ('seenTimes', 'I'),
+    ('ssids', 'I'), ('manufacturers', 'I'), ('oses', 'I'), ('connected', 'B')]
+
+# Format of the seen time column, observations only keep seen times that
+#   differ from their formatted seen epoch
+SEEN_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Formats TimeFormatter builds from a date prefix formatted once per day
+#   and a time of day suffix
+DAY_TIME_FORMATS = {
+    '%Y-%m-%d %H:%M:%S': ('%Y-%m-%d ', '%02d:%02d:%02d'),
+    '%Y-%m-%dT%H:%M:%SZ': ('%Y-%m-%dT', '%02d:%02d:%02dZ'),
+    '%Y-%m-%d': ('%Y-%m-%d', '')
+}
+
+# Write buffer size of the output CSV files
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# Read block size of the input files and the number of blocks a
+#   background reader thread may read ahead
+INPUT_BUFFER_SIZE = 1024 * 1024
+INPUT_READ_AHEAD = 8
+
+# Array columns of ObservationColumns
+OBSERVATION_ARRAYS = ['seenEpochs', 'rssis', 'connected', 'partOfVisit', 'apMacs', 'ipv4s', 'ipv6s', 'ssids', 'manufacturers', 'oses']
+
+# Size of the chunks uncompressed input files are split into to be
+#   parsed by parse_input_files_parallel
+INPUT_CHUNK_SIZE = 32 * 1024 * 1024
+
+# Magic numbers of the compressed input formats
+INPUT_FORMATS = [("\x1f\x8b", "gzip"), ("BZh", "bz2"), ("\xfd7zXZ\x00", "xz")]
+
+# Report bucket lengths in seconds accepted by name on the command line
+GRANULARITIES = {"hourly": 3600, "daily": 86400, "weekly": 604800}
+
+# Report buckets are aligned to whole multiples of their length since
+#   this Monday, 1970-01-05, so weekly buckets start on Mondays
+BUCKET_ORIGIN_EPOCH = 4 * 86400
+
+# Default bucket lengths of the proximity, engagement and loyalty reports
+REPORT_GRANULARITIES = (86400, 86400, 86400)
+
+# Visit discovery parameters: 5 observations per window, 1200 second
+#   window, min start RSSI 20, min session RSSI 15
+VISIT_PARAMETERS = (5,1200,20,15)
+
+# Headers of the client observations and client visits files
+OBSERVATION_HEADER = ["Network", "AP Mac", "Client Mac", "ipv4", "ipv6", "Seen Time", "Epoch Time", "SSID", "RSSI", "Manufacturer", "OS"]
+VISIT_HEADER = ["Network", "Client Mac", "Seen Time Start", "Seen Time End", "Visit Length", "Connected"]
+
+# Approximate memory in bytes of one row held by ExternalSorter besides
+#   its field strings, and the most spill files merged at once
+SPILL_ROW_OVERHEAD = 600
+SPILL_MERGE_WIDTH = 128
+
+# Seconds before the latest observation of a client within which
+#   DuplicateFilter remembers its observations, and rows between sweeps
+#   of the clients not seen since the last sweep
+DUPLICATE_WINDOW = 300
+DUPLICATE_SWEEP_ROWS = 100000
+
+# Tables and indexes of SQLiteStore
+SQLITE_TABLES = [
+    "CREATE TABLE IF NOT EXISTS runs (input_key TEXT, visit_parameters TEXT)",
+    "CREATE TABLE IF NOT EXISTS networks (network_index INTEGER, site TEXT)",
+    "CREATE TABLE IF NOT EXISTS observations (site TEXT, client_mac TEXT, ap_mac TEXT, ipv4 TEXT, ipv6 TEXT, seen_time TEXT, " +
+        "seen_epoch INTEGER, ssid TEXT, rssi INTEGER, manufacturer TEXT, os TEXT)",
+    "CREATE TABLE IF NOT EXISTS visits (site TEXT, client_mac TEXT, start_epoch INTEGER, end_epoch INTEGER, length INTEGER, " +
+        "connected INTEGER)"
+]
+SQLITE_INDEXES = [
+    ("observations_client", "observations", "site, client_mac, seen_epoch"),
+    ("observations_time", "observations", "site, seen_epoch"),
+    ("observations_ap", "observations", "ap_mac, seen_epoch"),
+    ("visits_client", "visits", "site, client_mac, start_epoch"),
+    ("visits_start", "visits", "site, start_epoch"),
+    ("visits_end", "visits", "site, end_epoch")
+]
+
+# Output files a run can write, in the order they are written, see
+#   parse_outputs
+OUTPUTS = ["observations", "visits", "proximity", "engagement", "loyalty"]
+
+# Header of the visit parameter sweep file, see sweep_visit_parameters
+SWEEP_HEADER = ["Network", "Observations Per Window", "Window", "Min Start RSSI", "Min Session RSSI", "Visits",
+    "Visiting Clients", "Mean Visit Length", "Passerby", "Visitors", "Connected", "Capture Rate"]
+
+# Lower edges in seconds of the engagement report visit length buckets:
+#   5-20 mins, 20-60 mins, 1-6 hrs, 6+ hrs
+ENGAGEMENT_BUCKETS = [300, 1200, 3600, 21600]
 
 #########################################################################
 # Class Observation
 #
-# Container is for importing the raw observations from the input file
+# Container is for importing the raw observations from the input file.
+#   Repeated strings are interned so observations share one copy, and the
+#   seen time string is only kept when it is not the formatted seen epoch.
 #########################################################################
-class Observation:
+class Observation(object):
+    __slots__ = ['apMac', 'clientMac', 'ipv4', 'ipv6', 'seenTimeString', 'seenEpoch', 'ssid', 'rssi', 'manufacturer', 'os',
+        'partOfVisit', 'connected']
+
     # Method __init__ initializes the class variables
     #
     # Input: None
@@ -35,23 +185,31 @@ class Observation:
     # Return Value: None
     #####################################################################
     def __init__(self, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os):
-        self.apMac = apMac
-        self.clientMac = clientMac
-        self.ipv4 = ipv4
-        self.ipv6 = ipv6
-        self.seenTime = seenTime
+        self.apMac = intern_string(apMac)
+        self.clientMac = intern_string(clientMac)
+        self.ipv4 = intern_string(ipv4)
+        self.ipv6 = intern_string(ipv6)
         self.seenEpoch = long(seenEpoch)
-        self.ssid = ssid
+        self.seenTimeString = None if seenTime == format_seen_time(self.seenEpoch) else seenTime
+        self.ssid = intern_string(ssid)
         self.rssi = long(rssi)
-        self.manufacturer = manufacturer
-        self.os = os
+        self.manufacturer = intern_string(manufacturer)
+        self.os = intern_string(os)
         self.partOfVisit = False
         self.connected = False
         
         # If you have an SSID set, you must be connected
         if self.ssid != "":
             self.connected = True
-        
+
+    # Property seenTime is the seen time string of the input
+    #####################################################################
+    @property
+    def seenTime(self):
+        if self.seenTimeString == None:
+            return format_seen_time(self.seenEpoch)
+
+        return self.seenTimeString
 
     # Method to_string builds a CSV string of all class variables
     #
@@ -62,77 +220,82 @@ class Observation:
     # Return Value: CSV string of all class variables
     #####################################################################
     def to_string(self):
-        returnString = ""
-        returnString = returnString + self.apMac + ','
-        returnString = returnString + self.clientMac + ','
-        returnString = returnString + self.ipv4 + ','
-        returnString = returnString + self.ipv6 + ','
-        returnString = returnString + self.seenTime + ','
-        returnString = returnString + str(self.seenEpoch) + ','
-        returnString = returnString + self.ssid + ','
-        returnString = returnString + str(self.rssi) + ','
-        returnString = returnString + self.manufacturer + ','
-        returnString = returnString + self.os
-        return returnString
+        return ",".join(self.to_row())
 
-#########################################################################
-# Class Client
-#
-# Container to identify Clients that have connected to a network
-#########################################################################
-class Client:
-    # Method __init__ initializes the class variables
+    # Method to_row builds a CSV row of all class variables
     #
     # Input: None
     # Output: None
-    # Parameters: 
+    # Parameters: None
     #
-    # Return Value: None
+    # Return Value: list of all class variables as strings
     #####################################################################
-    def __init__(self, clientMac):
-        self.clientMac = clientMac
-        self.observations = []
-        self.visits = []
-        self.manufacturer = ""
-        self.os = ""
-        
-    # Method add_observation takes the passed observation and appends items
-    #   to the current list of observations owned by the client
+    def to_row(self):
+        return [self.apMac, self.clientMac, self.ipv4, self.ipv6, self.seenTime, str(self.seenEpoch),
+            self.ssid, str(self.rssi), self.manufacturer, self.os]
+
+#########################################################################
+# Class ObservationList
+#
+# Row store keeping one Observation object per observation, used as the
+#   default observation store of a Client
+#########################################################################
+class ObservationList(list):
+    # Method add builds an Observation from the passed fields and appends
+    #   it to the list
     #
     # Input: None
     # Output: None
-    # Parameters:
-    #   newObservation - observation to add to the list for the client
+    # Parameters: Observation fields
     #
     # Return Value: None
     #####################################################################
-    def add_observation(self, newObservation):
-        # Add observation to list
-        self.observations.append(newObservation)
+    def add(self, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os):
+        self.append(Observation(apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os))
 
         return None
 
-    # Method is_passerby checks if the client was seen during a specific
-    #   time window
+    # Method merge appends the observations of another store of the same
+    #   client, see Network.merge
     #
     # Input: None
     # Output: None
     # Parameters:
-    #   startTimeEpoch - Start of search window
-    #   endTimeEpoch - End of search window
+    #   other - ObservationList or ObservationColumns to append
+    #   codeMap - for ObservationColumns, list with the interned string of
+    #     every code of their string table
     #
     # Return Value: None
     #####################################################################
-    def is_passerby(self, startTimeEpoch, endTimeEpoch):
-        # For each observation in the list, look if the epoch time matches
-        for observation in self.observations:
-            # If observation falls into the window return True
-            if (observation.seenEpoch >= startTimeEpoch) and (observation.seenEpoch <= endTimeEpoch):
-                return True
+    def merge(self, other, codeMap=None):
+        if not isinstance(other, ObservationColumns):
+            self.extend(other)
 
-        return False
-    
-    # Method is_visitor
+            return None
+
+        # Fill the slots straight from the columns, the fields are already parsed
+        for (index, apMac, ipv4, ipv6, seenEpoch, ssid, rssi, manufacturer, os, connected, partOfVisit) in itertools.izip(
+            itertools.count(), other.apMacs, other.ipv4s, other.ipv6s, other.seenEpochs, other.ssids, other.rssis,
+            other.manufacturers, other.oses, other.connected, other.partOfVisit):
+            observation = Observation.__new__(Observation)
+            observation.apMac = codeMap[apMac]
+            observation.clientMac = intern_string(other.clientMac)
+            observation.ipv4 = codeMap[ipv4]
+            observation.ipv6 = codeMap[ipv6]
+            observation.seenEpoch = long(seenEpoch)
+            observation.seenTimeString = other.seenTimes.get(index)
+            observation.ssid = codeMap[ssid]
+            observation.rssi = long(rssi)
+            observation.manufacturer = codeMap[manufacturer]
+            observation.os = codeMap[os]
+            observation.partOfVisit = bool(partOfVisit)
+            observation.connected = bool(connected)
+            self.append(observation)
+
+        return None
+
+    # Method sort_by_epoch sorts the observations by seen time keeping the
+    #   input order of equal times
     #
     # Input: None
     # Output: None
@@ -140,359 +303,316 @@ class Client:
     #
     # Return Value: None
     #####################################################################
-    def is_visitor(self, startTimeEpoch, endTimeEpoch):
-        for visit in self.visits:
-            if (visit.startTimeEpoch >= startTimeEpoch) and (visit.startTimeEpoch <= endTimeEpoch):
-                return True
-            elif (visit.endTimeEpoch >= startTimeEpoch) and (visit.endTimeEpoch <= endTimeEpoch):
-                return True
+    def sort_by_epoch(self):
+        self.sort(key=operator.attrgetter('seenEpoch'))
 
-        return False
-    
-    # Method is_connected
+        return None
+
+    # Method get_epochs, get_rssis and get_connected return one column of
+    #   the observations as a sequence
     #
     # Input: None
     # Output: None
     # Parameters: None
     #
-    # Return Value: None
+    # Return Value: list of column values in observation order
     #####################################################################
-    def is_connected(self, startTimeEpoch, endTimeEpoch):
-        for visit in self.visits:
-            if (visit.startTimeEpoch >= startTimeEpoch) and (visit.startTimeEpoch <= endTimeEpoch) and (visit.connected == True):
-                return True
-            elif (visit.endTimeEpoch >= startTimeEpoch) and (visit.endTimeEpoch <= endTimeEpoch) and (visit.connected == True):
-                return True
+    def get_epochs(self):
+        return [observation.seenEpoch for observation in self]
 
-        return False
+    def get_rssis(self):
+        return [observation.rssi for observation in self]
+
+    def get_connected(self):
+        return [observation.connected for observation in self]
+
+    def get_part_of_visit(self):
+        return [observation.partOfVisit for observation in self]
 
-    # Method get_visits builds a CSV string of all class variables
+    # Method get_rows yields the CSV row of every observation
     #
     # Input: None
     # Output: None
     # Parameters: None
     #
-    # Return Value: CSV string of all class variables
+    # Return Value: generator of observation rows
     #####################################################################
-    def get_visits(self, networkName):
-        returnString = ""
-
-        for visit in self.visits:
-            returnString = returnString + networkName + "," + self.clientMac + "," + visit.to_string() + "\n"
-        
-        return returnString
+    def get_rows(self):
+        for observation in self:
+            yield observation.to_row()
 
-    # Method discover_visits builds a CSV string of all class variables
+    # Method set_part_of_visit stores the visit flag of every observation
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   partOfVisit - sequence of flags in observation order
     #
-    # Return Value: CSV string of all class variables
+    # Return Value: None
     #####################################################################
-    def discover_visits(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
-        # Declare variables
-        i = 0
-        maxIndex = len(self.observations) - 1
-        
-        # Sort observations
-        self.observations.sort(key=operator.attrgetter('seenEpoch'))
-        
-        while i <= maxIndex:
-            self._find_visits(i, observationsPerWindow, window, minStartRSSI, minSessionRSSI)
-            i = i + 1
+    def set_part_of_visit(self, partOfVisit):
+        for i in range(len(self)):
+            self[i].partOfVisit = bool(partOfVisit[i])
 
-        i = 0
-
-        while i <= maxIndex:
-            i = self._build_visits(i, window)
-        
-        # Sort visits
-        self.visits.sort(key=operator.attrgetter('startTimeEpoch'))
-        
         return None
 
-    # Method _find_visit builds a CSV string of all class variables
+#########################################################################
+# Class StringTable
+#
+# Dictionary encoding of repeated strings, shared by the observation
+#   columns of one network
+#########################################################################
+class StringTable:
+    # Method __init__ initializes the class variables
     #
     # Input: None
     # Output: None
     # Parameters: None
     #
-    # Return Value: CSV string of all class variables
+    # Return Value: None
     #####################################################################
-    def _find_visits(self, startIndex, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
-        # Declare variables
-        maxIndex = len(self.observations) - 1
-        i = 0
-        eventCount = 0
-    
-        if (self.observations[startIndex].connected == False) and (self.observations[startIndex].rssi < minStartRSSI):
-            return None
-        
-        if startIndex + i > maxIndex:
-            return None
-        
-        # Search list until epoch time is current observation time + window
-        while (self.observations[startIndex + i].seenEpoch <= self.observations[startIndex].seenEpoch + window):
-            if (self.observations[startIndex + i].rssi >= minSessionRSSI) or (self.observations[startIndex + i].connected == True):
-                eventCount = eventCount + 1
-
-            i = i + 1
-
-            if startIndex + i > maxIndex:
-                break
-        
-        i = 0
-        
-        if eventCount >= observationsPerWindow:
-            # Search list until epoch time is current observation time + window
-            while (self.observations[startIndex + i].seenEpoch <= self.observations[startIndex].seenEpoch + window):
-                self.observations[startIndex + i].partOfVisit = True
-                
-                i = i + 1
-
-                if startIndex + i > maxIndex:
-                    break
-                
-        return None
+    def __init__(self):
+        self.values = []
+        self.codes = {}
 
-    # Method _build_visits builds a CSV string of all class variables
+    # Method encode returns the code of a string, adding it to the table
+    #   if it is new
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   value - string to encode
     #
-    # Return Value: CSV string of all class variables
+    # Return Value: integer code of the string
     #####################################################################
-    def _build_visits(self, startIndex, window):
-        # Declare variables
-        maxIndex = len(self.observations) - 1
-        i = startIndex
-        
-        if self.observations[i].partOfVisit == True:
-            newVisit = Visit(self.observations[i].seenEpoch, self.observations[i].seenEpoch)
-            self.visits.append(newVisit)
-    
-            while (self.observations[i].partOfVisit == True) and (self.observations[i].seenEpoch - window <= newVisit.endTimeEpoch):
-                newVisit.endTimeEpoch = self.observations[i].seenEpoch
-                
-                if self.observations[i].connected == True:
-                    newVisit.connected = True
-                
-                i = i + 1
-                
-                if i > maxIndex:
-                    break
-            
-            newVisit.length = newVisit.endTimeEpoch - newVisit.startTimeEpoch
-        else:
-            i = i + 1
-        
-        return i
+    def encode(self, value):
+        code = self.codes.get(value)
+
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
 
-    # Method get_observations builds a CSV string of all class variables
+        return code
+
+    # Methods __getstate__ and __setstate__ pickle only the values, the
+    #   codes are rebuilt when the table is loaded
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   state - tuple of the values list
     #
-    # Return Value: CSV string of all class variables
+    # Return Value: tuple of the values list
     #####################################################################
-    def get_observations(self, networkName):
-        returnString = ""
-        
-        for observation in self.observations:
-            returnString = returnString + networkName + "," + observation.to_string() + "\n"
+    def __getstate__(self):
+        return (self.values,)
 
-        return returnString
+    def __setstate__(self, state):
+        self.values = state[0]
+        self.codes = dict((value, code) for (code, value) in enumerate(self.values))
+
+        return None
 
 #########################################################################
-# Class Network
+# Class ObservationColumns
 #
-# 
+# Column store for the observations of one client. Epoch, RSSI and flags
+#   are kept in arrays and the repeated strings as StringTable codes, so
+#   an observation costs a few dozen bytes instead of a Python object.
+#   Seen times are formatted from the epoch, only those that differ are
+#   kept, by index. It behaves like a list of Observation objects for
+#   output.
 #########################################################################
-class Network:
+class ObservationColumns:
     # Method __init__ initializes the class variables
     #
     # Input: None
     # Output: None
-    # Parameters: 
+    # Parameters:
+    #   stringTable - StringTable shared by the network
     #
     # Return Value: None
     #####################################################################
-    def __init__(self, name):
-        self.name = name
-        self.clients = []
+    def __init__(self, stringTable):
+        self.stringTable = stringTable
+        self.clientMac = ""
+        self.seenEpochs = array.array('l')
+        self.rssis = array.array('l')
+        self.connected = array.array('B')
+        self.partOfVisit = array.array('B')
+        self.apMacs = array.array('I')
+        self.ipv4s = array.array('I')
+        self.ipv6s = array.array('I')
+        self.ssids = array.array('I')
+        self.manufacturers = array.array('I')
+        self.oses = array.array('I')
+        self.seenTimes = {}
 
-    # Method _find_client
+    # Method add appends the passed fields to the columns
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters: Observation fields
     #
     # Return Value: None
     #####################################################################
-    def _find_client(self, clientMac):
-        for client in self.clients:
-            if clientMac == client.clientMac:
-                return client
-        
-        return Client("")
-    
-    # Method get_cmx_proximity_report
+    def add(self, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os):
+        encode = self.stringTable.encode
+
+        self.clientMac = clientMac
+        self.seenEpochs.append(long(seenEpoch))
+        self.rssis.append(long(rssi))
+        # If you have an SSID set, you must be connected
+        self.connected.append(ssid != "")
+        self.partOfVisit.append(False)
+        self.apMacs.append(encode(apMac))
+        self.ipv4s.append(encode(ipv4))
+        self.ipv6s.append(encode(ipv6))
+        self.ssids.append(encode(ssid))
+        self.manufacturers.append(encode(manufacturer))
+        self.oses.append(encode(os))
+
+        if seenTime != format_seen_time(self.seenEpochs[-1]):
+            self.seenTimes[len(self.seenEpochs) - 1] = seenTime
+
+        return None
+
+    # Methods __getstate__ and __setstate__ pickle the arrays as raw bytes,
+    #   which is much smaller and faster than their lists of numbers, e.g.
+    #   when parse_input_files_parallel workers return their chunks
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   state - dictionary of the class variables
     #
-    # Return Value: None
+    # Return Value: dictionary of the class variables
     #####################################################################
-    def get_cmx_proximity_report(self, startTimeEpoch, endTimeEpoch):
-        # Declare variables
-        currentDate = ""
-        report = ""
-    
-        currentDate = epochtime_to_datetime(startTimeEpoch,'%Y-%m-%d')
+    def __getstate__(self):
+        state = dict(self.__dict__)
 
-        report = self.name + "," + currentDate + "," + self._cmx_find_client_proximity(startTimeEpoch, endTimeEpoch)
-        
-        return report
-    
-    # Method _cmx_proximity_report
+        for name in OBSERVATION_ARRAYS:
+            state[name] = (state[name].typecode, state[name].tostring())
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        for name in OBSERVATION_ARRAYS:
+            (typecode, values) = state[name]
+            setattr(self, name, array.array(typecode))
+            getattr(self, name).fromstring(values)
+
+        return None
+
+    # Method append adds an Observation object to the columns
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   observation - Observation to add
     #
     # Return Value: None
     #####################################################################
-    def _cmx_find_client_proximity(self, startTimeEpoch, endTimeEpoch):
-        returnString = ""
-        passerbyCount = 0
-        visitorCount = 0
-        connectedCount = 0
-        captureRate = 0
+    def append(self, observation):
+        self.add(observation.apMac, observation.clientMac, observation.ipv4, observation.ipv6, observation.seenTime,
+            observation.seenEpoch, observation.ssid, observation.rssi, observation.manufacturer, observation.os)
+        self.partOfVisit[-1] = observation.partOfVisit
 
-        for client in self.clients:
-            
-            if client.is_passerby(startTimeEpoch, endTimeEpoch) == True:
-                passerbyCount = passerbyCount + 1
-            
-            if client.is_visitor(startTimeEpoch, endTimeEpoch) == True:
-                visitorCount = visitorCount + 1
-            
-            if client.is_connected(startTimeEpoch, endTimeEpoch) == True:
-                connectedCount = connectedCount + 1
-        
-        passerbyCount = passerbyCount - visitorCount
-        
-        captureRate = float(connectedCount) / float(visitorCount)
-        captureRate = captureRate * 100
-        captureRate = long(round(captureRate, 0))
-        
-        returnString = str(passerbyCount) + "," + str(visitorCount) + "," + str(connectedCount) + "," + str(captureRate)
-        return returnString
-    
-    # Method get_cmx_engagement_report
+        return None
+
+    # Method merge appends the columns of another store of the same client
+    #   that uses another string table, see Network.merge
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   other - ObservationColumns to append
+    #   codeMap - list with the code in this string table of every code
+    #     of the string table of other
     #
     # Return Value: None
     #####################################################################
-    def get_cmx_engagement_report(self, startTimeEpoch, endTimeEpoch):
+    def merge(self, other, codeMap):
         # Declare variables
-        currentDate = ""
-        report = ""
-    
-        currentDate = epochtime_to_datetime(startTimeEpoch,'%Y-%m-%d')
+        offset = len(self.seenEpochs)
 
-        report = (self.name + "," + currentDate + "," + self._cmx_find_visits_of_length(startTimeEpoch, endTimeEpoch, 300, 1200) + "," +
-            self._cmx_find_visits_of_length(startTimeEpoch, endTimeEpoch, 1200, 3600) + "," +
-            self._cmx_find_visits_of_length(startTimeEpoch, endTimeEpoch, 3600, 21600) + "," +
-            self._cmx_find_visits_of_length(startTimeEpoch, endTimeEpoch, 21600, 86400))
-            
-        
-        return report
-    
-    # Method _cmx_count_visits_of_length
+        self.clientMac = other.clientMac
+
+        for name in ['seenEpochs', 'rssis', 'connected', 'partOfVisit']:
+            getattr(self, name).extend(getattr(other, name))
+
+        for name in ['apMacs', 'ipv4s', 'ipv6s', 'ssids', 'manufacturers', 'oses']:
+            getattr(self, name).extend(array.array('I', [codeMap[code] for code in getattr(other, name)]))
+
+        for (index, seenTime) in other.seenTimes.iteritems():
+            self.seenTimes[offset + index] = seenTime
+
+        return None
+
+    def __len__(self):
+        return len(self.seenEpochs)
+
+    # Method __getitem__ rebuilds the Observation object at an index
     #
     # Input: None
     # Output: None
-    # Parameters: None
+    # Parameters:
+    #   index - position of the observation
     #
-    # Return Value: None
+    # Return Value: Observation object
     #####################################################################
-    def _cmx_find_visits_of_length(self, startTimeEpoch, endTimeEpoch, lengthMin, lengthMax):
-        visitCount = 0
-        myStartTime = 0
-        myEndTime = 0
+    def __getitem__(self, index):
+        values = self.stringTable.values
+        observation = Observation(values[self.apMacs[index]], self.clientMac, values[self.ipv4s[index]],
+            values[self.ipv6s[index]], self.get_seen_time(index), self.seenEpochs[index], values[self.ssids[index]],
+            self.rssis[index], values[self.manufacturers[index]], values[self.oses[index]])
+        observation.partOfVisit = bool(self.partOfVisit[index])
 
-        for client in self.clients:
-            for visit in client.visits:
-                myStartTime = 0
-                myEndTime = 0
-        
-                if (visit.startTimeEpoch < startTimeEpoch) and (visit.endTimeEpoch > endTimeEpoch):
-                    break
-                elif (visit.startTimeEpoch < startTimeEpoch) and (visit.endTimeEpoch <= endTimeEpoch):
-                    myStartTime = startTimeEpoch
-                    myEndTime = visit.endTimeEpoch
-                elif (visit.startTimeEpoch >= startTimeEpoch) and (visit.endTimeEpoch > endTimeEpoch):
-                    myStartTime = visit.startTimeEpoch
-                    myEndTime = endTimeEpoch
-                else:
-                    myStartTime = visit.startTimeEpoch
-                    myEndTime = visit.endTimeEpoch
+        return observation
+
+    def __iter__(self):
+        for index in range(len(self.seenEpochs)):
+            yield self[index]
+
+    # Method get_seen_time returns the seen time string of an observation
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   index - position of the observation
+    #
+    # Return Value: seen time string
+    #####################################################################
+    def get_seen_time(self, index):
+        seenTime = self.seenTimes.get(index)
 
-                if (myEndTime - myStartTime >= lengthMin) and (myEndTime - myStartTime < lengthMax):
-                    visitCount = visitCount + 1
+        if seenTime == None:
+            return format_seen_time(self.seenEpochs[index])
 
-        return str(visitCount)
+        return seenTime
 
-    # Method get_cmx_loyalty_report
+    # Method get_rows yields the CSV row of every observation straight from
+    #   the columns
     #
     # Input: None
     # Output: None
     # Parameters: None
     #
-    # Return Value: None
+    # Return Value: generator of observation rows
     #####################################################################
-    def get_cmx_loyalty_report(self, startTimeEpoch, loyaltyStartEpoch, loyaltyEndEpoch, timeIterator):
-        # Declare variables
-        currentTimeEpoch = startTimeEpoch
-        currentDate = ""
-        report = ""
-        occasionalVisitors = 0
-        dailyVisitors = 0
-        firstTimeVisitors = 0
-    
-        currentDate = epochtime_to_datetime(startTimeEpoch,'%Y-%m-%d')
-        
-        for client in self.clients:
-            if client.is_visitor(currentTimeEpoch, currentTimeEpoch + timeIterator - 1) == True:
-                myTimeEpoch = loyaltyStartEpoch
-                myVisitCount = 0
-                
-                while myTimeEpoch < loyaltyEndEpoch:
-                    if client.is_visitor(myTimeEpoch, myTimeEpoch + timeIterator - 1) == True:
-                        myVisitCount = myVisitCount + 1
-                    
-                    myTimeEpoch = myTimeEpoch + timeIterator
-                                
-                if myVisitCount >= round((loyaltyEndEpoch - loyaltyStartEpoch) / (timeIterator), 0) - 1:
-                    dailyVisitors = dailyVisitors + 1
-                elif myVisitCount >= round((loyaltyEndEpoch - loyaltyStartEpoch) / (timeIterator * 3), 0):
-                    occasionalVisitors = occasionalVisitors + 1
-                
-                if client.is_visitor(loyaltyStartEpoch, currentTimeEpoch - 1) == False:
-                    firstTimeVisitors = firstTimeVisitors + 1
-        
-        report = self.name + "," + currentDate + "," + str(occasionalVisitors) + "," + str(dailyVisitors) + "," + str(firstTimeVisitors)
-        return report    
-    
-    # Method add_observation
+    def get_rows(self):
+        values = self.stringTable.values
+
+        for index in range(len(self.seenEpochs)):
+            yield [values[self.apMacs[index]], self.clientMac, values[self.ipv4s[index]], values[self.ipv6s[index]],
+                self.get_seen_time(index), str(self.seenEpochs[index]), values[self.ssids[index]], str(self.rssis[index]),
+                values[self.manufacturers[index]], values[self.oses[index]]]
+
+    # Method sort_by_epoch sorts every column by seen time keeping the
+    #   input order of equal times
     #
     # Input: None
     # Output: None
@@ -500,118 +620,3331 @@ class Network:
     #
     # Return Value: None
     #####################################################################
-    def add_observation(self, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os):
-        newObservation = Observation(apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os)
-        myClient = self._find_client(clientMac)
+    def sort_by_epoch(self):
+        epochs = self.seenEpochs
 
-        if myClient.clientMac == "":
-            myClient.clientMac = clientMac
-            myClient.manufacturer = manufacturer
-            myClient.os = os
-            self.clients.append(myClient)
+        # Input is usually already in time order
+        if all(epochs[i] <= epochs[i + 1] for i in range(len(epochs) - 1)):
+            return None
+
+        if numpy != None:
+            order = numpy.argsort(numpy.frombuffer(epochs, dtype=epochs.typecode), kind='mergesort').tolist()
+        else:
+            order = sorted(range(len(epochs)), key=epochs.__getitem__)
+
+        for name in ['seenEpochs', 'rssis', 'connected', 'partOfVisit', 'apMacs', 'ipv4s', 'ipv6s', 'ssids', 'manufacturers', 'oses']:
+            column = getattr(self, name)
+            setattr(self, name, array.array(column.typecode, [column[i] for i in order]))
+
+        self.seenTimes = dict((newIndex, self.seenTimes[oldIndex]) for (newIndex, oldIndex) in enumerate(order)
+            if oldIndex in self.seenTimes)
 
-        myClient.add_observation(newObservation)
-        
         return None
-        
-    # Method discover_client_visits
+
+    # Method get_epochs, get_rssis and get_connected return one column of
+    #   the observations as a sequence
     #
     # Input: None
     # Output: None
     # Parameters: None
     #
+    # Return Value: array of column values in observation order
+    #####################################################################
+    def get_epochs(self):
+        return self.seenEpochs
+
+    def get_rssis(self):
+        return self.rssis
+
+    def get_connected(self):
+        return self.connected
+
+    def get_part_of_visit(self):
+        return self.partOfVisit
+
+    # Method set_part_of_visit stores the visit flag of every observation
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   partOfVisit - sequence of flags in observation order
+    #
     # Return Value: None
     #####################################################################
-    def discover_client_visits(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
-        for client in self.clients:
-            client.discover_visits(observationsPerWindow, window, minStartRSSI, minSessionRSSI)
+    def set_part_of_visit(self, partOfVisit):
+        self.partOfVisit = array.array('B', [1 if flag else 0 for flag in partOfVisit])
+
+        return None
+
+#########################################################################
+# Class Client
+#
+# Container to identify Clients that have connected to a network
+#########################################################################
+class Client:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: 
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, clientMac, observations=None):
+        self.clientMac = clientMac
+        self.observations = observations if observations != None else ObservationList()
+        self.visits = []
+        self.visitDays = 0
+        self.visitDaysStart = 0
+        self.historyDays = 0
+        self.historyDaysStart = 0
+        self.manufacturer = ""
+        self.os = ""
+        self.visitIndex = None
+        self.seenBuckets = None
+        self.changeCount = 0
         
+    # Method add_observation takes the passed observation and appends items
+    #   to the current list of observations owned by the client
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   newObservation - observation to add to the list for the client
+    #
+    # Return Value: None
+    #####################################################################
+    def add_observation(self, newObservation):
+        # Add observation to list
+        self.observations.append(newObservation)
+        self.changeCount = self.changeCount + 1
+
         return None
+
+    # Method is_passerby checks if the client was seen during a specific
+    #   time window
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of search window
+    #   endTimeEpoch - End of search window
+    #
+    # Return Value: None
+    #####################################################################
+    def is_passerby(self, startTimeEpoch, endTimeEpoch):
+        # For each observation in the list, look if the epoch time matches
+        for seenEpoch in self.observations.get_epochs():
+            # If observation falls into the window return True
+            if (seenEpoch >= startTimeEpoch) and (seenEpoch <= endTimeEpoch):
+                return True
+
+        return False
+    
+    # Method is_visitor checks if a visit of the client overlaps a time
+    #   window, including visits that start before and end after it. The
+    #   visited buckets of get_day_buckets use the same rule, so a report
+    #   bucket counts the client as a visitor exactly when is_visitor is
+    #   True for the bucket.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of search window
+    #   endTimeEpoch - End of search window
+    #
+    # Return Value: True if the client visited during the window
+    #####################################################################
+    def is_visitor(self, startTimeEpoch, endTimeEpoch):
+        return self.get_visit_index().overlaps(startTimeEpoch, endTimeEpoch)
     
-    # Method get_visits
+    # Method is_connected checks if a connected visit of the client overlaps
+    #   a time window, see is_visitor
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of search window
+    #   endTimeEpoch - End of search window
+    #
+    # Return Value: True if the client was connected during the window
+    #####################################################################
+    def is_connected(self, startTimeEpoch, endTimeEpoch):
+        return self.get_visit_index().overlaps(startTimeEpoch, endTimeEpoch, True)
+
+    # Method get_visit_index returns the VisitIndex of the client visits,
+    #   building it on the first query after the visits changed
     #
     # Input: None
     # Output: None
     # Parameters: None
     #
+    # Return Value: VisitIndex object
+    #####################################################################
+    def get_visit_index(self):
+        if self.visitIndex == None:
+            self.visitIndex = VisitIndex(self.visits)
+
+        return self.visitIndex
+
+    # Method get_day_buckets finds the time buckets (days when timeIterator
+    #   is 86400) the client was seen, visited and connected in. A visit
+    #   counts in every bucket from the one its start falls in to the one
+    #   its end falls in, the buckets it overlaps, as in is_visitor.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - start of bucket 0
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: tuple of seen, visited and connected bucket sets
+    #####################################################################
+    def get_day_buckets(self, startTimeEpoch, timeIterator):
+        # Declare variables
+        seenBuckets = set()
+        visitedBuckets = set()
+        connectedBuckets = set()
+
+        if self.seenBuckets != None:
+            seenBuckets = self._get_released_buckets(startTimeEpoch, timeIterator)
+        elif (numpy != None) and isinstance(self.observations, ObservationColumns) and (len(self.observations) > 0):
+            epochs = numpy.frombuffer(self.observations.seenEpochs, dtype=self.observations.seenEpochs.typecode)
+            seenBuckets.update(numpy.unique((epochs - startTimeEpoch) // timeIterator).tolist())
+        else:
+            for seenEpoch in self.observations.get_epochs():
+                seenBuckets.add((seenEpoch - startTimeEpoch) // timeIterator)
+
+        # A visit counts in every bucket it overlaps
+        for visit in self.visits:
+            visitBuckets = range(long((visit.startTimeEpoch - startTimeEpoch) // timeIterator),
+                long((visit.endTimeEpoch - startTimeEpoch) // timeIterator) + 1)
+            visitedBuckets.update(visitBuckets)
+
+            if visit.connected == True:
+                connectedBuckets.update(visitBuckets)
+
+        return (seenBuckets, visitedBuckets, connectedBuckets)
+
+    # Method release_observations frees the observations of the client
+    #   once its visits are found, keeping the buckets it was seen in for
+    #   the proximity report, counted from BUCKET_ORIGIN_EPOCH
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   timeIterator - bucket length of the proximity report
+    #
     # Return Value: None
     #####################################################################
-    def get_visits(self):
-        returnString = ""
+    def release_observations(self, timeIterator):
+        self.seenBuckets = (timeIterator, set((seenEpoch - BUCKET_ORIGIN_EPOCH) // timeIterator
+            for seenEpoch in self.observations.get_epochs()))
+        self.observations = ObservationList()
+        self.changeCount = self.changeCount + 1
+
+        return None
+
+    # Method _get_released_buckets returns the seen buckets kept by
+    #   release_observations counted from startTimeEpoch
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - start of bucket 0, see align_bucket_start
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: set of bucket numbers
+    #####################################################################
+    def _get_released_buckets(self, startTimeEpoch, timeIterator):
+        (releasedIterator, releasedBuckets) = self.seenBuckets
+
+        if (releasedIterator != timeIterator) or ((startTimeEpoch - BUCKET_ORIGIN_EPOCH) % timeIterator != 0):
+            raise Exception("Observations of client " + self.clientMac + " were released for other report buckets")
+
+        bucketOffset = long((startTimeEpoch - BUCKET_ORIGIN_EPOCH) // timeIterator)
+
+        return set(bucket - bucketOffset for bucket in releasedBuckets)
+
+    # Method get_visits yields a CSV row for every visit of the client
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networkName - network name for the first column
+    #   minEndTimeEpoch - only visits ending at or after this time when set
+    #   maxEndTimeEpoch - only visits ending before this time when set
+    #
+    # Return Value: generator of visit rows
+    #####################################################################
+    def get_visits(self, networkName, minEndTimeEpoch=None, maxEndTimeEpoch=None):
+        for visit in self.visits:
+            if (minEndTimeEpoch != None) and (visit.endTimeEpoch < minEndTimeEpoch):
+                continue
+
+            if (maxEndTimeEpoch == None) or (visit.endTimeEpoch < maxEndTimeEpoch):
+                yield [networkName, self.clientMac] + visit.to_row()
+
+    # Method discover_visits builds a CSV string of all class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: CSV string of all class variables
+    #####################################################################
+    def discover_visits(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
+        # Sort observations
+        self.observations.sort_by_epoch()
+        
+        if (numpy != None) and isinstance(self.observations, ObservationColumns):
+            partOfVisit = self._find_visits_vectorized(observationsPerWindow, window, minStartRSSI, minSessionRSSI)
+        else:
+            partOfVisit = self._find_visits(observationsPerWindow, window, minStartRSSI, minSessionRSSI)
+
+        # Keep flags set by windows of earlier runs, see Checkpoint
+        previousPartOfVisit = self.observations.get_part_of_visit()
+        if any(previousPartOfVisit):
+            partOfVisit = [bool(flag) or bool(previousFlag) for (flag, previousFlag) in zip(partOfVisit, previousPartOfVisit)]
+
+        self.observations.set_part_of_visit(partOfVisit)
+        self.visits.extend(self._build_visits(partOfVisit, window))
+        
+        # Sort visits
+        self.visits.sort(key=operator.attrgetter('startTimeEpoch'))
+        self.visitIndex = None
+        self.changeCount = self.changeCount + 1
+
+        self._build_visit_days()
+        
+        return None
+
+    # Method find_visits returns the visits found with a set of visit
+    #   parameters without changing the client: the observation visit
+    #   flags and the visits of the client are left alone, so several
+    #   parameter sets can be tried on the same observations. The
+    #   observations must be sorted by epoch.
+    #
+    # Input: None
+    # Output: None
+    # Parameters: see _find_visits
+    #
+    # Return Value: list of Visits sorted by start time
+    #####################################################################
+    def find_visits(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
+        if (numpy != None) and isinstance(self.observations, ObservationColumns):
+            partOfVisit = self._find_visits_vectorized(observationsPerWindow, window, minStartRSSI, minSessionRSSI)
+        else:
+            partOfVisit = self._find_visits(observationsPerWindow, window, minStartRSSI, minSessionRSSI)
+
+        return self._build_visits(partOfVisit, window)
+
+    # Method set_visits replaces the visits of the client with visits found
+    #   elsewhere, e.g. by a worker process
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   visits - list of Visits sorted by start time
+    #   partOfVisit - visit flags of the observations sorted by time, if
+    #     they are needed in this process
+    #
+    # Return Value: None
+    #####################################################################
+    def set_visits(self, visits, partOfVisit=None):
+        self.visits = visits
+        self.visitIndex = None
+        self.changeCount = self.changeCount + 1
+        self._build_visit_days()
+
+        if partOfVisit != None:
+            self.observations.sort_by_epoch()
+            self.observations.set_part_of_visit(partOfVisit)
+
+        return None
+
+    # Method _build_visit_days builds the day presence bitmap of the client
+    #   from its visits and the visit days of earlier runs.
+    #   Bit n of visitDays is set when a visit overlaps day
+    #   visitDaysStart + n, counted in days since the epoch.
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def _build_visit_days(self):
+        (self.visitDaysStart, self.visitDays) = add_visit_days(self.historyDaysStart, self.historyDays, self.visits)
+
+        return None
+
+    # Method get_visit_bitmap returns a bitmap with bit n set when the
+    #   client visited bucket n counted from startTimeEpoch, using the rule
+    #   of get_day_buckets. Day buckets starting at midnight come from the
+    #   bitmap built with the visits.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - start of bucket 0
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: bitmap as a long
+    #####################################################################
+    def get_visit_bitmap(self, startTimeEpoch, timeIterator):
+        # Declare variables
+        visitBitmap = 0
+
+        if (timeIterator == 86400) and (startTimeEpoch % 86400 == 0):
+            dayOffset = long(self.visitDaysStart - startTimeEpoch // 86400)
+
+            if dayOffset >= 0:
+                return self.visitDays << dayOffset
+
+            return self.visitDays >> -dayOffset
+
+        for visit in self.visits:
+            for bucket in range(max(0L, long((visit.startTimeEpoch - startTimeEpoch) // timeIterator)),
+                long((visit.endTimeEpoch - startTimeEpoch) // timeIterator) + 1):
+                visitBitmap = visitBitmap | (1 << bucket)
+
+        return visitBitmap
+
+    # Method _find_visits finds every observation that is part of a visit.
+    #   An observation starts a visit window when it is connected or has
+    #   at least minStartRSSI, and the window counts when it holds at least
+    #   observationsPerWindow connected or minSessionRSSI observations
+    #   within window seconds. Both window edges only move forward, so the
+    #   sorted observations are walked once.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   observationsPerWindow - observations needed in a window
+    #   window - window length in seconds
+    #   minStartRSSI - minimum RSSI to start a window
+    #   minSessionRSSI - minimum RSSI to count in a window
+    #
+    # Return Value: bytearray of visit flags in observation order
+    #####################################################################
+    def _find_visits(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
+        # Declare variables
+        epochs = self.observations.get_epochs()
+        rssis = self.observations.get_rssis()
+        connected = self.observations.get_connected()
+        observationCount = len(epochs)
+        partOfVisit = bytearray(observationCount)
+        endIndex = 0
+        markedIndex = 0
+        eventCount = 0
+
+        for startIndex in range(observationCount):
+            windowEndEpoch = epochs[startIndex] + window
+
+            # Extend the window to every observation within window seconds of the start
+            while (endIndex < observationCount) and (epochs[endIndex] <= windowEndEpoch):
+                if (rssis[endIndex] >= minSessionRSSI) or connected[endIndex]:
+                    eventCount = eventCount + 1
+
+                endIndex = endIndex + 1
+
+            # Mark the window, skipping observations an earlier window already marked
+            if (connected[startIndex] or (rssis[startIndex] >= minStartRSSI)) and (eventCount >= observationsPerWindow):
+                for i in range(max(startIndex, markedIndex), endIndex):
+                    partOfVisit[i] = 1
+
+                markedIndex = endIndex
+
+            # Drop the start observation before moving the window forward
+            if (rssis[startIndex] >= minSessionRSSI) or connected[startIndex]:
+                eventCount = eventCount - 1
+                
+        return partOfVisit
+
+    # Method _find_visits_vectorized applies the _find_visits rule with
+    #   NumPy over the observation columns: window ends come from a sorted
+    #   search, window counts from a running sum and the marked ranges from
+    #   a running sum of range starts and ends
+    #
+    # Input: None
+    # Output: None
+    # Parameters: see _find_visits
+    #
+    # Return Value: NumPy array of visit flags in observation order
+    #####################################################################
+    def _find_visits_vectorized(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
+        # Declare variables
+        observationCount = len(self.observations)
+
+        if observationCount == 0:
+            return numpy.zeros(0, dtype=bool)
+
+        epochs = numpy.frombuffer(self.observations.seenEpochs, dtype=self.observations.seenEpochs.typecode)
+        rssis = numpy.frombuffer(self.observations.rssis, dtype=self.observations.rssis.typecode)
+        connected = numpy.frombuffer(self.observations.connected, dtype=numpy.uint8) != 0
+
+        events = connected | (rssis >= minSessionRSSI)
+        endIndexes = numpy.searchsorted(epochs, epochs + window, side='right')
+        eventTotals = numpy.concatenate(([0], numpy.cumsum(events)))
+        windowCounts = eventTotals[endIndexes] - eventTotals[:-1]
+
+        startIndexes = numpy.flatnonzero((connected | (rssis >= minStartRSSI)) & (windowCounts >= observationsPerWindow))
+        rangeEdges = (numpy.bincount(startIndexes, minlength=observationCount + 1) -
+            numpy.bincount(endIndexes[startIndexes], minlength=observationCount + 1))
+
+        return numpy.cumsum(rangeEdges)[:observationCount] > 0
+
+    # Method _build_visits joins consecutive observations that are part of
+    #   a visit into Visits, starting a new visit when the gap to the
+    #   previous observation is more than window seconds
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   partOfVisit - visit flags in observation order
+    #   window - window length in seconds
+    #
+    # Return Value: list of Visits sorted by start time
+    #####################################################################
+    def _build_visits(self, partOfVisit, window):
+        # Declare variables
+        epochs = self.observations.get_epochs()
+        connected = self.observations.get_connected()
+        visits = []
+        newVisit = None
+
+        for i in range(len(epochs)):
+            if not partOfVisit[i]:
+                newVisit = None
+                continue
+
+            if (newVisit == None) or (epochs[i] - window > newVisit.endTimeEpoch):
+                newVisit = Visit(epochs[i], epochs[i])
+                visits.append(newVisit)
+
+            newVisit.endTimeEpoch = epochs[i]
+            newVisit.length = newVisit.endTimeEpoch - newVisit.startTimeEpoch
+
+            if connected[i]:
+                newVisit.connected = True
+        
+        return visits
+
+    # Method get_observations yields a CSV row for every observation of the
+    #   client
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networkName - network name for the first column
+    #
+    # Return Value: generator of observation rows
+    #####################################################################
+    def get_observations(self, networkName):
+        for row in self.observations.get_rows():
+            yield [networkName] + row
+
+#########################################################################
+# Class Network
+#
+# 
+#########################################################################
+class Network:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: 
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, name, columnar=False):
+        self.name = name
+        self.clients = []
+        self.clientIndex = {}
+        self.stringTable = StringTable() if columnar else None
+        self.dayIndex = {}
+        self.dayIndexKey = None
+
+    # Method _find_client
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def _find_client(self, clientMac):
+        # Look up client in the MAC index, self.clients keeps insertion order
+        client = self.clientIndex.get(clientMac)
+
+        if client is None:
+            return Client("")
+
+        return client
+
+    # Method merge appends the clients and observations of a network with
+    #   the same name parsed from a later part of the input, keeping the
+    #   order the clients and their observations were first seen in
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   other - Network to merge, columnar or with the same observation
+    #     store
+    #
+    # Return Value: None
+    #####################################################################
+    def merge(self, other):
+        # Declare variables
+        codeMap = None
+
+        if self.stringTable != None:
+            codeMap = [self.stringTable.encode(value) for value in other.stringTable.values]
+        elif other.stringTable != None:
+            codeMap = [intern_string(value) for value in other.stringTable.values]
+
+        for client in other.clients:
+            myClient = self.clientIndex.get(client.clientMac)
+
+            if myClient is None:
+                myClient = Client(client.clientMac)
+                myClient.manufacturer = client.manufacturer
+                myClient.os = client.os
+                self.clients.append(myClient)
+                self.clientIndex[client.clientMac] = myClient
+
+                if self.stringTable != None:
+                    myClient.observations = ObservationColumns(self.stringTable)
+
+            myClient.observations.merge(client.observations, codeMap)
+
+        self.dayIndexKey = None
+
+        return None
+    
+    # Method get_cmx_proximity_report returns the proximity report of one
+    #   time window
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of report window
+    #   endTimeEpoch - End of report window
+    #
+    # Return Value: CSV string of the report
+    #####################################################################
+    def get_cmx_proximity_report(self, startTimeEpoch, endTimeEpoch):
+        return ",".join(self.get_cmx_proximity_reports(startTimeEpoch, endTimeEpoch, endTimeEpoch - startTimeEpoch + 1)[0])
+
+    # Method get_cmx_proximity_reports returns the proximity report of every
+    #   timeIterator long bucket between startTimeEpoch and endTimeEpoch,
+    #   counting all buckets in one sweep over the day index
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the first bucket
+    #   endTimeEpoch - End of the report range
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_cmx_proximity_reports(self, startTimeEpoch, endTimeEpoch, timeIterator):
+        # Declare variables
+        buckets = ReportBuckets(startTimeEpoch, endTimeEpoch, timeIterator)
+        bucketCount = buckets.count
+        passerbyCounts = [0] * bucketCount
+        visitorCounts = [0] * bucketCount
+        connectedCounts = [0] * bucketCount
+        reports = []
+
+        dayIndex = self.build_day_index(startTimeEpoch, timeIterator)
+
+        for (seenBuckets, visitedBuckets, connectedBuckets) in dayIndex.itervalues():
+            for bucket in seenBuckets:
+                if 0 <= bucket < bucketCount:
+                    passerbyCounts[bucket] = passerbyCounts[bucket] + 1
+
+            for bucket in visitedBuckets:
+                if 0 <= bucket < bucketCount:
+                    visitorCounts[bucket] = visitorCounts[bucket] + 1
+
+            for bucket in connectedBuckets:
+                if 0 <= bucket < bucketCount:
+                    connectedCounts[bucket] = connectedCounts[bucket] + 1
+
+        for bucket in range(bucketCount):
+            reports.append(buckets.get_proximity_report(self.name, bucket, passerbyCounts[bucket], visitorCounts[bucket],
+                connectedCounts[bucket]))
+
+        return reports
+    
+    # Method build_day_index maps each client to the buckets it was seen,
+    #   visited and connected in, reusing the index while the bucket start
+    #   and length stay the same and no client changed, see
+    #   Client.changeCount
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - start of bucket 0
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: dictionary of client MAC to bucket sets
+    #####################################################################
+    def build_day_index(self, startTimeEpoch, timeIterator):
+        # Declare variables
+        dayIndexKey = (long(startTimeEpoch), long(timeIterator), sum(client.changeCount for client in self.clients))
+
+        if self.dayIndexKey != dayIndexKey:
+            self.dayIndex = {}
+
+            for client in self.clients:
+                self.dayIndex[client.clientMac] = client.get_day_buckets(dayIndexKey[0], dayIndexKey[1])
+
+            self.dayIndexKey = dayIndexKey
+
+        return self.dayIndex
+
+    # Method get_visitors returns the clients with a visit overlapping a
+    #   time window, in client order. For a report bucket they are the
+    #   clients in the Visitors column of the proximity report.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the window
+    #   endTimeEpoch - End of the window
+    #   connected - only count connected visits
+    #
+    # Return Value: list of Client objects
+    #####################################################################
+    def get_visitors(self, startTimeEpoch, endTimeEpoch, connected=False):
+        return [client for client in self.clients if client.get_visit_index().overlaps(startTimeEpoch, endTimeEpoch, connected)]
+
+    # Method get_connected_clients returns the clients with a connected
+    #   visit overlapping a time window, see get_visitors
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the window
+    #   endTimeEpoch - End of the window
+    #
+    # Return Value: list of Client objects
+    #####################################################################
+    def get_connected_clients(self, startTimeEpoch, endTimeEpoch):
+        return self.get_visitors(startTimeEpoch, endTimeEpoch, True)
+
+    # Method get_cmx_engagement_report returns the engagement report of one
+    #   time window
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of report window
+    #   endTimeEpoch - End of report window
+    #   lengthBuckets - lower edges of the visit length buckets in seconds
+    #
+    # Return Value: CSV string of the report
+    #####################################################################
+    def get_cmx_engagement_report(self, startTimeEpoch, endTimeEpoch, lengthBuckets=ENGAGEMENT_BUCKETS):
+        return ",".join(self.get_cmx_engagement_reports(startTimeEpoch, endTimeEpoch, endTimeEpoch - startTimeEpoch + 1, lengthBuckets)[0])
+
+    # Method get_cmx_engagement_reports returns the engagement report of
+    #   every timeIterator long bucket between startTimeEpoch and
+    #   endTimeEpoch in one pass over the visits, see
+    #   ReportBuckets.get_engagement_reports
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the first bucket
+    #   endTimeEpoch - End of the report range
+    #   timeIterator - length of a bucket in seconds
+    #   lengthBuckets - sorted lower edges of the visit length buckets
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_cmx_engagement_reports(self, startTimeEpoch, endTimeEpoch, timeIterator, lengthBuckets=ENGAGEMENT_BUCKETS):
+        # Declare variables
+        buckets = ReportBuckets(startTimeEpoch, endTimeEpoch, timeIterator)
+        visitTimes = ((visit.startTimeEpoch, visit.endTimeEpoch) for client in self.clients for visit in client.visits)
+
+        return buckets.get_engagement_reports(self.name, visitTimes, lengthBuckets)
+
+    # Method get_cmx_loyalty_report returns the loyalty report of the time
+    #   window starting at startTimeEpoch
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of report window
+    #   loyaltyStartEpoch - Start of the loyalty range
+    #   loyaltyEndEpoch - End of the loyalty range
+    #   timeIterator - length of a window in seconds
+    #
+    # Return Value: CSV string of the report
+    #####################################################################
+    def get_cmx_loyalty_report(self, startTimeEpoch, loyaltyStartEpoch, loyaltyEndEpoch, timeIterator):
+        reports = self.get_cmx_loyalty_reports(loyaltyStartEpoch, loyaltyEndEpoch, timeIterator)
+
+        return ",".join(reports[int((startTimeEpoch - loyaltyStartEpoch) // timeIterator)])
+
+    # Method get_cmx_loyalty_reports returns the loyalty report of every
+    #   timeIterator long bucket of the loyalty range in one pass over the
+    #   client visit bitmaps, see ReportBuckets.get_loyalty_reports
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   loyaltyStartEpoch - Start of the loyalty range
+    #   loyaltyEndEpoch - End of the loyalty range
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_cmx_loyalty_reports(self, loyaltyStartEpoch, loyaltyEndEpoch, timeIterator):
+        # Declare variables
+        buckets = ReportBuckets(loyaltyStartEpoch, loyaltyEndEpoch, timeIterator)
+        visitBitmaps = (client.get_visit_bitmap(loyaltyStartEpoch, timeIterator) for client in self.clients)
+
+        return buckets.get_loyalty_reports(self.name, visitBitmaps)
+    
+    # Method get_sweep_summary finds the visits of every client with a set
+    #   of visit parameters, see Client.find_visits, and sums the visits
+    #   and the proximity report over the report range
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   visitParameters - discover_client_visits arguments
+    #   startTimeEpoch - Start of the first bucket
+    #   endTimeEpoch - End of the report range
+    #   timeIterator - length of a proximity bucket in seconds
+    #
+    # Return Value: list of visits, visiting clients, mean visit length,
+    #   passerby, visitors, connected and capture rate
+    #####################################################################
+    def get_sweep_summary(self, visitParameters, startTimeEpoch, endTimeEpoch, timeIterator):
+        # Declare variables
+        buckets = ReportBuckets(startTimeEpoch, endTimeEpoch, timeIterator)
+        visitCount = 0
+        visitingClients = 0
+        visitSeconds = 0
+        seenCount = 0
+        visitorCount = 0
+        connectedCount = 0
+
+        for client in self.clients:
+            visits = client.find_visits(*visitParameters)
+            seenBuckets = set(buckets.get_bucket(seenEpoch) for seenEpoch in client.observations.get_epochs())
+            visitedBuckets = set()
+            connectedBuckets = set()
+
+            # A visit counts in every bucket it overlaps, see Client.get_day_buckets
+            for visit in visits:
+                visitBuckets = range(buckets.get_bucket(visit.startTimeEpoch), buckets.get_bucket(visit.endTimeEpoch) + 1)
+                visitedBuckets.update(visitBuckets)
+                visitSeconds = visitSeconds + visit.length
+
+                if visit.connected == True:
+                    connectedBuckets.update(visitBuckets)
+
+            visitCount = visitCount + len(visits)
+            visitingClients = visitingClients + (len(visits) > 0)
+            seenCount = seenCount + len([bucket for bucket in seenBuckets if 0 <= bucket < buckets.count])
+            visitorCount = visitorCount + len([bucket for bucket in visitedBuckets if 0 <= bucket < buckets.count])
+            connectedCount = connectedCount + len([bucket for bucket in connectedBuckets if 0 <= bucket < buckets.count])
+
+        meanVisitLength = visitSeconds // visitCount if visitCount > 0 else 0
+        proximityReport = buckets.get_proximity_report(self.name, 0, seenCount, visitorCount, connectedCount)
+
+        return [str(visitCount), str(visitingClients), str(meanVisitLength)] + proximityReport[2:]
+
+    # Method add_observation
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def add_observation(self, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os):
+        myClient = self._find_client(clientMac)
+
+        if myClient.clientMac == "":
+            myClient.clientMac = clientMac
+            myClient.manufacturer = manufacturer
+            myClient.os = os
+            self.clients.append(myClient)
+            self.clientIndex[clientMac] = myClient
+
+            # Columnar networks keep observations as columns sharing the network string table
+            if self.stringTable != None:
+                myClient.observations = ObservationColumns(self.stringTable)
+
+        myClient.observations.add(apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os)
+        self.dayIndexKey = None
+        
+        return None
+        
+    # Method discover_client_visits
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def discover_client_visits(self, observationsPerWindow, window, minStartRSSI, minSessionRSSI):
+        for client in self.clients:
+            client.discover_visits(observationsPerWindow, window, minStartRSSI, minSessionRSSI)
+        
+        return None
+    
+    # Method get_visits yields a CSV row for every visit in the network
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   minEndTimeEpoch - only visits ending at or after this time when set
+    #   maxEndTimeEpoch - only visits ending before this time when set
+    #
+    # Return Value: generator of visit rows
+    #####################################################################
+    def get_visits(self, minEndTimeEpoch=None, maxEndTimeEpoch=None):
+        for client in self.clients:
+            for row in client.get_visits(self.name, minEndTimeEpoch, maxEndTimeEpoch):
+                yield row
+
+    # Method get_observations yields a CSV row for every observation in the
+    #   network
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: generator of observation rows
+    #####################################################################
+    def get_observations(self):
+        for client in self.clients:
+            for row in client.get_observations(self.name):
+                yield row
+
+
+#########################################################################
+# Class Visit
+#
+# 
+#########################################################################
+class Visit:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: 
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, startTimeEpoch, endTimeEpoch):
+        self.startTimeEpoch = startTimeEpoch
+        self.endTimeEpoch = endTimeEpoch
+        self.length = 0
+        self.connected = False
+
+    # Method to_string builds a CSV string of all class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: CSV string of all class variables
+    #####################################################################
+    def to_string(self):
+        return ",".join(self.to_row())
+
+    # Method to_row builds a CSV row of all class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: list of all class variables as strings
+    #####################################################################
+    def to_row(self):
+        return [format_visit_time(self.startTimeEpoch), format_visit_time(self.endTimeEpoch), str(self.length), str(self.connected)]
+
+#########################################################################
+# Class VisitIndex
+#
+# Start and end times of the visits of one client, all visits and the
+#   connected ones. The visits of a client follow each other without
+#   overlapping, so both lists are sorted and a window query is a binary
+#   search for the first visit ending in the window.
+#########################################################################
+class VisitIndex:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   visits - list of Visits sorted by start time
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, visits):
+        connectedVisits = [visit for visit in visits if visit.connected == True]
+
+        self.visits = visits
+        self.startEpochs = [visit.startTimeEpoch for visit in visits]
+        self.endEpochs = [visit.endTimeEpoch for visit in visits]
+        self.connectedStartEpochs = [visit.startTimeEpoch for visit in connectedVisits]
+        self.connectedEndEpochs = [visit.endTimeEpoch for visit in connectedVisits]
+
+    # Method overlaps checks if a visit overlaps a time window, that is
+    #   the first visit ending at or after the window start starts at or
+    #   before the window end
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the window
+    #   endTimeEpoch - End of the window
+    #   connected - only look at connected visits
+    #
+    # Return Value: True if a visit overlaps the window
+    #####################################################################
+    def overlaps(self, startTimeEpoch, endTimeEpoch, connected=False):
+        if connected:
+            (startEpochs, endEpochs) = (self.connectedStartEpochs, self.connectedEndEpochs)
+        else:
+            (startEpochs, endEpochs) = (self.startEpochs, self.endEpochs)
+
+        index = bisect.bisect_left(endEpochs, startTimeEpoch)
+
+        return (index < len(startEpochs)) and (startEpochs[index] <= endTimeEpoch)
+
+    # Method find_visits returns the visits overlapping a time window
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the window
+    #   endTimeEpoch - End of the window
+    #
+    # Return Value: list of Visits sorted by start time
+    #####################################################################
+    def find_visits(self, startTimeEpoch, endTimeEpoch):
+        return self.visits[bisect.bisect_left(self.endEpochs, startTimeEpoch):bisect.bisect_right(self.startEpochs, endTimeEpoch)]
+
+#########################################################################
+# Class ReportBuckets
+#
+# The timeIterator long report buckets from startTimeEpoch to
+#   endTimeEpoch shared by the proximity, engagement and loyalty reports.
+#   Buckets of whole days are labeled with their date, shorter buckets
+#   with their date and time.
+#########################################################################
+class ReportBuckets:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   startTimeEpoch - Start of the first bucket
+    #   endTimeEpoch - End of the report range
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, startTimeEpoch, endTimeEpoch, timeIterator):
+        self.startTimeEpoch = startTimeEpoch
+        self.endTimeEpoch = endTimeEpoch
+        self.timeIterator = timeIterator
+        self.count = int((endTimeEpoch - startTimeEpoch + timeIterator - 1) // timeIterator)
+
+        if timeIterator % 86400 == 0:
+            self.dateFormat = '%Y-%m-%d'
+        else:
+            self.dateFormat = '%Y-%m-%d %H:%M:%S'
+
+    # Method get_bucket returns the bucket an epoch time falls in
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   epoch - epoch time
+    #
+    # Return Value: bucket number, negative before the first bucket
+    #####################################################################
+    def get_bucket(self, epoch):
+        return int((epoch - self.startTimeEpoch) // self.timeIterator)
+
+    # Method get_start returns the start time of a bucket
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   bucket - bucket number
+    #
+    # Return Value: epoch time
+    #####################################################################
+    def get_start(self, bucket):
+        return self.startTimeEpoch + bucket * self.timeIterator
+
+    # Method get_label returns the report date column of a bucket
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   bucket - bucket number
+    #
+    # Return Value: date string
+    #####################################################################
+    def get_label(self, bucket):
+        return epochtime_to_datetime(self.get_start(bucket), self.dateFormat)
+
+    # Method get_engagement_reports builds the engagement report of every
+    #   bucket in one pass over the visits. Each visit is clipped to every
+    #   bucket it overlaps and the clipped length is counted in the length
+    #   bucket it falls in, the last length bucket having no upper limit.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networkName - network name for the first column
+    #   visitTimes - iterable of visit start and end time tuples
+    #   lengthBuckets - sorted lower edges of the visit length buckets
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_engagement_reports(self, networkName, visitTimes, lengthBuckets):
+        # Declare variables
+        visitCounts = [[0] * len(lengthBuckets) for bucket in range(self.count)]
+
+        for (visitStartEpoch, visitEndEpoch) in visitTimes:
+            firstBucket = max(0, self.get_bucket(visitStartEpoch))
+            lastBucket = min(self.count - 1, self.get_bucket(visitEndEpoch))
+
+            for bucket in range(firstBucket, lastBucket + 1):
+                bucketStartEpoch = self.get_start(bucket)
+                bucketEndEpoch = bucketStartEpoch + self.timeIterator - 1
+                visitLength = min(visitEndEpoch, bucketEndEpoch) - max(visitStartEpoch, bucketStartEpoch)
+                lengthBucket = bisect.bisect_right(lengthBuckets, visitLength) - 1
+
+                if lengthBucket >= 0:
+                    visitCounts[bucket][lengthBucket] = visitCounts[bucket][lengthBucket] + 1
+
+        return [[networkName, self.get_label(bucket)] + [str(visitCount) for visitCount in visitCounts[bucket]]
+            for bucket in range(self.count)]
+
+    # Method get_loyalty_reports builds the loyalty report of every bucket
+    #   in one pass over the client visit bitmaps. A visiting client is
+    #   Daily when it visited all but one bucket of the range, Occasional
+    #   when it visited a third of them and First Time on the first bucket
+    #   it visited.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networkName - network name for the first column
+    #   visitBitmaps - iterable of client bitmaps with bit n set when the
+    #     client visited bucket n
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_loyalty_reports(self, networkName, visitBitmaps):
+        # Declare variables
+        bucketCount = self.count
+        bucketMask = (1 << bucketCount) - 1
+        dailyThreshold = round((self.endTimeEpoch - self.startTimeEpoch) / (self.timeIterator), 0) - 1
+        occasionalThreshold = round((self.endTimeEpoch - self.startTimeEpoch) / (self.timeIterator * 3), 0)
+        occasionalVisitors = [0] * bucketCount
+        dailyVisitors = [0] * bucketCount
+        firstTimeVisitors = [0] * bucketCount
+
+        for visitBitmap in visitBitmaps:
+            visitBitmap = visitBitmap & bucketMask
+
+            if visitBitmap == 0:
+                continue
+
+            myVisitCount = bin(visitBitmap).count('1')
+            isDaily = myVisitCount >= dailyThreshold
+            isOccasional = (isDaily == False) and (myVisitCount >= occasionalThreshold)
+            firstBucket = (visitBitmap & -visitBitmap).bit_length() - 1
+
+            # Count the client in every bucket it visited
+            remainingBitmap = visitBitmap
+            while remainingBitmap != 0:
+                lowestBit = remainingBitmap & -remainingBitmap
+                bucket = lowestBit.bit_length() - 1
+                remainingBitmap = remainingBitmap ^ lowestBit
+
+                if isDaily:
+                    dailyVisitors[bucket] = dailyVisitors[bucket] + 1
+                elif isOccasional:
+                    occasionalVisitors[bucket] = occasionalVisitors[bucket] + 1
+
+            firstTimeVisitors[firstBucket] = firstTimeVisitors[firstBucket] + 1
+
+        return [[networkName, self.get_label(bucket), str(occasionalVisitors[bucket]), str(dailyVisitors[bucket]),
+            str(firstTimeVisitors[bucket])] for bucket in range(bucketCount)]
+
+    # Method get_proximity_report builds the proximity report row of one
+    #   bucket from its client counts
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networkName - network name for the first column
+    #   bucket - bucket number
+    #   seenCount - clients seen in the bucket
+    #   visitorCount - clients with a visit in the bucket
+    #   connectedCount - clients with a connected visit in the bucket
+    #
+    # Return Value: report row of Passerby, Visitors, Connected, Capture Rate
+    #####################################################################
+    def get_proximity_report(self, networkName, bucket, seenCount, visitorCount, connectedCount):
+        passerbyCount = seenCount - visitorCount
+        captureRate = 0
+
+        # No visitors in the bucket gives a capture rate of 0
+        if visitorCount > 0:
+            captureRate = float(connectedCount) / float(visitorCount)
+            captureRate = captureRate * 100
+            captureRate = long(round(captureRate, 0))
+        
+        return [networkName, self.get_label(bucket), str(passerbyCount), str(visitorCount), str(connectedCount), str(captureRate)]
+
+#########################################################################
+# Class NetworkList
+#
+# List of networks in the order they were first seen with an index
+#   keyed on network name. New networks use the columnar observation
+#   store when columnar is set.
+#########################################################################
+class NetworkList(list):
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, columnar=False):
+        list.__init__(self)
+        self.networkIndex = {}
+        self.columnar = columnar
+
+    # Method find_network returns the network with the passed name and
+    #   adds a new network to the list if it does not exist yet
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networkName - name of the network (site) to find
+    #
+    # Return Value: Network object
+    #####################################################################
+    def find_network(self, networkName):
+        network = self.networkIndex.get(networkName)
+
+        if network is None:
+            network = Network(networkName, self.columnar)
+            self.append(network)
+            self.networkIndex[networkName] = network
+
+        return network
+
+    # Method merge appends the networks of a NetworkList parsed from a
+    #   later part of the input, see Network.merge
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   other - NetworkList to merge
+    #
+    # Return Value: None
+    #####################################################################
+    def merge(self, other):
+        for network in other:
+            self.find_network(network.name).merge(network)
+
+        return None
+
+#########################################################################
+# Class Checkpoint
+#
+# Per-network and per-client state saved between runs, so a run only
+#   ingests observations newer than the last one (the cutoff). Windows
+#   look window seconds ahead, so new observations only change the visit
+#   flags of the last window before the cutoff, and only visits ending in
+#   the last two windows can still grow. Those visits are written to the
+#   visits file once they are finished. Days are reported once they end
+#   before the finished visits.
+#
+# For every client the checkpoint keeps the day bitmap of its earlier
+#   visits and a tail of observations with their visit flags, from the
+#   last two windows or the first unreported day, whichever is earlier,
+#   back to the start of the visit running at that time. Visits of the
+#   tail are rebuilt on the next run.
+#########################################################################
+class Checkpoint:
+    # Method __init__ initializes the class variables and loads the
+    #   checkpoint file if it exists
+    #
+    # Input: checkpoint file
+    # Output: None
+    # Parameters:
+    #   fileName - name of the checkpoint file
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.cutoffEpoch = None
+        self.firstDayEpoch = None
+        self.lastDayEpoch = None
+        self.visitParameters = None
+        self.networkNames = []
+        self.clientStates = {}
+
+        if os.path.exists(fileName):
+            f = open(fileName, 'rb')
+            state = cPickle.load(f)
+            f.close()
+
+            if state.get("version") != CHECKPOINT_VERSION:
+                raise Exception("Checkpoint " + fileName + " was written by another version")
+
+            self.cutoffEpoch = state["cutoffEpoch"]
+            self.firstDayEpoch = state["firstDayEpoch"]
+            self.lastDayEpoch = state["lastDayEpoch"]
+            self.visitParameters = state["visitParameters"]
+            self.networkNames = state["networkNames"]
+            self.clientStates = state["clientStates"]
+
+    # Method is_new checks if an observation is newer than the checkpoint
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   seenEpoch - seen time of the observation
+    #
+    # Return Value: True if the observation was not ingested before
+    #####################################################################
+    def is_new(self, seenEpoch):
+        return (self.cutoffEpoch == None) or (long(seenEpoch) > self.cutoffEpoch)
+
+    # Method restore adds the saved observation tails and visit days to the
+    #   networks. Clients with neither a tail nor new observations have no
+    #   visits in new days and stay in the checkpoint only.
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networks - NetworkList holding the new observations
+    #   visitParameters - discover_client_visits arguments of this run
+    #
+    # Return Value: None
+    #####################################################################
+    def restore(self, networks, visitParameters):
+        if (self.visitParameters != None) and (tuple(self.visitParameters) != tuple(visitParameters)):
+            raise Exception("Checkpoint " + self.fileName + " was written with visit parameters " + str(tuple(self.visitParameters)))
+
+        # Keep the network order of earlier runs, networks new in this run go last
+        newNetworks = [network for network in networks if network.name not in self.networkNames]
+        oldNetworks = [networks.find_network(networkName) for networkName in self.networkNames]
+        networks[:] = oldNetworks + newNetworks
+
+        for network in networks:
+            clientStates = self.clientStates.get(network.name, {})
+
+            for (clientMac, (historyDaysStart, historyDays, tailRows)) in clientStates.iteritems():
+                client = network._find_client(clientMac)
+
+                if (client.clientMac == "") and (len(tailRows) == 0):
+                    continue
+
+                for row in tailRows:
+                    network.add_observation(*row[:-1])
+
+                client = network._find_client(clientMac)
+                client.historyDaysStart = historyDaysStart
+                client.historyDays = historyDays
+
+                # Flags of the tail, sorted by time before the new observations
+                if len(tailRows) > 0:
+                    client.observations.sort_by_epoch()
+                    client.observations.set_part_of_visit([row[-1] for row in tailRows] + [False] * (len(client.observations) - len(tailRows)))
+
+        return None
+
+    # Method find_cutoff returns the newest observation time ingested so far
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networks - NetworkList of the run
+    #
+    # Return Value: cutoff epoch time
+    #####################################################################
+    def find_cutoff(self, networks):
+        cutoffEpoch = self.cutoffEpoch
+
+        for network in networks:
+            for client in network.clients:
+                epochs = client.observations.get_epochs()
+
+                if (len(epochs) > 0) and ((cutoffEpoch == None) or (max(epochs) > cutoffEpoch)):
+                    cutoffEpoch = max(epochs)
+
+        return cutoffEpoch
+
+    # Method get_finished_epoch returns the time before which visits are
+    #   finished
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   cutoffEpoch - newest observation time, see find_cutoff
+    #   window - window length in seconds
+    #
+    # Return Value: epoch time, None before the first observation
+    #####################################################################
+    def get_finished_epoch(self, cutoffEpoch, window):
+        if cutoffEpoch == None:
+            return None
+
+        return cutoffEpoch - 2 * window
+
+    # Method update stores the state of every client after visit discovery
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   networks - NetworkList of the run
+    #   visitParameters - discover_client_visits arguments of this run
+    #   cutoffEpoch - newest observation time, see find_cutoff
+    #   firstDayEpoch - start of the first reported day
+    #   lastDayEpoch - end of the last reported day
+    #
+    # Return Value: None
+    #####################################################################
+    def update(self, networks, visitParameters, cutoffEpoch, firstDayEpoch, lastDayEpoch):
+        window = visitParameters[1]
+        firstTailEpoch = self.get_finished_epoch(cutoffEpoch, window)
+
+        # Unreported days are rebuilt from the tail
+        if firstDayEpoch == None:
+            firstTailEpoch = 0
+        else:
+            firstTailEpoch = min(firstTailEpoch, lastDayEpoch + 1)
+
+        self.visitParameters = tuple(visitParameters)
+        self.cutoffEpoch = cutoffEpoch
+        self.firstDayEpoch = firstDayEpoch
+        self.lastDayEpoch = lastDayEpoch
+        self.networkNames = [network.name for network in networks]
+
+        for network in networks:
+            clientStates = self.clientStates.setdefault(network.name, {})
+
+            for client in network.clients:
+                tailStartEpoch = firstTailEpoch
+                earlierVisits = []
+
+                # A visit ending within a window of the tail can join its observations
+                for visit in client.visits:
+                    if visit.endTimeEpoch < firstTailEpoch - window:
+                        earlierVisits.append(visit)
+                    else:
+                        tailStartEpoch = min(tailStartEpoch, visit.startTimeEpoch)
+                        break
+
+                (historyDaysStart, historyDays) = add_visit_days(client.historyDaysStart, client.historyDays, earlierVisits)
+                partOfVisit = client.observations.get_part_of_visit()
+                tailRows = []
+
+                for (index, observation) in enumerate(client.observations):
+                    if observation.seenEpoch >= tailStartEpoch:
+                        tailRows.append((observation.apMac, observation.clientMac, observation.ipv4, observation.ipv6,
+                            observation.seenTime, observation.seenEpoch, observation.ssid, observation.rssi,
+                            observation.manufacturer, observation.os, bool(partOfVisit[index])))
+
+                clientStates[client.clientMac] = (historyDaysStart, historyDays, tailRows)
+
+        return None
+
+    # Method save writes the checkpoint file, replacing the old one only
+    #   once the new one is complete
+    #
+    # Input: None
+    # Output: checkpoint file
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def save(self):
+        f = open(self.fileName + ".tmp", 'wb')
+        cPickle.dump({"version": CHECKPOINT_VERSION, "cutoffEpoch": self.cutoffEpoch, "firstDayEpoch": self.firstDayEpoch,
+            "lastDayEpoch": self.lastDayEpoch, "visitParameters": self.visitParameters, "networkNames": self.networkNames,
+            "clientStates": self.clientStates}, f, cPickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.rename(self.fileName + ".tmp", self.fileName)
+
+        return None
+
+# Method add_visit_days sets every day a visit overlaps in a day presence
+#   bitmap, see Client._build_visit_days
+#
+# Input: None
+# Output: None
+# Parameters:
+#   visitDaysStart - day number of bit 0 of visitDays
+#   visitDays - day presence bitmap, 0 when empty
+#   visits - list of Visits to add
+#
+# Return Value: tuple of the new visitDaysStart and visitDays
+#####################################################################
+def add_visit_days(visitDaysStart, visitDays, visits):
+    for visit in visits:
+        for day in range(long(visit.startTimeEpoch // 86400), long(visit.endTimeEpoch // 86400) + 1):
+            if visitDays == 0:
+                visitDaysStart = day
+            elif day < visitDaysStart:
+                visitDays = visitDays << (visitDaysStart - day)
+                visitDaysStart = day
+
+            visitDays = visitDays | (1 << (day - visitDaysStart))
+
+    return (visitDaysStart, visitDays)
+
+# Method find_network 
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: -1 of error, index of first occurrence if found
+#####################################################################
+def find_network(networkName, networks):
+    return networks.find_network(networkName)
+
+# Method _find_input_columns maps each input column to its position in
+#   a header row
+#
+# Input: None
+# Output: None
+# Parameters:
+#   row - list of fields from the first row of the input file
+#
+# Return Value: list of column positions in INPUT_COLUMNS order, None if
+#   the row is not a header
+#####################################################################
+def _find_input_columns(row):
+    headerNames = [field.strip().lower() for field in row]
+    columns = []
+    missingColumns = []
+
+    # A header must at least name the epoch column
+    if not any(name in headerNames for name in INPUT_COLUMNS[6][1]):
+        return None
+
+    for columnName, acceptedNames in INPUT_COLUMNS:
+        matches = [headerNames.index(name) for name in acceptedNames if name in headerNames]
+
+        if len(matches) == 0:
+            missingColumns.append(acceptedNames[0])
+        else:
+            columns.append(matches[0])
+
+    if len(missingColumns) > 0:
+        raise Exception("Input header is missing column(s): " + ", ".join(missingColumns))
+
+    return columns
+
+# Method read_observations streams the input file and yields one tuple of
+#   observation fields per row, splitting each row only once
+#
+# Input: CSV rows from inputStream
+# Output: None
+# Parameters:
+#   inputStream - open file (or any iterable of lines) to read
+#   columns - input column of each field when the header was already
+#     read, see read_input_header; None to check the first row
+#
+# Return Value: generator of (networkName, apMac, clientMac, ipv4, ipv6,
+#   seenTime, seenEpoch, ssid, rssi, manufacturer, os) tuples
+#####################################################################
+def read_observations(inputStream, columns=None):
+    # Declare variables
+    headerChecked = columns != None
+    columns = columns if columns != None else range(len(INPUT_COLUMNS))
+    maxColumn = max(columns)
+    epochNames = INPUT_COLUMNS[6][1]
+    lineNumber = 0
+
+    for row in csv.reader(inputStream):
+        lineNumber = lineNumber + 1
+
+        # Skip blank lines and lines without any separator
+        if len(row) < 2:
+            continue
+
+        # The first row decides if columns are found by name or position
+        if headerChecked == False:
+            headerChecked = True
+            headerColumns = _find_input_columns(row)
+
+            if headerColumns != None:
+                columns = headerColumns
+                maxColumn = max(columns)
+                continue
+
+        if len(row) <= maxColumn:
+            raise Exception("Line " + str(lineNumber) + " has " + str(len(row)) + " columns, expected " + str(maxColumn + 1))
+
+        # Skip repeated header rows from concatenated exports
+        if row[columns[6]].strip().lower() in epochNames:
+            continue
+
+        yield tuple([row[column].strip() for column in columns])
+
+# Method expand_input_names expands the input file names and glob patterns
+#   of the command line, each pattern in sorted order so hourly rotated
+#   files are read oldest first
+#
+# Input: None
+# Output: None
+# Parameters:
+#   patterns - list of file names and glob patterns
+#
+# Return Value: list of file names
+#####################################################################
+def expand_input_names(patterns):
+    # Declare variables
+    inputFileNames = []
+
+    for pattern in patterns:
+        if not glob.has_magic(pattern):
+            inputFileNames.append(pattern)
+            continue
+
+        matches = sorted(glob.glob(pattern))
+
+        if len(matches) == 0:
+            raise Exception("No input files match " + pattern)
+
+        inputFileNames.extend(matches)
+
+    return inputFileNames
+
+# Method get_input_format finds the compression of an input file from its
+#   first bytes, not its name
+#
+# Input: None
+# Output: None
+# Parameters:
+#   inputFileName - file to check
+#
+# Return Value: gzip, bz2, xz or None for plain files
+#####################################################################
+def get_input_format(inputFileName):
+    # Declare variables
+    inputFormat = None
+
+    f = open(inputFileName, 'rb')
+    magic = f.read(8)
+    f.close()
+
+    for (formatMagic, formatName) in INPUT_FORMATS:
+        if magic.startswith(formatMagic):
+            inputFormat = formatName
+
+    return inputFormat
+
+# Method open_input opens an input file, decompressing gzip, bz2 and xz
+#   files as they are read, see get_input_format
+#
+# Input: None
+# Output: None
+# Parameters:
+#   inputFileName - file to open
+#
+# Return Value: file object with a read method
+#####################################################################
+def open_input(inputFileName):
+    # Declare variables
+    inputFormat = get_input_format(inputFileName)
+
+    if inputFormat == "gzip":
+        return gzip.GzipFile(inputFileName, 'rb')
+    elif inputFormat == "bz2":
+        return bz2.BZ2File(inputFileName, 'rb', INPUT_BUFFER_SIZE)
+    elif inputFormat == "xz":
+        if lzma == None:
+            raise Exception("Reading xz file " + inputFileName + " needs the lzma module (pip install backports.lzma)")
+
+        return lzma.LZMAFile(inputFileName, 'rb')
+
+    return open(inputFileName, 'rb', INPUT_BUFFER_SIZE)
+
+#########################################################################
+# Class InputReader
+#
+# Thread reading blocks of an input file ahead of the parser, so reading
+#   and decompressing overlap with parsing. zlib, bz2 and lzma release
+#   the interpreter lock while they decompress.
+#########################################################################
+class InputReader(threading.Thread):
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   inputStream - file object to read
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, inputStream):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.inputStream = inputStream
+        self.blocks = Queue.Queue(INPUT_READ_AHEAD)
+
+    # Method run reads the blocks into the queue, ending with an empty
+    #   block, or the exception if reading failed
+    #
+    # Input: inputStream
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def run(self):
+        try:
+            block = self.inputStream.read(INPUT_BUFFER_SIZE)
+
+            while block != "":
+                self.blocks.put(block)
+                block = self.inputStream.read(INPUT_BUFFER_SIZE)
+
+            self.blocks.put("")
+        except Exception, e:
+            self.blocks.put(e)
+
+        return None
+
+    # Method read_blocks yields the blocks read by the thread
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: generator of blocks
+    #####################################################################
+    def read_blocks(self):
+        block = self.blocks.get()
+
+        while block != "":
+            if isinstance(block, Exception):
+                raise block
+
+            yield block
+            block = self.blocks.get()
+
+# Method read_input_lines streams the lines of an input file, reading and
+#   decompressing it in INPUT_BUFFER_SIZE blocks, in a background thread
+#   when threaded is set. Lines are split from whole blocks by cStringIO,
+#   so the file is never held in memory.
+#
+# Input: lines of inputFileName
+# Output: None
+# Parameters:
+#   inputFileName - file to read, see open_input
+#   threaded - read the file in an InputReader thread
+#
+# Return Value: generator of lines
+#####################################################################
+def read_input_lines(inputFileName, threaded=False):
+    # Declare variables
+    inputStream = open_input(inputFileName)
+    remainder = ""
+
+    if threaded:
+        reader = InputReader(inputStream)
+        reader.start()
+        blocks = reader.read_blocks()
+    else:
+        blocks = iter(lambda: inputStream.read(INPUT_BUFFER_SIZE), "")
+
+    try:
+        for block in blocks:
+            # Carry the unfinished last line over to the next block
+            lineEnd = block.rfind("\n") + 1
+
+            if lineEnd == 0:
+                remainder = remainder + block
+                continue
+
+            for line in cStringIO.StringIO(remainder + block[:lineEnd]):
+                yield line
+
+            remainder = block[lineEnd:]
+
+        if remainder != "":
+            yield remainder
+    finally:
+        inputStream.close()
+
+# Method read_input_files yields the observation fields of every row of
+#   the input files in order, each file with its own header, see
+#   read_observations
+#
+# Input: CSV rows of the input files
+# Output: None
+# Parameters:
+#   inputFileNames - list of files to read, plain or compressed
+#   threaded - read each file in a background thread
+#
+# Return Value: generator of observation field tuples
+#####################################################################
+def read_input_files(inputFileNames, threaded=False):
+    for inputFileName in inputFileNames:
+        for row in read_observations(read_input_lines(inputFileName, threaded)):
+            yield row
+
+# Method read_filtered_input yields the observation fields of every row of
+#   the input files, without the duplicates dropped by a DuplicateFilter
+#
+# Input: CSV files
+# Output: None
+# Parameters:
+#   inputFileNames - list of input file names
+#   threaded - read each file in a background InputReader thread
+#   duplicates - DuplicateFilter or None to keep every row
+#
+# Return Value: generator of observation field tuples
+#####################################################################
+def read_filtered_input(inputFileNames, threaded=False, duplicates=None):
+    rows = read_input_files(inputFileNames, threaded)
+
+    if duplicates != None:
+        rows = duplicates.filter(rows)
+
+    return rows
+
+# Method read_input_header reads the first row of a plain input file to
+#   find the input columns, like read_observations
+#
+# Input: None
+# Output: None
+# Parameters:
+#   inputFileName - plain input file
+#
+# Return Value: tuple of the input column of each field and the offset
+#   of the first data row
+#####################################################################
+def read_input_header(inputFileName):
+    # Declare variables
+    columns = range(len(INPUT_COLUMNS))
+    dataOffset = 0
+
+    f = open(inputFileName, 'rb')
+
+    try:
+        # Skip blank lines and lines without any separator
+        for line in iter(f.readline, ""):
+            row = next(csv.reader([line]), [])
+
+            if len(row) >= 2:
+                headerColumns = _find_input_columns(row)
+
+                if headerColumns != None:
+                    columns = headerColumns
+                    dataOffset = f.tell()
+
+                break
+
+            dataOffset = f.tell()
+    finally:
+        f.close()
+
+    return (columns, dataOffset)
+
+# Method find_input_chunks splits a plain input file into chunks of about
+#   chunkSize bytes, each ending at the end of a line
+#
+# Input: None
+# Output: None
+# Parameters:
+#   inputFileName - plain input file
+#   startOffset - offset of the first data row
+#   chunkSize - bytes per chunk
+#
+# Return Value: list of (start, end) byte offsets
+#####################################################################
+def find_input_chunks(inputFileName, startOffset=0, chunkSize=INPUT_CHUNK_SIZE):
+    # Declare variables
+    fileSize = os.path.getsize(inputFileName)
+    chunks = []
+
+    f = open(inputFileName, 'rb')
+
+    try:
+        while startOffset < fileSize:
+            endOffset = startOffset + chunkSize
+
+            if endOffset >= fileSize:
+                endOffset = fileSize
+            else:
+                # Move the end past the line it falls in
+                f.seek(endOffset)
+                f.readline()
+                endOffset = f.tell()
+
+            chunks.append((startOffset, endOffset))
+            startOffset = endOffset
+    finally:
+        f.close()
+
+    return chunks
+
+# Method parse_observations adds parsed observation rows to a new
+#   NetworkList
+#
+# Input: None
+# Output: None
+# Parameters:
+#   rows - observation field tuples, see read_observations
+#   columnar - keep observations in columns
+#   cutoffEpoch - only keep observations newer than this, see
+#     Checkpoint.is_new; None to keep every row
+#
+# Return Value: NetworkList of the rows
+#####################################################################
+def parse_observations(rows, columnar=False, cutoffEpoch=None):
+    # Declare variables
+    networks = NetworkList(columnar)
+
+    for (networkName, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os) in rows:
+        if (cutoffEpoch != None) and (long(seenEpoch) <= cutoffEpoch):
+            continue
+
+        networks.find_network(networkName).add_observation(apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi,
+            manufacturer, os)
+
+    return networks
+
+# Method _parse_input_chunk parses one chunk of a plain input file in a
+#   worker process
+#
+# Input: part of the input file
+# Output: None
+# Parameters:
+#   workerArguments - tuple of file name, start and end offset, input
+#     columns and the parse_observations cutoff
+#
+# Return Value: columnar NetworkList of the rows of the chunk
+#####################################################################
+def _parse_input_chunk(workerArguments):
+    (inputFileName, startOffset, endOffset, columns, cutoffEpoch) = workerArguments
+
+    f = open(inputFileName, 'rb')
+    f.seek(startOffset)
+    chunk = f.read(endOffset - startOffset)
+    f.close()
+
+    return parse_observations(read_observations(cStringIO.StringIO(chunk), columns), True, cutoffEpoch)
+
+# Method parse_input_files_parallel parses the input files in a pool of
+#   worker processes. Plain files are split at line ends into chunks that
+#   the workers parse into columnar networks of their own, which pickle
+#   compactly and are merged in input order, so clients and observations
+#   keep the order of a sequential read. Compressed files cannot be split
+#   and are parsed in this process.
+#
+# Input: CSV files
+# Output: None
+# Parameters:
+#   inputFileNames - list of input file names
+#   workers - number of worker processes
+#   columnar - keep observations in columns
+#   cutoffEpoch - only keep observations newer than this, see
+#     Checkpoint.is_new; None to keep every row
+#
+# Return Value: NetworkList of the input
+#####################################################################
+def parse_input_files_parallel(inputFileNames, workers, columnar=False, cutoffEpoch=None):
+    # Declare variables
+    networks = NetworkList(columnar)
+    pool = multiprocessing.Pool(workers)
+
+    try:
+        for inputFileName in inputFileNames:
+            if get_input_format(inputFileName) != None:
+                networks.merge(parse_observations(read_observations(read_input_lines(inputFileName)), True, cutoffEpoch))
+                continue
+
+            (columns, dataOffset) = read_input_header(inputFileName)
+            workerArguments = [(inputFileName, startOffset, endOffset, columns, cutoffEpoch)
+                for (startOffset, endOffset) in find_input_chunks(inputFileName, dataOffset)]
+
+            for chunkNetworks in pool.imap(_parse_input_chunk, workerArguments):
+                networks.merge(chunkNetworks)
+    finally:
+        pool.close()
+        pool.join()
+
+    return networks
+
+#########################################################################
+# Class DuplicateFilter
+#
+# Drops exact duplicate observation rows (same network, AP, client, seen
+#   epoch and RSSI) from the input, as sent by CMX push retries and
+#   overlapping collectors. The input only has to be sorted by time per
+#   client: each client keeps the AP and RSSI of its observations in the
+#   window before its latest one, and clients not seen for a sweep
+#   interval are forgotten, so memory stays bounded on any input size.
+#   Duplicates older than the window are kept.
+#########################################################################
+class DuplicateFilter:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   window - seconds of observations remembered per client
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, window=DUPLICATE_WINDOW):
+        self.window = window
+        self.clientStates = {}
+        self.sweptClients = {}
+        self.rowCount = 0
+        self.droppedRows = 0
+
+    # Method filter yields the rows that are not duplicates of a recent row
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   rows - observation field tuples, see read_observations
+    #
+    # Return Value: generator of observation field tuples
+    #####################################################################
+    def filter(self, rows):
+        for row in rows:
+            if self.is_duplicate(row):
+                self.droppedRows = self.droppedRows + 1
+            else:
+                yield row
+
+    # Method is_duplicate checks a row against the recent rows of its client
+    #   and remembers it
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   row - observation field tuple, see read_observations
+    #
+    # Return Value: True if the row was seen within the window
+    #####################################################################
+    def is_duplicate(self, row):
+        # Declare variables
+        clientKey = (row[0], row[2])
+        seenEpoch = long(row[6])
+        rowKey = (row[1], row[8])
+
+        self.rowCount = self.rowCount + 1
+
+        if self.rowCount % DUPLICATE_SWEEP_ROWS == 0:
+            self._sweep()
+
+        # Each client state is [latest epoch, {epoch: set of (AP, RSSI)}]
+        clientState = self.clientStates.get(clientKey)
+
+        if clientState == None:
+            clientState = self.sweptClients.pop(clientKey, None)
+
+            if clientState == None:
+                clientState = [seenEpoch, {}]
+
+            self.clientStates[clientKey] = clientState
+
+        epochRows = clientState[1].get(seenEpoch)
+
+        if epochRows != None:
+            if rowKey in epochRows:
+                return True
+
+            epochRows.add(rowKey)
+        elif seenEpoch > clientState[0]:
+            # Forget the observations that fell out of the window
+            clientState[0] = seenEpoch
+            cutoffEpoch = seenEpoch - self.window
+            epochs = clientState[1]
+
+            for epoch in [epoch for epoch in epochs if epoch < cutoffEpoch]:
+                del epochs[epoch]
+
+            epochs[seenEpoch] = set([rowKey])
+        elif seenEpoch >= clientState[0] - self.window:
+            clientState[1][seenEpoch] = set([rowKey])
+
+        return False
+
+    # Method _sweep forgets the clients without a row since the last sweep
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def _sweep(self):
+        self.sweptClients = self.clientStates
+        self.clientStates = {}
+
+        return None
+
+#########################################################################
+# Class ExternalSorter
+#
+# Sorts observation rows by network, client MAC and seen time within a
+#   memory budget. Rows are collected until the budget is used, sorted
+#   and spilled to a temporary CSV file, and the spill files are merged
+#   when the sorted rows are read. Rows with the same key keep their
+#   input order.
+#########################################################################
+class ExternalSorter:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   spillDirectory - directory for the spill files, None for the
+    #     system temporary directory
+    #   memoryBudget - bytes of rows held before they are spilled
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, spillDirectory=None, memoryBudget=1024 * 1024 * 1024):
+        self.spillDirectory = spillDirectory
+        self.memoryBudget = memoryBudget
+        self.rows = []
+        self.rowsSize = 0
+        self.spillFileNames = []
+
+    # Method add adds a row, spilling the rows when the budget is used
+    #
+    # Input: None
+    # Output: spill file
+    # Parameters:
+    #   row - observation field tuple, see read_observations
+    #
+    # Return Value: None
+    #####################################################################
+    def add(self, row):
+        self.rows.append(row)
+        self.rowsSize = self.rowsSize + SPILL_ROW_OVERHEAD + sum(len(field) for field in row)
+
+        if self.rowsSize >= self.memoryBudget:
+            self._spill()
+
+        return None
+
+    # Method _spill sorts the held rows and writes them to a new spill file
+    #
+    # Input: None
+    # Output: spill file
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def _spill(self):
+        self.rows.sort(key=lambda row: (row[0], row[2], long(row[6])))
+        self._write_spill_file(self.rows)
+        self.rows = []
+        self.rowsSize = 0
+
+        return None
+
+    # Method _write_spill_file writes sorted rows to a new spill file
+    #
+    # Input: None
+    # Output: spill file
+    # Parameters:
+    #   rows - iterable of sorted rows
+    #
+    # Return Value: None
+    #####################################################################
+    def _write_spill_file(self, rows):
+        (fileHandle, spillFileName) = tempfile.mkstemp(".csv", "cmx_spill_", self.spillDirectory)
+        f = os.fdopen(fileHandle, 'wb', OUTPUT_BUFFER_SIZE)
+        csv.writer(f, lineterminator='\n').writerows(rows)
+        f.close()
+        self.spillFileNames.append(spillFileName)
+
+        return None
+
+    # Method _read_spill_file yields the rows of a spill file with their
+    #   merge key
+    #
+    # Input: spill file
+    # Output: None
+    # Parameters:
+    #   spillIndex - position of the file in spillFileNames
+    #
+    # Return Value: generator of (key, row) tuples
+    #####################################################################
+    def _read_spill_file(self, spillIndex):
+        f = open(self.spillFileNames[spillIndex], 'rb', INPUT_BUFFER_SIZE)
+
+        try:
+            for (rowIndex, row) in enumerate(csv.reader(f)):
+                yield ((row[0], row[2], long(row[6]), spillIndex, rowIndex), tuple(row))
+        finally:
+            f.close()
+
+    # Method _merge_spill_files yields the rows of the spill files in sort
+    #   order, earlier files first for equal keys
+    #
+    # Input: spill files
+    # Output: None
+    # Parameters:
+    #   spillIndexes - positions of the files in spillFileNames
+    #
+    # Return Value: generator of rows
+    #####################################################################
+    def _merge_spill_files(self, spillIndexes):
+        for (key, row) in heapq.merge(*[self._read_spill_file(spillIndex) for spillIndex in spillIndexes]):
+            yield row
+
+    # Method get_sorted_rows yields every added row in sort order. Spill
+    #   files are merged SPILL_MERGE_WIDTH at a time until one merge is
+    #   left, so the number of open files stays bounded.
+    #
+    # Input: spill files
+    # Output: merged spill files
+    # Parameters: None
+    #
+    # Return Value: generator of rows
+    #####################################################################
+    def get_sorted_rows(self):
+        if len(self.rows) > 0:
+            self._spill()
+
+        while len(self.spillFileNames) > SPILL_MERGE_WIDTH:
+            mergedFileNames = self.spillFileNames[:SPILL_MERGE_WIDTH]
+            self._write_spill_file(self._merge_spill_files(range(SPILL_MERGE_WIDTH)))
+
+            # The merged file holds the earliest rows, so it goes first
+            self.spillFileNames = self.spillFileNames[-1:] + self.spillFileNames[SPILL_MERGE_WIDTH:-1]
+            for spillFileName in mergedFileNames:
+                os.remove(spillFileName)
+
+        return self._merge_spill_files(range(len(self.spillFileNames)))
+
+    # Method close removes the spill files
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def close(self):
+        for spillFileName in self.spillFileNames:
+            if os.path.exists(spillFileName):
+                os.remove(spillFileName)
+
+        self.spillFileNames = []
+        self.rows = []
+
+        return None
+
+# Method peak_rss_mb returns the peak resident memory of this process and
+#   its finished children
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: peak resident set size in MB, 0 where it is not known
+#####################################################################
+def peak_rss_mb():
+    if resource == None:
+        return 0.0
+
+    peakRSS = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform == 'darwin':
+        return peakRSS / (1024.0 * 1024.0)
+
+    return peakRSS / 1024.0
+
+#########################################################################
+# Class StageTimer
+#
+# Records wall time, CPU time and peak memory of consecutive stages of a
+#   run, and counters such as rows, clients and visits
+#########################################################################
+class StageTimer:
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self):
+        self.stages = []
+        self.counters = {}
+        self.stageName = None
+        self.wallStart = 0
+        self.cpuStart = 0
+
+    # Method start begins timing a stage
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   stageName - name of the stage
+    #
+    # Return Value: None
+    #####################################################################
+    def start(self, stageName):
+        self.stageName = stageName
+        self.wallStart = time.time()
+        self.cpuStart = time.clock()
+
+        return None
+
+    # Method stop ends timing the current stage
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def stop(self):
+        self.stages.append({"stage": self.stageName, "wall": time.time() - self.wallStart,
+            "cpu": time.clock() - self.cpuStart, "peakRSS": peak_rss_mb()})
+
+        return None
+
+    # Method add_count adds to a counter
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   name - name of the counter
+    #   count - amount to add
+    #
+    # Return Value: None
+    #####################################################################
+    def add_count(self, name, count):
+        self.counters[name] = self.counters.get(name, 0) + count
+
+        return None
+
+    # Method get_summary returns the stages and counters, with the rows per
+    #   second of every stage when the rows counter is set
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: dictionary of stages, counters and peak memory
+    #####################################################################
+    def get_summary(self):
+        stages = []
+        rowCount = self.counters.get("rows", 0)
+
+        for stage in self.stages:
+            stage = dict(stage)
+            stage["rowsPerSecond"] = int(rowCount / stage["wall"]) if stage["wall"] > 0 else 0
+            stages.append(stage)
+
+        return {"stages": stages, "counters": self.counters, "wall": sum(stage["wall"] for stage in self.stages),
+            "cpu": sum(stage["cpu"] for stage in self.stages), "peakRSS": peak_rss_mb()}
+
+# Method get_input_key identifies an input file for the observation cache
+#   by size, modification time and a hash of its first and last MB, so a
+#   changed export is parsed again without reading the whole file
+#
+# Input: start and end of the input file
+# Output: None
+# Parameters:
+#   inputFileName - input CSV file
+#
+# Return Value: tuple of size, modification time and hash
+#####################################################################
+def get_input_key(inputFileName):
+    # Declare variables
+    fileStat = os.stat(inputFileName)
+    sampleSize = 1024 * 1024
+    digest = hashlib.sha1()
+
+    f = open(inputFileName, 'rb')
+    digest.update(f.read(sampleSize))
+    if fileStat.st_size > sampleSize:
+        f.seek(max(sampleSize, fileStat.st_size - sampleSize))
+        digest.update(f.read(sampleSize))
+    f.close()
+
+    return (fileStat.st_size, fileStat.st_mtime, digest.hexdigest())
+
+# Method write_observation_cache writes the observations of the networks
+#   to a binary cache file. Every client is a block of fixed width
+#   columns, see CACHE_COLUMNS, with the strings as codes of a table per
+#   network, and a pickled index of networks, tables and client blocks
+#   ends the file. Seen times formatted from the epoch have code 0.
+#
+# Input: None
+# Output: cache file
+# Parameters:
+#   cacheFileName - name of the cache file
+#   inputKey - list of the get_input_key of every input file and the
+#     --drop-duplicates window
+#   networks - NetworkList holding the parsed input
+#
+# Return Value: None
+#####################################################################
+def write_observation_cache(cacheFileName, inputKey, networks):
+    # Declare variables
+    networkIndex = []
+
+    f = open(cacheFileName + ".tmp", 'wb', OUTPUT_BUFFER_SIZE)
+    f.write(CACHE_MAGIC)
+
+    for network in networks:
+        stringTable = network.stringTable if network.stringTable != None else StringTable()
+        seenTimeTable = StringTable()
+
+        # Code 0 stands for the seen time formatted from the epoch
+        seenTimeTable.encode(None)
+        clientIndex = []
+
+        for client in network.clients:
+            observations = client.observations
+
+            # Encode list observations through the table of the network
+            if not isinstance(observations, ObservationColumns):
+                observations = ObservationColumns(stringTable)
+                for observation in client.observations:
+                    observations.append(observation)
+
+            columns = dict((name, getattr(observations, name)) for (name, typecode) in CACHE_COLUMNS)
+            columns['seenTimes'] = array.array('I', [seenTimeTable.encode(observations.seenTimes.get(index))
+                for index in range(len(observations))])
+            clientIndex.append((client.clientMac, f.tell(), len(observations)))
+
+            for (name, typecode) in CACHE_COLUMNS:
+                f.write(columns[name].tostring())
+
+            f.write("\0" * (-f.tell() % 8))
+
+        networkIndex.append((network.name, stringTable.values, seenTimeTable.values, clientIndex))
+
+    indexOffset = f.tell()
+    cPickle.dump({"version": CACHE_VERSION, "inputKey": inputKey, "networks": networkIndex,
+        "itemSizes": [array.array(typecode).itemsize for (name, typecode) in CACHE_COLUMNS]}, f, cPickle.HIGHEST_PROTOCOL)
+    f.write(struct.pack('<Q', indexOffset))
+    f.close()
+    os.rename(cacheFileName + ".tmp", cacheFileName)
+
+    return None
+
+# Method read_observation_cache loads the networks of a cache file written
+#   by write_observation_cache for the same input file. The file is
+#   memory mapped and the client columns are copied straight into
+#   ObservationColumns, or into Observations without --columnar.
+#
+# Input: cache file
+# Output: None
+# Parameters:
+#   cacheFileName - name of the cache file
+#   inputKey - list of the get_input_key of every input file and the
+#     --drop-duplicates window
+#   columnar - keep observations in columns
+#
+# Return Value: NetworkList, None if there is no cache of the input file
+#####################################################################
+def read_observation_cache(cacheFileName, inputKey, columnar=False):
+    # Declare variables
+    networks = NetworkList(columnar)
+
+    if not os.path.exists(cacheFileName):
+        return None
+
+    f = open(cacheFileName, 'rb')
+    cacheMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    f.close()
+
+    try:
+        if (len(cacheMap) < len(CACHE_MAGIC) + 8) or (cacheMap[:len(CACHE_MAGIC)] != CACHE_MAGIC):
+            return None
+
+        indexOffset = struct.unpack('<Q', cacheMap[-8:])[0]
+        index = cPickle.loads(cacheMap[indexOffset:-8])
+
+        if (index["version"] != CACHE_VERSION) or (index["inputKey"] != inputKey) or \
+            (index["itemSizes"] != [array.array(typecode).itemsize for (name, typecode) in CACHE_COLUMNS]):
+            return None
+
+        for (networkName, stringValues, seenTimeValues, clientIndex) in index["networks"]:
+            network = networks.find_network(networkName)
+            stringTable = StringTable()
+            stringTable.values = stringValues
+            stringTable.codes = dict((value, code) for (code, value) in enumerate(stringValues))
+
+            if network.stringTable != None:
+                network.stringTable = stringTable
+
+            for (clientMac, blockOffset, rowCount) in clientIndex:
+                observations = ObservationColumns(stringTable)
+                observations.clientMac = clientMac
+                position = blockOffset
+
+                for (name, typecode) in CACHE_COLUMNS:
+                    column = array.array(typecode)
+                    column.fromstring(cacheMap[position:position + rowCount * column.itemsize])
+                    setattr(observations, name, column)
+                    position = position + rowCount * column.itemsize
+
+                observations.seenTimes = dict((index, seenTimeValues[code]) for (index, code) in enumerate(observations.seenTimes) if code != 0)
+                observations.partOfVisit = array.array('B', [0]) * rowCount
+
+                if network.stringTable == None:
+                    observations = ObservationList(observations)
+
+                client = Client(clientMac, observations)
+                client.manufacturer = observations[0].manufacturer
+                client.os = observations[0].os
+                network.clients.append(client)
+                network.clientIndex[clientMac] = client
+    finally:
+        cacheMap.close()
+
+    return networks
+
+#########################################################################
+# Class SQLiteStore
+#
+# SQLite database of the observations and visits of a run, for ad hoc
+#   queries (per AP, per SSID, per manufacturer) and for repeat runs on
+#   the same input, which build the output files and the CMX reports
+#   with indexed queries instead of parsing the input again.
+#
+# Tables:
+#   networks (network_index, site)
+#   observations (site, client_mac, ap_mac, ipv4, ipv6, seen_time,
+#     seen_epoch, ssid, rssi, manufacturer, os)
+#   visits (site, client_mac, start_epoch, end_epoch, length, connected)
+#   runs (input_key, visit_parameters) - the run the tables hold
+#
+# Rows are stored in output order, so ordering by rowid gives the rows
+#   of the client observations and visits files. The observations are
+#   loaded before visit discovery sorts them by time, see
+#   load_observations.
+#########################################################################
+class SQLiteStore:
+    # Method __init__ opens the database, creating the tables if needed
+    #
+    # Input: database file
+    # Output: None
+    # Parameters:
+    #   fileName - name of the database file
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.connection = sqlite3.connect(fileName)
+        self.connection.text_factory = str
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        for statement in SQLITE_TABLES:
+            self.connection.execute(statement)
+
+        self.connection.commit()
+
+    # Method holds_run checks if the database holds the run of an input
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   inputKey - list of the get_input_key of every input file and the
+    #     --drop-duplicates window
+    #   visitParameters - discover_client_visits arguments
+    #
+    # Return Value: True if the tables hold the run
+    #####################################################################
+    def holds_run(self, inputKey, visitParameters):
+        runs = self.connection.execute("SELECT input_key, visit_parameters FROM runs").fetchall()
+
+        return runs == [(json.dumps(inputKey), json.dumps(visitParameters))]
+
+    # Method load_observations replaces the tables with the networks and
+    #   observations of a run, in the order of the client observations
+    #   file. Call it before the visits are found, since that sorts the
+    #   observations of every client by time. Rows are inserted with
+    #   executemany and the indexes are built by load_visits.
+    #
+    # Input: None
+    # Output: database tables
+    # Parameters:
+    #   networks - NetworkList holding the parsed input
+    #
+    # Return Value: None
+    #####################################################################
+    def load_observations(self, networks):
+        cursor = self.connection.cursor()
+
+        for (indexName, tableName, columns) in SQLITE_INDEXES:
+            cursor.execute("DROP INDEX IF EXISTS " + indexName)
+
+        for tableName in ["runs", "networks", "observations", "visits"]:
+            cursor.execute("DELETE FROM " + tableName)
+
+        cursor.executemany("INSERT INTO networks VALUES (?, ?)", enumerate(network.name for network in networks))
+        cursor.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ([row[0], row[2], row[1]] + row[3:] for network in networks for row in network.get_observations()))
+        self.connection.commit()
+
+        return None
+
+    # Method load_visits adds the visits of the networks after
+    #   load_observations, builds the indexes and records the run, so
+    #   holds_run is only True once every row is in
+    #
+    # Input: None
+    # Output: database tables
+    # Parameters:
+    #   networks - NetworkList with the visits found
+    #   inputKey - list of the get_input_key of every input file and the
+    #     --drop-duplicates window
+    #   visitParameters - discover_client_visits arguments
+    #
+    # Return Value: None
+    #####################################################################
+    def load_visits(self, networks, inputKey, visitParameters):
+        cursor = self.connection.cursor()
+
+        cursor.executemany("INSERT INTO visits VALUES (?, ?, ?, ?, ?, ?)",
+            ((network.name, client.clientMac, visit.startTimeEpoch, visit.endTimeEpoch, visit.length, int(visit.connected))
+            for network in networks for client in network.clients for visit in client.visits))
+
+        for (indexName, tableName, columns) in SQLITE_INDEXES:
+            cursor.execute("CREATE INDEX " + indexName + " ON " + tableName + " (" + columns + ")")
+
+        cursor.execute("INSERT INTO runs VALUES (?, ?)", (json.dumps(inputKey), json.dumps(visitParameters)))
+        self.connection.commit()
+
+        return None
+
+    # Method get_sites returns the sites in network order
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: list of site names
+    #####################################################################
+    def get_sites(self):
+        return [site for (site,) in self.connection.execute("SELECT site FROM networks ORDER BY network_index")]
+
+    # Method get_observations yields the rows of the client observations
+    #   file
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: cursor of observation rows
+    #####################################################################
+    def get_observations(self):
+        return self.connection.execute("SELECT site, ap_mac, client_mac, ipv4, ipv6, seen_time, seen_epoch, ssid, rssi, " +
+            "manufacturer, os FROM observations ORDER BY rowid")
+
+    # Method get_visits yields the rows of the client visits file
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: generator of visit rows
+    #####################################################################
+    def get_visits(self):
+        for (site, clientMac, startEpoch, endEpoch, length, connected) in self.connection.execute(
+            "SELECT site, client_mac, start_epoch, end_epoch, length, connected FROM visits ORDER BY rowid"):
+            yield [site, clientMac, format_visit_time(startEpoch), format_visit_time(endEpoch), str(length), str(connected == 1)]
+
+    # Method get_time_range returns the first and last day of the visits,
+    #   see find_first_day and find_last_day
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: tuple of the start of the first and end of the last day
+    #####################################################################
+    def get_time_range(self):
+        (startEpoch, endEpoch) = self.connection.execute("SELECT MIN(start_epoch), MAX(end_epoch) FROM visits").fetchone()
+        startEpoch = startEpoch if startEpoch != None else 0
+        endEpoch = endEpoch if endEpoch != None else 0
+
+        return (float(startEpoch - startEpoch % 86400), float(endEpoch - endEpoch % 86400 + 86399))
+
+    # Method _get_visit_buckets returns the query of every bucket in the
+    #   range a visit of a site overlaps, see Client.get_day_buckets. A
+    #   recursive query steps from the first to the last bucket of a visit.
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: SQL select of client_mac, bucket and connected
+    #####################################################################
+    def _get_visit_buckets(self):
+        return ("WITH RECURSIVE visit_buckets (client_mac, bucket, last_bucket, connected) AS (" +
+            "SELECT client_mac, (MAX(start_epoch, :start) - :start) / :length, (MIN(end_epoch, :end - 1) - :start) / :length, " +
+            "connected FROM visits WHERE site = :site AND end_epoch >= :start AND start_epoch < :end UNION ALL " +
+            "SELECT client_mac, bucket + 1, last_bucket, connected FROM visit_buckets WHERE bucket < last_bucket) " +
+            "SELECT client_mac, bucket, connected FROM visit_buckets")
+
+    # Method get_cmx_proximity_reports returns the proximity report of
+    #   every bucket of a site, counting the clients seen, visiting and
+    #   connected per bucket in the database
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   site - site name
+    #   startTimeEpoch - Start of the first bucket
+    #   endTimeEpoch - End of the report range
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_cmx_proximity_reports(self, site, startTimeEpoch, endTimeEpoch, timeIterator):
+        # Declare variables
+        buckets = ReportBuckets(startTimeEpoch, endTimeEpoch, timeIterator)
+        parameters = {"site": site, "start": long(startTimeEpoch), "end": long(buckets.get_start(buckets.count)),
+            "length": long(timeIterator)}
+        seenCounts = [0] * buckets.count
+        visitorCounts = [0] * buckets.count
+        connectedCounts = [0] * buckets.count
+
+        for (bucket, seenCount) in self.connection.execute("SELECT (seen_epoch - :start) / :length, COUNT(DISTINCT client_mac) " +
+            "FROM observations WHERE site = :site AND seen_epoch >= :start AND seen_epoch < :end GROUP BY 1", parameters):
+            seenCounts[bucket] = seenCount
+
+        for (bucket, visitorCount, connectedCount) in self.connection.execute("SELECT bucket, COUNT(*), SUM(connected) FROM " +
+            "(SELECT client_mac, bucket, MAX(connected) AS connected FROM (" + self._get_visit_buckets() + ") " +
+            "GROUP BY client_mac, bucket) GROUP BY bucket", parameters):
+            visitorCounts[bucket] = visitorCount
+            connectedCounts[bucket] = connectedCount
+
+        return [buckets.get_proximity_report(site, bucket, seenCounts[bucket], visitorCounts[bucket], connectedCounts[bucket])
+            for bucket in range(buckets.count)]
+
+    # Method get_cmx_engagement_reports returns the engagement report of
+    #   every bucket of a site from the visits overlapping the range
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   site - site name
+    #   startTimeEpoch - Start of the first bucket
+    #   endTimeEpoch - End of the report range
+    #   timeIterator - length of a bucket in seconds
+    #   lengthBuckets - sorted lower edges of the visit length buckets
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_cmx_engagement_reports(self, site, startTimeEpoch, endTimeEpoch, timeIterator, lengthBuckets):
+        buckets = ReportBuckets(startTimeEpoch, endTimeEpoch, timeIterator)
+        visitTimes = self.connection.execute("SELECT start_epoch, end_epoch FROM visits " +
+            "WHERE site = ? AND end_epoch >= ? AND start_epoch < ?", (site, long(startTimeEpoch), long(buckets.get_start(buckets.count))))
+
+        return buckets.get_engagement_reports(site, visitTimes, lengthBuckets)
+
+    # Method get_cmx_loyalty_reports returns the loyalty report of every
+    #   bucket of a site from the buckets each client visited
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   site - site name
+    #   loyaltyStartEpoch - Start of the loyalty range
+    #   loyaltyEndEpoch - End of the loyalty range
+    #   timeIterator - length of a bucket in seconds
+    #
+    # Return Value: list of report rows, one per bucket
+    #####################################################################
+    def get_cmx_loyalty_reports(self, site, loyaltyStartEpoch, loyaltyEndEpoch, timeIterator):
+        # Declare variables
+        buckets = ReportBuckets(loyaltyStartEpoch, loyaltyEndEpoch, timeIterator)
+        parameters = {"site": site, "start": long(loyaltyStartEpoch), "end": long(buckets.get_start(buckets.count)),
+            "length": long(timeIterator)}
+        visitBitmaps = []
+
+        clientBuckets = self.connection.execute("SELECT DISTINCT client_mac, bucket FROM (" + self._get_visit_buckets() + ") " +
+            "ORDER BY client_mac", parameters)
+
+        for (clientMac, rows) in itertools.groupby(clientBuckets, operator.itemgetter(0)):
+            visitBitmaps.append(sum(1 << bucket for (clientMac, bucket) in rows))
+
+        return buckets.get_loyalty_reports(site, visitBitmaps)
+
+    # Method write_outputs writes the output files of the run held by the
+    #   database, like analyze_networks
+    #
+    # Input: None
+    # Output: CSV files starting with csvFilePreamble
+    # Parameters:
+    #   csvFilePreamble - start of the output file names
+    #   lengthBuckets - engagement visit length buckets
+    #   timer - StageTimer of the run
+    #   granularities - bucket lengths of the reports, see get_cmx_reports
+    #   outputs - output files to write, see OUTPUTS
+    #
+    # Return Value: None
+    #####################################################################
+    def write_outputs(self, csvFilePreamble, lengthBuckets, timer, granularities=REPORT_GRANULARITIES, outputs=OUTPUTS):
+        # Declare variables
+        (proximityIterator, engagementIterator, loyaltyIterator) = granularities
+        (proximityReports, engagementReports, loyaltyReports) = [[] if output in outputs else None for output in OUTPUTS[2:]]
+
+        if "observations" in outputs:
+            timer.start("observation_output")
+            write_csv_file(csvFilePreamble + "_client_observations.csv", OBSERVATION_HEADER, self.get_observations())
+            timer.stop()
+
+        if "visits" in outputs:
+            timer.start("visit_output")
+            write_csv_file(csvFilePreamble + "_client_visits.csv", VISIT_HEADER, self.get_visits())
+            timer.stop()
+
+        timer.start("reports")
+        (startTimeRangeEpoch, endTimeRangeEpoch) = self.get_time_range()
+
+        for site in self.get_sites():
+            if proximityReports != None:
+                proximityReports.append(self.get_cmx_proximity_reports(site,
+                    align_bucket_start(startTimeRangeEpoch, proximityIterator), endTimeRangeEpoch, proximityIterator))
+
+            if engagementReports != None:
+                engagementReports.append(self.get_cmx_engagement_reports(site,
+                    align_bucket_start(startTimeRangeEpoch, engagementIterator), endTimeRangeEpoch, engagementIterator, lengthBuckets))
+
+            if loyaltyReports != None:
+                loyaltyReports.append(self.get_cmx_loyalty_reports(site,
+                    align_bucket_start(startTimeRangeEpoch, loyaltyIterator), endTimeRangeEpoch, loyaltyIterator))
+        timer.stop()
+
+        timer.start("report_output")
+        write_report_files(csvFilePreamble, proximityReports, engagementReports, loyaltyReports, lengthBuckets)
+        timer.stop()
+
+        return None
+
+    # Method close closes the database
+    #
+    # Input: None
+    # Output: None
+    # Parameters: None
+    #
+    # Return Value: None
+    #####################################################################
+    def close(self):
+        self.connection.close()
+
+        return None
+
+# Method engagement_bucket_labels builds the report column names of the
+#   engagement visit length buckets, e.g. 5-20 mins or 6+ hrs
+#
+# Input: None
+# Output: None
+# Parameters:
+#   lengthBuckets - sorted lower edges of the length buckets in seconds
+#
+# Return Value: list of column names
+#####################################################################
+def engagement_bucket_labels(lengthBuckets):
+    # Declare variables
+    labels = []
+
+    for i in range(len(lengthBuckets)):
+        lengthMin = lengthBuckets[i]
+
+        # Pick the unit from the lower edge so 20-60 mins is not 20 mins-1 hrs
+        if (lengthMin >= 3600) and (lengthMin % 3600 == 0):
+            unit = (3600, " hrs")
+        elif (lengthMin % 60 == 0) and ((i + 1 == len(lengthBuckets)) or (lengthBuckets[i + 1] % 60 == 0)):
+            unit = (60, " mins")
+        else:
+            unit = (1, " secs")
+
+        if i + 1 == len(lengthBuckets):
+            labels.append(str(lengthMin // unit[0]) + "+" + unit[1])
+        elif lengthBuckets[i + 1] % unit[0] == 0:
+            labels.append(str(lengthMin // unit[0]) + "-" + str(lengthBuckets[i + 1] // unit[0]) + unit[1])
+        else:
+            labels.append(str(lengthMin) + "-" + str(lengthBuckets[i + 1]) + " secs")
+
+    return labels
+
+# Method parse_length_buckets reads a comma separated list of bucket
+#   edges from the command line
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - command line value such as 300,1200,3600,21600
+#
+# Return Value: sorted list of bucket edges in seconds
+#####################################################################
+def parse_length_buckets(value):
+    try:
+        lengthBuckets = [long(edge) for edge in value.split(',') if edge.strip() != ""]
+    except ValueError:
+        raise argparse.ArgumentTypeError("bucket edges must be whole seconds: " + value)
+
+    if (len(lengthBuckets) == 0) or (sorted(set(lengthBuckets)) != lengthBuckets):
+        raise argparse.ArgumentTypeError("bucket edges must be increasing: " + value)
+
+    return lengthBuckets
+
+# Method parse_outputs reads a comma separated list of output names from
+#   the command line
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - command line value such as proximity,loyalty
+#
+# Return Value: list of output names in OUTPUTS order
+#####################################################################
+def parse_outputs(value):
+    outputs = [output.strip().lower() for output in value.split(',') if output.strip() != ""]
+    unknownOutputs = [output for output in outputs if output not in OUTPUTS]
+
+    if (len(outputs) == 0) or (len(unknownOutputs) > 0):
+        raise argparse.ArgumentTypeError("outputs must be among " + ",".join(OUTPUTS) + ": " + value)
+
+    return [output for output in OUTPUTS if output in outputs]
+
+# Method parse_sweep_values reads a comma separated list of values of one
+#   visit parameter from the command line
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - command line value such as 3,5,8
+#
+# Return Value: list of values in command line order
+#####################################################################
+def parse_sweep_values(value):
+    try:
+        sweepValues = [int(sweepValue) for sweepValue in value.split(',') if sweepValue.strip() != ""]
+    except ValueError:
+        raise argparse.ArgumentTypeError("sweep values must be whole numbers: " + value)
+
+    if len(sweepValues) == 0:
+        raise argparse.ArgumentTypeError("sweep needs at least one value: " + value)
+
+    return sweepValues
+
+# Method parse_granularity reads a report bucket length from the command
+#   line
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - hourly, daily, weekly or a number of seconds
+#
+# Return Value: bucket length in seconds
+#####################################################################
+def parse_granularity(value):
+    if value.lower() in GRANULARITIES:
+        return GRANULARITIES[value.lower()]
+
+    try:
+        timeIterator = long(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("granularity must be hourly, daily, weekly or whole seconds: " + value)
+
+    if timeIterator <= 0:
+        raise argparse.ArgumentTypeError("granularity must be more than 0 seconds: " + value)
+
+    return timeIterator
+
+# Method align_bucket_start moves the start of a report range back to the
+#   start of its first bucket, see BUCKET_ORIGIN_EPOCH. Day and hour
+#   buckets of a range starting at midnight keep their start.
+#
+# Input: None
+# Output: None
+# Parameters:
+#   startTimeEpoch - Start of the report range
+#   timeIterator - length of a bucket in seconds
+#
+# Return Value: start time of the first bucket
+#####################################################################
+def align_bucket_start(startTimeEpoch, timeIterator):
+    return startTimeEpoch - (startTimeEpoch - BUCKET_ORIGIN_EPOCH) % timeIterator
+
+# Method _init_worker stores the networks in a worker process. With fork
+#   the networks are inherited, so they are not copied through a pipe.
+#
+# Input: None
+# Output: None
+# Parameters:
+#   networks - NetworkList of the run
+#
+# Return Value: None
+#####################################################################
+def _init_worker(networks):
+    global _workerNetworks
+
+    _workerNetworks = networks
+
+    return None
+
+# Method _discover_network_visits finds the visits of one network in a
+#   worker process
+#
+# Input: None
+# Output: None
+# Parameters:
+#   workerArguments - tuple of network index, visit parameters and
+#     whether the observation visit flags are returned
+#
+# Return Value: tuple of network index and the visits and visit flags of
+#   each client
+#####################################################################
+def _discover_network_visits(workerArguments):
+    (networkIndex, visitParameters, keepPartOfVisit) = workerArguments
+    network = _workerNetworks[networkIndex]
+
+    network.discover_client_visits(*visitParameters)
+
+    if keepPartOfVisit:
+        return (networkIndex, [(client.visits, bytearray(client.observations.get_part_of_visit())) for client in network.clients])
+
+    return (networkIndex, [(client.visits, None) for client in network.clients])
+
+# Method _get_network_reports builds the reports of one network in a
+#   worker process
+#
+# Input: None
+# Output: None
+# Parameters:
+#   workerArguments - tuple of network index and get_cmx_reports arguments
+#
+# Return Value: tuple of network index, proximity, engagement and
+#   loyalty report rows (None when not in outputs) and the CPU seconds
+#   of each report
+#####################################################################
+def _get_network_reports(workerArguments):
+    (networkIndex, startTimeRangeEpoch, endTimeRangeEpoch, lengthBuckets, granularities, outputs) = workerArguments
+    (proximityIterator, engagementIterator, loyaltyIterator) = granularities
+    network = _workerNetworks[networkIndex]
+    proximityReport = None
+    engagementReport = None
+    loyaltyReport = None
+    cpuTimes = [time.clock()]
+
+    if "proximity" in outputs:
+        proximityReport = network.get_cmx_proximity_reports(align_bucket_start(startTimeRangeEpoch, proximityIterator),
+            endTimeRangeEpoch, proximityIterator)
+    cpuTimes.append(time.clock())
+    if "engagement" in outputs:
+        engagementReport = network.get_cmx_engagement_reports(align_bucket_start(startTimeRangeEpoch, engagementIterator),
+            endTimeRangeEpoch, engagementIterator, lengthBuckets)
+    cpuTimes.append(time.clock())
+    if "loyalty" in outputs:
+        loyaltyReport = network.get_cmx_loyalty_reports(align_bucket_start(startTimeRangeEpoch, loyaltyIterator),
+            endTimeRangeEpoch, loyaltyIterator)
+    cpuTimes.append(time.clock())
+
+    return (networkIndex, proximityReport, engagementReport, loyaltyReport,
+        [cpuTimes[i + 1] - cpuTimes[i] for i in range(3)])
+
+# Method _get_network_sweep_summary finds the visits of one network with
+#   one set of visit parameters in a worker process
+#
+# Input: None
+# Output: None
+# Parameters:
+#   workerArguments - tuple of network index, parameter index and
+#     get_sweep_summary arguments
+#
+# Return Value: tuple of network index, parameter index and summary row
+#####################################################################
+def _get_network_sweep_summary(workerArguments):
+    (networkIndex, parameterIndex, visitParameters, startTimeEpoch, endTimeEpoch, timeIterator) = workerArguments
+    network = _workerNetworks[networkIndex]
+
+    return (networkIndex, parameterIndex, network.get_sweep_summary(visitParameters, startTimeEpoch, endTimeEpoch, timeIterator))
+
+# Method _network_work_order lists the network indexes largest first so
+#   the longest sites start first in the process pool
+#
+# Input: None
+# Output: None
+# Parameters:
+#   networks - NetworkList of the run
+#
+# Return Value: list of network indexes
+#####################################################################
+def _network_work_order(networks):
+    networkSizes = [sum(len(client.observations) for client in network.clients) for network in networks]
+
+    return sorted(range(len(networks)), key=lambda networkIndex: -networkSizes[networkIndex])
+
+# Method discover_visits finds the client visits of every network, in a
+#   pool of worker processes when workers is more than 1
+#
+# Input: None
+# Output: None
+# Parameters:
+#   networks - NetworkList of the run
+#   visitParameters - discover_client_visits arguments
+#   workers - number of worker processes
+#   keepPartOfVisit - copy the observation visit flags back from the
+#     workers, needed by Checkpoint
+#
+# Return Value: None
+#####################################################################
+def discover_visits(networks, visitParameters, workers=1, keepPartOfVisit=False):
+    if (workers <= 1) or (len(networks) <= 1):
+        for network in networks:
+            network.discover_client_visits(*visitParameters)
+
+        return None
+
+    pool = multiprocessing.Pool(min(workers, len(networks)), _init_worker, (networks,))
+
+    try:
+        workerArguments = [(networkIndex, visitParameters, keepPartOfVisit) for networkIndex in _network_work_order(networks)]
+
+        # Attach the visits found by the workers to the clients of this process
+        for (networkIndex, clientVisits) in pool.imap_unordered(_discover_network_visits, workerArguments):
+            for (client, (visits, partOfVisit)) in zip(networks[networkIndex].clients, clientVisits):
+                client.set_visits(visits, partOfVisit)
+    finally:
+        pool.close()
+        pool.join()
+
+    return None
+
+# Method get_cmx_reports builds the proximity, engagement and loyalty
+#   reports of every network, in a pool of worker processes when workers
+#   is more than 1
+#
+# Input: None
+# Output: None
+# Parameters:
+#   networks - NetworkList of the run
+#   startTimeRangeEpoch - Start of the first day
+#   endTimeRangeEpoch - End of the last day
+#   lengthBuckets - engagement visit length buckets
+#   workers - number of worker processes
+#   timer - StageTimer counting the CPU seconds of each report, if set
+#   granularities - bucket lengths in seconds of the proximity,
+#     engagement and loyalty reports
+#   outputs - reports to build, see OUTPUTS
+#
+# Return Value: tuple of proximity, engagement and loyalty reports, each
+#   a list with the report rows of each network in network order, or
+#   None for reports not in outputs
+#####################################################################
+def get_cmx_reports(networks, startTimeRangeEpoch, endTimeRangeEpoch, lengthBuckets, workers=1, timer=None,
+    granularities=REPORT_GRANULARITIES, outputs=OUTPUTS):
+    # Declare variables
+    proximityReports = [None] * len(networks)
+    engagementReports = [None] * len(networks)
+    loyaltyReports = [None] * len(networks)
+    workerArguments = [(networkIndex, startTimeRangeEpoch, endTimeRangeEpoch, lengthBuckets, granularities, outputs)
+        for networkIndex in _network_work_order(networks)]
+
+    if (workers <= 1) or (len(networks) <= 1):
+        _init_worker(networks)
+        networkReports = itertools.imap(_get_network_reports, workerArguments)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(workers, len(networks)), _init_worker, (networks,))
+        networkReports = pool.imap_unordered(_get_network_reports, workerArguments)
+
+    try:
+        for (networkIndex, proximityReport, engagementReport, loyaltyReport, cpuSeconds) in networkReports:
+            proximityReports[networkIndex] = proximityReport
+            engagementReports[networkIndex] = engagementReport
+            loyaltyReports[networkIndex] = loyaltyReport
+
+            if timer != None:
+                timer.add_count("proximityCPUSeconds", cpuSeconds[0])
+                timer.add_count("engagementCPUSeconds", cpuSeconds[1])
+                timer.add_count("loyaltyCPUSeconds", cpuSeconds[2])
+    finally:
+        if pool != None:
+            pool.close()
+            pool.join()
+
+    return tuple(reports if output in outputs else None
+        for (output, reports) in zip(OUTPUTS[2:], [proximityReports, engagementReports, loyaltyReports]))
+
+# Method sweep_visit_parameters finds the visits of every network with
+#   every set of visit parameters of a grid and writes the visit counts
+#   and proximity totals of each set, for tuning the visit parameters.
+#   The observations are parsed and sorted once and every set runs on
+#   them without changing them, in a pool of worker processes when
+#   workers is more than 1.
+#
+# Input: None
+# Output: <csvFilePreamble>_visit_parameter_sweep.csv
+# Parameters:
+#   networks - NetworkList of the run
+#   csvFilePreamble - start of the output file name
+#   parameterGrid - list of discover_client_visits argument tuples
+#   workers - number of worker processes
+#   timer - StageTimer of the run, if set
+#   timeIterator - length of a proximity bucket in seconds
+#
+# Return Value: None
+#####################################################################
+def sweep_visit_parameters(networks, csvFilePreamble, parameterGrid, workers=1, timer=None, timeIterator=86400):
+    # Declare variables
+    startEpoch = None
+    endEpoch = None
+    summaries = [[None] * len(parameterGrid) for network in networks]
+
+    if timer == None:
+        timer = StageTimer()
 
-        for client in self.clients:
-            returnString = returnString + client.get_visits(self.name)
-        
-        return returnString
+    timer.start("sweep")
 
-    # Method get_observations builds a CSV string of all class variables
-    #
-    # Input: None
-    # Output: None
-    # Parameters: None
-    #
-    # Return Value: CSV string of all class variables
-    #####################################################################
-    def get_observations(self):
-        returnString = ""
-        
-        for client in self.clients:
-            returnString = returnString + client.get_observations(self.name)
+    # Sort once before the workers fork, and find the report range from
+    #   the observations since the visits depend on the parameters
+    for network in networks:
+        for client in network.clients:
+            client.observations.sort_by_epoch()
+            epochs = client.observations.get_epochs()
 
-        return returnString
+            if len(epochs) > 0:
+                startEpoch = epochs[0] if startEpoch == None else min(startEpoch, epochs[0])
+                endEpoch = epochs[-1] if endEpoch == None else max(endEpoch, epochs[-1])
 
+    startEpoch = startEpoch if startEpoch != None else 0
+    endEpoch = endEpoch if endEpoch != None else 0
+    startTimeEpoch = align_bucket_start(float(startEpoch - startEpoch % 86400), timeIterator)
+    endTimeEpoch = float(endEpoch - endEpoch % 86400 + 86399)
 
-#########################################################################
-# Class Visit
+    workerArguments = [(networkIndex, parameterIndex, visitParameters, startTimeEpoch, endTimeEpoch, timeIterator)
+        for networkIndex in _network_work_order(networks) for (parameterIndex, visitParameters) in enumerate(parameterGrid)]
+
+    if (workers <= 1) or (len(workerArguments) <= 1):
+        _init_worker(networks)
+        networkSummaries = itertools.imap(_get_network_sweep_summary, workerArguments)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(workers, len(workerArguments)), _init_worker, (networks,))
+        networkSummaries = pool.imap_unordered(_get_network_sweep_summary, workerArguments)
+
+    try:
+        for (networkIndex, parameterIndex, summary) in networkSummaries:
+            summaries[networkIndex][parameterIndex] = summary
+    finally:
+        if pool != None:
+            pool.close()
+            pool.join()
+
+    timer.stop()
+    timer.add_count("sweepRuns", len(workerArguments))
+
+    write_csv_file(csvFilePreamble + "_visit_parameter_sweep.csv", SWEEP_HEADER,
+        ([network.name] + [str(parameter) for parameter in parameterGrid[parameterIndex]] + summaries[networkIndex][parameterIndex]
+        for (networkIndex, network) in enumerate(networks) for parameterIndex in range(len(parameterGrid))))
+
+    return None
+
+# Method write_csv_file writes a header and a stream of rows to a CSV
+#   file through a buffered csv writer, so the output is never held in
+#   memory
 #
-# 
-#########################################################################
-class Visit:
-    # Method __init__ initializes the class variables
-    #
-    # Input: None
-    # Output: None
-    # Parameters: 
-    #
-    # Return Value: None
-    #####################################################################
-    def __init__(self, startTimeEpoch, endTimeEpoch):
-        self.startTimeEpoch = startTimeEpoch
-        self.endTimeEpoch = endTimeEpoch
-        self.length = 0
-        self.connected = False
+# Input: None
+# Output: CSV file
+# Parameters:
+#   fileName - name of the file to write
+#   header - list of column names
+#   rows - iterable of rows
+#   append - add the rows to the end of an existing file
+#
+# Return Value: None
+#####################################################################
+def write_csv_file(fileName, header, rows, append=False):
+    (f, writer) = open_csv_file(fileName, header, append)
+    writer.writerows(rows)
+    f.close()
 
-    # Method to_string builds a CSV string of all class variables
-    #
-    # Input: None
-    # Output: None
-    # Parameters: None
-    #
-    # Return Value: CSV string of all class variables
-    #####################################################################
-    def to_string(self):
-        returnString = epochtime_to_datetime(self.startTimeEpoch) + "," + epochtime_to_datetime(self.endTimeEpoch) + "," + str(self.length) + "," + str(self.connected)
-        
-        return returnString
+    return None
 
-# Method find_network 
+# Method open_csv_file opens an output CSV file for rows written a few at
+#   a time, see write_csv_file
 #
 # Input: None
-# Output: None
-# Parameters: None
+# Output: CSV file header
+# Parameters:
+#   fileName - name of the file to write
+#   header - list of column names
+#   append - add the rows to the end of an existing file
 #
-# Return Value: -1 of error, index of first occurrence if found
+# Return Value: tuple of the open file and its csv writer
 #####################################################################
-def find_network(networkName, networks):
-    for network in networks:
-        if network.name == networkName:
-            return network
-    
-    newNetwork = Network(networkName)
-    
-    networks.append(newNetwork)
+def open_csv_file(fileName, header, append=False):
+    # Only a new or empty file gets the header
+    if append and os.path.exists(fileName) and (os.path.getsize(fileName) > 0):
+        f = open(fileName, 'ab', OUTPUT_BUFFER_SIZE)
+        writer = csv.writer(f, lineterminator='\n')
+    else:
+        f = open(fileName, 'wb', OUTPUT_BUFFER_SIZE)
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+
+    return (f, writer)
 
-    return newNetwork
+# Method merge_reports yields the rows of per network reports day by day,
+#   keeping the network order within each day
+#
+# Input: None
+# Output: None
+# Parameters:
+#   reports - list with the list of report rows of each network
+#
+# Return Value: generator of report rows
+#####################################################################
+def merge_reports(reports):
+    for dayReports in itertools.izip(*reports):
+        for report in dayReports:
+            yield report
 
 # Method find_first_day 
 #
@@ -624,9 +3957,6 @@ def find_network(networkName, networks):
 def find_first_day(networks):
     # Declare variables
     startEpoch = 0
-    year = ""
-    month = ""
-    day = ""
 
     for network in networks:
         for client in network.clients:
@@ -634,11 +3964,8 @@ def find_first_day(networks):
                 if (startEpoch == 0) or (startEpoch > visit.startTimeEpoch):
                     startEpoch = visit.startTimeEpoch
 
-    year = long(epochtime_to_datetime(startEpoch,'%Y-%m-%d').split('-')[0])
-    month = long(epochtime_to_datetime(startEpoch,'%Y-%m-%d').split('-')[1])
-    day = long(epochtime_to_datetime(startEpoch,'%Y-%m-%d').split('-')[2])
-    
-    startEpoch = datetime_to_epochtime(year, month, day)
+    # Midnight UTC of the day, as a float like datetime_to_epochtime
+    startEpoch = float(startEpoch - startEpoch % 86400)
     
     return startEpoch
 
@@ -653,9 +3980,6 @@ def find_first_day(networks):
 def find_last_day(networks):
     # Declare variables
     endEpoch = 0
-    year = ""
-    month = ""
-    day = ""
 
     for network in networks:
         for client in network.clients:
@@ -663,24 +3987,125 @@ def find_last_day(networks):
                 if endEpoch < visit.endTimeEpoch:
                     endEpoch = visit.endTimeEpoch
 
-    year = long(epochtime_to_datetime(endEpoch,'%Y-%m-%d').split('-')[0])
-    month = long(epochtime_to_datetime(endEpoch,'%Y-%m-%d').split('-')[1])
-    day = long(epochtime_to_datetime(endEpoch,'%Y-%m-%d').split('-')[2])
-    
-    endEpoch = datetime_to_epochtime(year, month, day, 23, 59, 59)
+    # 23:59:59 UTC of the day, as a float like datetime_to_epochtime
+    endEpoch = float(endEpoch - endEpoch % 86400 + 86399)
     
     return endEpoch    
 
-# Method epoch_to_date 
+# Method epoch_to_date formats an epoch time in UTC, through a cached
+#   TimeFormatter for the formats of DAY_TIME_FORMATS
 #
 # Input: None
 # Output: None
-# Parameters: None
+# Parameters:
+#   epochTime - epoch time
+#   dateFormat - strftime format
 #
-# Return Value: -1 of error, index of first occurrence if found
+# Return Value: formatted time string
 #####################################################################
 def epochtime_to_datetime(epochTime, dateFormat='%Y-%m-%d %H:%M:%S'):
-    return time.strftime(dateFormat, time.gmtime(epochTime))
+    timeFormatter = _timeFormatters.get(dateFormat)
+
+    if timeFormatter == None:
+        if dateFormat not in DAY_TIME_FORMATS:
+            return time.strftime(dateFormat, time.gmtime(epochTime))
+
+        timeFormatter = TimeFormatter(dateFormat)
+        _timeFormatters[dateFormat] = timeFormatter
+
+    return timeFormatter.format(epochTime)
+
+#########################################################################
+# Class TimeFormatter
+#
+# Formats epoch times in UTC like strftime for one of DAY_TIME_FORMATS,
+#   from the date of the day, formatted once per day, and a table of the
+#   86400 times of day, so a time costs a dictionary lookup and a string
+#   join instead of gmtime and strftime
+#########################################################################
+class TimeFormatter(object):
+    # Method __init__ initializes the class variables
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   dateFormat - strftime format, a key of DAY_TIME_FORMATS
+    #
+    # Return Value: None
+    #####################################################################
+    def __init__(self, dateFormat):
+        (self.dayFormat, self.timeOfDayFormat) = DAY_TIME_FORMATS[dateFormat]
+        self.dateFormat = dateFormat
+        self.dayPrefixes = {}
+        self.timesOfDay = None
+
+    # Method format formats an epoch time
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   epochTime - epoch time
+    #
+    # Return Value: formatted time string
+    #####################################################################
+    def format(self, epochTime):
+        seconds = epochTime % 86400
+
+        try:
+            return self.dayPrefixes[epochTime - seconds] + self.timesOfDay[seconds]
+        except (KeyError, TypeError, IndexError):
+            return self._format_new_day(epochTime)
+
+    # Method _format_new_day formats the first time of a day, building the
+    #   tables, and times format cannot index such as fractional seconds
+    #
+    # Input: None
+    # Output: None
+    # Parameters:
+    #   epochTime - epoch time
+    #
+    # Return Value: formatted time string
+    #####################################################################
+    def _format_new_day(self, epochTime):
+        if epochTime < 0:
+            return time.strftime(self.dateFormat, time.gmtime(epochTime))
+
+        # gmtime drops fractional seconds
+        (day, seconds) = divmod(long(epochTime), 86400)
+
+        if self.timesOfDay == None:
+            if self.timeOfDayFormat == "":
+                self.timesOfDay = [""] * 86400
+            else:
+                self.timesOfDay = [self.timeOfDayFormat % (second // 3600, second // 60 % 60, second % 60) for second in range(86400)]
+
+        if day * 86400 not in self.dayPrefixes:
+            self.dayPrefixes[day * 86400] = time.strftime(self.dayFormat, time.gmtime(day * 86400))
+
+        return self.dayPrefixes[day * 86400] + self.timesOfDay[seconds]
+
+# Formatters of the seen times of observations, e.g. 2017-07-14T06:32:54Z,
+#   and of the start and end times of visits
+format_seen_time = TimeFormatter(SEEN_TIME_FORMAT).format
+format_visit_time = TimeFormatter('%Y-%m-%d %H:%M:%S').format
+
+# Method intern_string returns the shared copy of a repeated string such
+#   as a MAC address or SSID. Interned strings are freed once no
+#   observation uses them. Unicode strings, e.g. from the push API, are
+#   returned as they are.
+#
+# Input: None
+# Output: None
+# Parameters:
+#   value - string to intern
+#
+# Return Value: interned string
+#####################################################################
+def intern_string(value):
+    if type(value) is str:
+        return intern(value)
+
+    return value
 
 # Method datetime_to_epochtime 
 #
@@ -695,150 +4120,487 @@ def datetime_to_epochtime(year, month, day, hour=0, minute=0, second=0):
 
 
 
-# Method main 
+# Method analyze_networks writes the observations, visits and CMX reports
+#   of the networks. With a checkpoint only new observations, finished
+#   visits and finished days are appended and the checkpoint is updated,
+#   see Checkpoint.
 #
 # Input: None
-# Output: None
-# Parameters: None
+# Output: CSV files starting with csvFilePreamble
+# Parameters:
+#   networks - NetworkList of the run
+#   csvFilePreamble - start of the output file names
+#   lengthBuckets - engagement visit length buckets
+#   workers - number of worker processes
+#   checkpoint - Checkpoint of an incremental run, None otherwise
+#   timer - StageTimer of the run, if the stages are timed
+#   granularities - bucket lengths in seconds of the proximity,
+#     engagement and loyalty reports, whole days with a checkpoint
+#   outputs - output files to write, see OUTPUTS; all with a checkpoint
+#   findVisits - find the visits even when no output needs them, for
+#     SQLiteStore.load_visits
 #
-# Return Value: -1 of error, index of first occurrence if found
+# Return Value: None
 #####################################################################
-def main():
-    # Method variables
-    outputHeader = "Network,AP Mac,Client Mac,ipv4 Address,ipv6 Address,Seen Time,Seen Epoch,SSID,RSSI,Manufacturer,Operating System"
-    networks = []
-    inputFile = ""
-    fileOutput = ""
-    csv_file_preamble = ""
-    startTimeRangeEpoch = 0
-    endTimeRangeEpoch = 0
-    currentTime = 0
-    
-    # Check if all arguments exist and exit with info if failed
-    if len(sys.argv) < 3:
-        print ("meraki_cmx_analyze <input_file_name> <csv_file_preamble>")
+def analyze_networks(networks, csvFilePreamble, lengthBuckets, workers=1, checkpoint=None, timer=None,
+    granularities=REPORT_GRANULARITIES, outputs=OUTPUTS, findVisits=False):
+    # Declare variables
+    cutoffEpoch = None
+
+    if timer == None:
+        timer = StageTimer()
+
+    if "observations" in outputs:
+        # Print list of client observations
+        print("---------------------------------------------------------------------------")
+        print("Calculating Client Observations")
+        print("---------------------------------------------------------------------------")
+        # Output list of client observations for each network
+        timer.start("observation_output")
+        write_csv_file(csvFilePreamble + "_client_observations.csv", OBSERVATION_HEADER,
+            (row for network in networks for row in network.get_observations()), checkpoint != None)
+        timer.stop()
+
+    # Every other output needs the visits, and so does a run saved to the database
+    if (outputs == ["observations"]) and (findVisits == False):
         return None
-    
-    # Build input file and strip extra characters from preamble
-    csv_file_preamble = sys.argv[2].strip()
-    inputStream = open(sys.argv[1], 'r')
-    allLines = [i for i in inputStream]
-    
-    # For each line add observations find the network it is associated with and add the observation to the correct network
-    for line in allLines:
-        if not ("Seen Epoch" in line) and ("," in line):
-            networkName = line.split(',')[0].strip()
-            apMac = line.split(',')[1].strip()
-            clientMac = line.split(',')[2].strip()
-            ipv4 = line.split(',')[3].strip()
-            ipv6 = line.split(',')[4].strip()
-            seenTime = line.split(',')[5].strip()
-            seenEpoch = line.split(',')[6].strip()
-            ssid = line.split(',')[7].strip()
-            rssi = line.split(',')[8].strip()
-            manufacturer = line.split(',')[9].strip()
-            os = line.split(',')[10].strip()
-            
-            # Call find_network to identify the network for this new observation
-            myNetwork = find_network(networkName, networks)
-            
-            # Add observation to the network
-            myNetwork.add_observation(apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os)
-
-    # Print list of client observations
-    print("---------------------------------------------------------------------------")
-    print("Calculating Client Observations")
-    print("---------------------------------------------------------------------------")
-    fileOutput = "Network,AP Mac,Client Mac,ipv4,ipv6,Seen Time,Epoch Time,SSID,RSSI,Manufacturer,OS" + "\n"
-    # For each network get list of client observations
-    for network in networks:
-        cmx_report_data = network.get_observations()
-        fileOutput = fileOutput + cmx_report_data
-    
-    # Output list of client observations
-    f = open(csv_file_preamble + "_client_observations.csv",'w')
-    f.write(fileOutput)
-    f.close()
         
     # Calculate client visits
     print("---------------------------------------------------------------------------")
     print("Calculating Client Visits")
     print("---------------------------------------------------------------------------")
-    fileOutput = "Network,Client Mac,Seen Time Start,Seen Time End,Visit Length,Connected" + "\n"
-    # Calculate client visits for each network
-    for network in networks:
-        # Calculate visit as 5 observations per window, 1200 second window, min start RSSI 20, min session RSSI 15
-        network.discover_client_visits(5,1200,20,15)
-        # Gather visits and print
-        cmx_report_data = network.get_visits()
-        fileOutput = fileOutput + cmx_report_data
+    visitParameters = VISIT_PARAMETERS
+    writtenEpoch = None
+    finishedEpoch = None
+
+    if checkpoint != None:
+        timer.start("checkpoint_restore")
+        writtenEpoch = checkpoint.get_finished_epoch(checkpoint.cutoffEpoch, visitParameters[1])
+        checkpoint.restore(networks, visitParameters)
+        timer.stop()
+
+    timer.start("discover_client_visits")
+    discover_visits(networks, visitParameters, workers, checkpoint != None)
+    timer.stop()
+
+    timer.add_count("clients", sum(len(network.clients) for network in networks))
+    timer.add_count("visits", sum(len(client.visits) for network in networks for client in network.clients))
+
+    # Only the seen buckets of the proximity report are needed from here on
+    if checkpoint == None:
+        timer.start("release_observations")
+        for network in networks:
+            for client in network.clients:
+                client.release_observations(granularities[0])
+        timer.stop()
+
+    # Visits that can still grow are written by a later run
+    if checkpoint != None:
+        cutoffEpoch = checkpoint.find_cutoff(networks)
+        finishedEpoch = checkpoint.get_finished_epoch(cutoffEpoch, visitParameters[1])
     
     # Output visits to file
-    f = open(csv_file_preamble + "_client_visits.csv",'w')
-    f.write(fileOutput)
-    f.close()
+    if "visits" in outputs:
+        timer.start("visit_output")
+        write_csv_file(csvFilePreamble + "_client_visits.csv", VISIT_HEADER,
+            (row for network in networks for row in network.get_visits(writtenEpoch, finishedEpoch)), checkpoint != None)
+        timer.stop()
     
     # Search all networks for the first and last calendar day in file
     startTimeRangeEpoch = find_first_day(networks)
     endTimeRangeEpoch = find_last_day(networks)
+    reportedDays = 0
+
+    # Incremental runs report from the first day ever, adding the days that ended before the finished visits
+    if checkpoint != None:
+        if checkpoint.firstDayEpoch != None:
+            startTimeRangeEpoch = checkpoint.firstDayEpoch
+            reportedDays = int((checkpoint.lastDayEpoch + 1 - startTimeRangeEpoch) // 86400)
+
+        if (finishedEpoch == None) or (startTimeRangeEpoch == 0):
+            startTimeRangeEpoch = None
+            endTimeRangeEpoch = None
+        else:
+            endTimeRangeEpoch = startTimeRangeEpoch + max(reportedDays, int((finishedEpoch - startTimeRangeEpoch) // 86400)) * 86400 - 1
     
-    # Set currentTime to first day
-    currentTime = startTimeRangeEpoch
-    
-    # Print proximity report
-    print("---------------------------------------------------------------------------")
-    print("Calculating CMX Proximity Report")
-    print("---------------------------------------------------------------------------")
-    fileOutput = "Network,Date,Passerby,Visitors,Connected,Capture Rate" + "\n"
-    # While we have not reached the last day, gather the proximity report for each day
-    while currentTime < endTimeRangeEpoch:
-        for network in networks:
-            cmx_report_data = network.get_cmx_proximity_report(currentTime, currentTime + 86399)
-            fileOutput = fileOutput + cmx_report_data + "\n"
-        
-        currentTime = currentTime + 86400
-    
-    # Write report to output file
-    f = open(csv_file_preamble + "_cmx_proximity_report.csv",'w')
-    f.write(fileOutput)
-    f.close()
-    
-    # Set currentTime to first day
-    currentTime = startTimeRangeEpoch
+    write_cmx_reports(networks, csvFilePreamble, startTimeRangeEpoch, endTimeRangeEpoch, reportedDays, lengthBuckets, workers,
+        timer, granularities, checkpoint != None, outputs)
+
+    if (checkpoint != None) and (cutoffEpoch != None):
+        timer.start("checkpoint_save")
+        checkpoint.update(networks, visitParameters, cutoffEpoch, startTimeRangeEpoch, endTimeRangeEpoch)
+        checkpoint.save()
+        timer.stop()
     
+    return None
+
+# Method write_cmx_reports builds the proximity, engagement and loyalty
+#   reports of the networks and writes them bucket by bucket
+#
+# Input: None
+# Output: CSV report files starting with csvFilePreamble
+# Parameters:
+#   networks - NetworkList of the run
+#   csvFilePreamble - start of the output file names
+#   startTimeRangeEpoch - Start of the first day, None for no reports
+#   endTimeRangeEpoch - End of the last day
+#   reportedDays - days at the start of the range already written
+#   lengthBuckets - engagement visit length buckets
+#   workers - number of worker processes
+#   timer - StageTimer of the run
+#   granularities - bucket lengths of the reports, see get_cmx_reports
+#   append - add the rows to the end of existing files
+#   outputs - output files to write, see OUTPUTS
+#
+# Return Value: None
+#####################################################################
+def write_cmx_reports(networks, csvFilePreamble, startTimeRangeEpoch, endTimeRangeEpoch, reportedDays, lengthBuckets, workers,
+    timer, granularities, append=False, outputs=OUTPUTS):
+    if not any(output in outputs for output in OUTPUTS[2:]):
+        return None
+
+    # Print proximity, engagement and loyalty reports
     print("---------------------------------------------------------------------------")
-    print("Calculating CMX Engagement Report")
+    print("Calculating CMX Proximity, Engagement and Loyalty Reports")
     print("---------------------------------------------------------------------------")
-    fileOutput = "Network,Date,5-20 mins,20-60 mins,1-6 hrs,6+ hrs" + "\n"
-    while currentTime < endTimeRangeEpoch:
-        for network in networks:
-            cmx_report_data = network.get_cmx_engagement_report(currentTime, currentTime + 86399)
-            fileOutput = fileOutput + cmx_report_data + "\n"
-        
-        currentTime = currentTime + 86400
+    # Gather the reports of every bucket for each network and write the buckets in order
+    timer.start("reports")
+    if startTimeRangeEpoch != None:
+        (proximityReports, engagementReports, loyaltyReports) = get_cmx_reports(networks, startTimeRangeEpoch, endTimeRangeEpoch,
+            lengthBuckets, workers, timer, granularities, outputs)
+    else:
+        (proximityReports, engagementReports, loyaltyReports) = [[] if output in outputs else None for output in OUTPUTS[2:]]
+    timer.stop()
 
-    # Write report to output file
-    f = open(csv_file_preamble + "_cmx_engagement_report.csv",'w')
-    f.write(cmx_report_data)
-    f.close()
+    timer.start("report_output")
+    write_report_files(csvFilePreamble, proximityReports, engagementReports, loyaltyReports, lengthBuckets, reportedDays, append)
+    timer.stop()
+
+    return None
+
+# Method write_report_files writes the proximity, engagement and loyalty
+#   reports bucket by bucket
+#
+# Input: None
+# Output: CSV report files starting with csvFilePreamble
+# Parameters:
+#   csvFilePreamble - start of the output file names
+#   proximityReports - list with the proximity report rows of each
+#     network, None to skip the file
+#   engagementReports - same for the engagement report
+#   loyaltyReports - same for the loyalty report
+#   lengthBuckets - engagement visit length buckets
+#   reportedDays - days at the start of the reports already written
+#   append - add the rows to the end of existing files
+#
+# Return Value: None
+#####################################################################
+def write_report_files(csvFilePreamble, proximityReports, engagementReports, loyaltyReports, lengthBuckets, reportedDays=0, append=False):
+    if proximityReports != None:
+        write_csv_file(csvFilePreamble + "_cmx_proximity_report.csv",
+            ["Network", "Date", "Passerby", "Visitors", "Connected", "Capture Rate"],
+            merge_reports([reports[reportedDays:] for reports in proximityReports]), append)
+
+    if engagementReports != None:
+        write_csv_file(csvFilePreamble + "_cmx_engagement_report.csv",
+            ["Network", "Date"] + engagement_bucket_labels(lengthBuckets),
+            merge_reports([reports[reportedDays:] for reports in engagementReports]), append)
+
+    if loyaltyReports != None:
+        write_csv_file(csvFilePreamble + "_cmx_loyalty_report.csv",
+            ["Network", "Date", "Occasional", "Daily", "First Time"],
+            merge_reports([reports[reportedDays:] for reports in loyaltyReports]), append)
+
+    return None
+
+# Method analyze_sorted_observations finds the visits and CMX reports of
+#   observations sorted by network, client and time, one client at a
+#   time. The observations and visits of each client are written as soon
+#   as its visits are found and its observations are then released, so
+#   only the visits and seen buckets of the clients stay in memory.
+#
+# Input: None
+# Output: CSV files starting with csvFilePreamble
+# Parameters:
+#   rows - observation field tuples sorted by network, client MAC and
+#     seen time, see ExternalSorter
+#   csvFilePreamble - start of the output file names
+#   lengthBuckets - engagement visit length buckets
+#   columnar - keep the observations of a client in columns
+#   workers - number of worker processes for the reports
+#   timer - StageTimer of the run
+#   granularities - bucket lengths of the reports, see get_cmx_reports
+#   outputs - output files to write, see OUTPUTS
+#
+# Return Value: NetworkList of the clients with their visits
+#####################################################################
+def analyze_sorted_observations(rows, csvFilePreamble, lengthBuckets, columnar=False, workers=1, timer=None,
+    granularities=REPORT_GRANULARITIES, outputs=OUTPUTS):
+    # Declare variables
+    networks = NetworkList(columnar)
+    rowCount = 0
+    observationFile = None
+    visitFile = None
 
-    # Set currentTime to first day
-    currentTime = startTimeRangeEpoch
+    if timer == None:
+        timer = StageTimer()
 
     print("---------------------------------------------------------------------------")
-    print("Calculating CMX Loyalty Report")
+    print("Calculating Client Observations and Visits")
     print("---------------------------------------------------------------------------")
-    fileOutput = "Network,Date,Occasional,Daily,First Time" + "\n"
-    while currentTime < endTimeRangeEpoch:
-        for network in networks:
-            cmx_report_data = network.get_cmx_loyalty_report(currentTime, startTimeRangeEpoch, endTimeRangeEpoch, 86400)
-            fileOutput = fileOutput + cmx_report_data + "\n"
-        
-        currentTime = currentTime + 86400
+    timer.start("discover_client_visits")
+    if "observations" in outputs:
+        (observationFile, observationWriter) = open_csv_file(csvFilePreamble + "_client_observations.csv", OBSERVATION_HEADER)
+
+    if "visits" in outputs:
+        (visitFile, visitWriter) = open_csv_file(csvFilePreamble + "_client_visits.csv", VISIT_HEADER)
+
+    for ((networkName, clientMac), clientRows) in itertools.groupby(rows, operator.itemgetter(0, 2)):
+        network = networks.find_network(networkName)
+
+        for row in clientRows:
+            network.add_observation(*row[1:])
+
+        client = network._find_client(clientMac)
+        rowCount = rowCount + len(client.observations)
+
+        if observationFile != None:
+            observationWriter.writerows(client.get_observations(networkName))
+
+        # Every other output needs the visits
+        if outputs != ["observations"]:
+            client.discover_visits(*VISIT_PARAMETERS)
+
+        if visitFile != None:
+            visitWriter.writerows(client.get_visits(networkName))
+
+        client.release_observations(granularities[0])
+
+    for f in [observationFile, visitFile]:
+        if f != None:
+            f.close()
+    timer.stop()
+
+    timer.add_count("rows", rowCount)
+    timer.add_count("clients", sum(len(network.clients) for network in networks))
+    timer.add_count("visits", sum(len(client.visits) for network in networks for client in network.clients))
+
+    write_cmx_reports(networks, csvFilePreamble, find_first_day(networks), find_last_day(networks), 0, lengthBuckets, workers,
+        timer, granularities, False, outputs)
+
+    return networks
+
+# Method main 
+#
+# Input: None
+# Output: None
+# Parameters: None
+#
+# Return Value: -1 of error, index of first occurrence if found
+#####################################################################
+def main():
+    # Method variables
+    outputHeader = "Network,AP Mac,Client Mac,ipv4 Address,ipv6 Address,Seen Time,Seen Epoch,SSID,RSSI,Manufacturer,Operating System"
+    networks = None
+    inputFile = ""
+    csv_file_preamble = ""
+    startTimeRangeEpoch = 0
+    endTimeRangeEpoch = 0
     
-    f = open(csv_file_preamble + "_cmx_loyalty_report.csv",'w')
-    f.write(cmx_report_data)
-    f.close()
+    # Check if all arguments exist and exit with info if failed
+    parser = argparse.ArgumentParser(prog="meraki_cmx_analyze")
+    parser.add_argument("input_file_names", nargs="+", metavar="input_file_name",
+        help="CSV file, plain or gzip, bz2 or xz compressed; several files or glob patterns are read in order")
+    parser.add_argument("csv_file_preamble")
+    parser.add_argument("--columnar", action="store_true",
+        help="keep observations in columns (uses NumPy for visit discovery when installed)")
+    parser.add_argument("--engagement-buckets", type=parse_length_buckets, default=ENGAGEMENT_BUCKETS,
+        help="comma separated lower edges in seconds of the engagement visit length buckets (default 300,1200,3600,21600)")
+    parser.add_argument("--granularity", type=parse_granularity, default=86400,
+        help="report bucket length: hourly, daily, weekly or seconds (default daily); weekly buckets start on Monday")
+    parser.add_argument("--proximity-granularity", type=parse_granularity, help="bucket length of the proximity report (default --granularity)")
+    parser.add_argument("--engagement-granularity", type=parse_granularity, help="bucket length of the engagement report (default --granularity)")
+    parser.add_argument("--loyalty-granularity", type=parse_granularity, help="bucket length of the loyalty report (default --granularity)")
+    parser.add_argument("--outputs", type=parse_outputs, default=OUTPUTS, metavar="LIST",
+        help="comma separated outputs to write: observations, visits, proximity, engagement, loyalty (default all); " +
+        "skipped outputs are not computed and observations are freed once the visits are found")
+    parser.add_argument("--workers", type=int, default=1,
+        help="number of processes that find visits and build reports, one network (site) at a time (default 1)")
+    parser.add_argument("--checkpoint", metavar="FILE",
+        help="state file of incremental runs: only observations newer than the last run are read, and finished visits and days are appended to the output files")
+    parser.add_argument("--cache", metavar="FILE",
+        help="binary cache of the parsed input files, written on the first run and loaded instead of parsing while the input is unchanged")
+    parser.add_argument("--read-thread", action="store_true",
+        help="read and decompress the input in a background thread while the previous block is parsed")
+    parser.add_argument("--parse-workers", type=int, default=1,
+        help="number of processes that parse uncompressed input files, split into chunks at line ends (default 1)")
+    parser.add_argument("--drop-duplicates", action="store_true",
+        help="drop exact duplicate observations (same network, AP, client, seen epoch and RSSI) while the input is read")
+    parser.add_argument("--duplicate-window", type=int, default=DUPLICATE_WINDOW, metavar="SECONDS",
+        help="seconds of observations per client --drop-duplicates compares against (default 300)")
+    parser.add_argument("--out-of-core", action="store_true",
+        help="sort the input by site, client and time into spill files and analyze one client at a time, for inputs larger than memory")
+    parser.add_argument("--memory-budget", type=int, default=1024, metavar="MB",
+        help="memory for input rows held by --out-of-core before they are spilled (default 1024)")
+    parser.add_argument("--spill-dir", metavar="DIR", help="directory for the --out-of-core spill files (default system temporary directory)")
+    parser.add_argument("--sqlite", metavar="FILE",
+        help="SQLite database of the observations and visits for ad hoc queries; repeat runs on the same input build the outputs from it")
+    parser.add_argument("--sweep-observations", type=parse_sweep_values, metavar="LIST",
+        help="comma separated observations per window to sweep; any --sweep option writes <csv_file_preamble>_visit_parameter_sweep.csv " +
+        "with the visits and proximity totals of every parameter combination instead of the usual outputs")
+    parser.add_argument("--sweep-window", type=parse_sweep_values, metavar="LIST", help="comma separated window lengths in seconds to sweep")
+    parser.add_argument("--sweep-start-rssi", type=parse_sweep_values, metavar="LIST", help="comma separated minimum start RSSIs to sweep")
+    parser.add_argument("--sweep-session-rssi", type=parse_sweep_values, metavar="LIST", help="comma separated minimum session RSSIs to sweep")
+    parser.add_argument("--profile", action="store_true",
+        help="write the wall and CPU time, rows per second and peak memory of every stage to <csv_file_preamble>_profile.json")
+    parser.add_argument("--cprofile", action="store_true",
+        help="also write cProfile statistics of the run to <csv_file_preamble>_profile.prof, for pstats or snakeviz")
+    args = parser.parse_args()
+
+    if (args.cache != None) and (args.checkpoint != None):
+        parser.error("--cache and --checkpoint cannot be used together")
+
+    if args.out_of_core and ((args.cache != None) or (args.checkpoint != None)):
+        parser.error("--out-of-core cannot be used with --cache or --checkpoint")
+
+    if (args.parse_workers > 1) and (args.drop_duplicates or args.out_of_core):
+        parser.error("--parse-workers cannot be used with --drop-duplicates or --out-of-core")
+
+    if (args.sqlite != None) and ((args.checkpoint != None) or args.out_of_core):
+        parser.error("--sqlite cannot be used with --checkpoint or --out-of-core")
+
+    sweepValues = [args.sweep_observations, args.sweep_window, args.sweep_start_rssi, args.sweep_session_rssi]
+    parameterGrid = None
+
+    if any(values != None for values in sweepValues):
+        if (args.checkpoint != None) or args.out_of_core or (args.sqlite != None):
+            parser.error("--sweep options cannot be used with --checkpoint, --out-of-core or --sqlite")
+
+        # Parameters without a sweep option keep their usual value
+        parameterGrid = list(itertools.product(*[values if values != None else [VISIT_PARAMETERS[i]]
+            for (i, values) in enumerate(sweepValues)]))
+
+    granularities = tuple(granularity if granularity != None else args.granularity
+        for granularity in [args.proximity_granularity, args.engagement_granularity, args.loyalty_granularity])
+
+    if (args.checkpoint != None) and (granularities != REPORT_GRANULARITIES):
+        parser.error("--checkpoint only supports daily reports")
+
+    if (args.checkpoint != None) and (args.outputs != OUTPUTS):
+        parser.error("--checkpoint writes every output, --outputs cannot be used with it")
+    
+    # Build input file and strip extra characters from preamble
+    csv_file_preamble = args.csv_file_preamble.strip()
+    inputFileNames = expand_input_names(args.input_file_names)
+    networks = None
+    inputKey = None
+    store = None
+    storedRun = False
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint != None else None
+    timer = StageTimer()
+    duplicates = DuplicateFilter(args.duplicate_window) if args.drop_duplicates else None
+    profiler = cProfile.Profile() if args.cprofile else None
+
+    if profiler != None:
+        profiler.enable()
+
+    if (args.sqlite != None) or (args.cache != None):
+        inputKey = [get_input_key(inputFileName) for inputFileName in inputFileNames]
+
+        # The cache and database hold the input without the dropped duplicates
+        inputKey.append(("duplicateWindow", args.duplicate_window if args.drop_duplicates else None))
+
+    if args.sqlite != None:
+        store = SQLiteStore(args.sqlite)
+        storedRun = store.holds_run(inputKey, VISIT_PARAMETERS)
+
+    # Build the outputs from the database when it holds the run of this input
+    if storedRun:
+        store.write_outputs(csv_file_preamble, args.engagement_buckets, timer, granularities, args.outputs)
+    elif args.out_of_core:
+        timer.start("external_sort")
+        sorter = ExternalSorter(args.spill_dir, args.memory_budget * 1024 * 1024)
+
+        try:
+            for row in read_filtered_input(inputFileNames, args.read_thread, duplicates):
+                sorter.add(row)
+
+            sortedRows = sorter.get_sorted_rows()
+            timer.stop()
+            timer.add_count("spillFiles", len(sorter.spillFileNames))
+            analyze_sorted_observations(sortedRows, csv_file_preamble, args.engagement_buckets, args.columnar, args.workers, timer,
+                granularities, args.outputs)
+        finally:
+            sorter.close()
+    elif args.cache != None:
+        timer.start("cache_load")
+        networks = read_observation_cache(args.cache, inputKey, args.columnar)
+        timer.stop()
+
+    if (networks == None) and (args.out_of_core == False) and (storedRun == False):
+        timer.start("ingest")
+
+        if args.parse_workers > 1:
+            networks = parse_input_files_parallel(inputFileNames, args.parse_workers, args.columnar,
+                checkpoint.cutoffEpoch if checkpoint != None else None)
+        else:
+            networks = NetworkList(args.columnar)
+
+            # For each row find the network it is associated with and add the observation to the correct network
+            for (networkName, apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os) in \
+                read_filtered_input(inputFileNames, args.read_thread, duplicates):
+                # Skip observations ingested by an earlier run
+                if (checkpoint != None) and (checkpoint.is_new(seenEpoch) == False):
+                    continue
+
+                # Call find_network to identify the network for this new observation
+                myNetwork = find_network(networkName, networks)
+
+                # Add observation to the network
+                myNetwork.add_observation(apMac, clientMac, ipv4, ipv6, seenTime, seenEpoch, ssid, rssi, manufacturer, os)
+
+        timer.stop()
+
+        if args.cache != None:
+            timer.start("cache_write")
+            write_observation_cache(args.cache, inputKey, networks)
+            timer.stop()
+
+    if networks != None:
+        timer.add_count("rows", sum(len(client.observations) for network in networks for client in network.clients))
+
+        # Load the observations in input order, before visit discovery sorts them
+        if store != None:
+            timer.start("sqlite_observation_load")
+            store.load_observations(networks)
+            timer.stop()
+
+        if parameterGrid != None:
+            sweep_visit_parameters(networks, csv_file_preamble, parameterGrid, args.workers, timer, granularities[0])
+        else:
+            analyze_networks(networks, csv_file_preamble, args.engagement_buckets, args.workers, checkpoint, timer, granularities,
+                args.outputs, store != None)
+
+        if store != None:
+            timer.start("sqlite_visit_load")
+            store.load_visits(networks, inputKey, VISIT_PARAMETERS)
+            timer.stop()
+
+    if store != None:
+        store.close()
+
+    # Runs from the cache or database read no rows to drop duplicates from
+    if (duplicates != None) and (duplicates.rowCount > 0):
+        timer.add_count("duplicateRows", duplicates.droppedRows)
+
+    if profiler != None:
+        profiler.disable()
+        profiler.dump_stats(csv_file_preamble + "_profile.prof")
+
+    if args.profile or args.cprofile:
+        f = open(csv_file_preamble + "_profile.json", 'wb')
+        json.dump(timer.get_summary(), f, indent=2, sort_keys=True)
+        f.close()
     
     return None
     